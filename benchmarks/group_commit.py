@@ -0,0 +1,77 @@
+""" Measures comments stored per second on a SQLite file, one commit per comment against group commit.
+
+Run from the repository root with: python -m benchmarks.group_commit [threads] [comments per thread]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, clear_mappers
+from sqlalchemy.pool import NullPool
+
+from covid.adapters import database_repository
+from covid.adapters.orm import metadata, map_model_to_tables
+from covid.adapters.unit_of_work import SqlAlchemyUnitOfWork
+from covid.news import services
+from covid.news.group_commit import GroupCommitWriter
+
+
+data_path = os.path.join(os.path.dirname(__file__), '..', 'tests', 'data')
+
+
+def make_uow(database: str) -> SqlAlchemyUnitOfWork:
+    # Configured as create_app() configures a file-based database.
+    engine = create_engine(
+        'sqlite:///' + database, connect_args={'check_same_thread': False, 'timeout': 60}, poolclass=NullPool)
+    clear_mappers()
+    metadata.create_all(engine)
+    database_repository.populate(engine, data_path)
+    map_model_to_tables()
+    return SqlAlchemyUnitOfWork(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+
+
+def one_commit_each(uow: SqlAlchemyUnitOfWork, article_id: int, comment_text: str, username: str):
+    # As comment_on_article() does without group commit, with a unit of work for each request thread.
+    task_uow = uow.for_task()
+    try:
+        services.add_comment(article_id, comment_text, username, task_uow)
+    finally:
+        task_uow.close_current_session()
+
+
+def measure(add_comment, threads: int, comments_per_thread: int) -> float:
+    def commenter(thread_number):
+        for index in range(comments_per_thread):
+            add_comment(1 + (thread_number + index) % 6, f'Comment {index} from thread {thread_number}', 'thorke')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(commenter, thread_number) for thread_number in range(threads)]:
+            future.result()
+    return threads * comments_per_thread / (time.perf_counter() - started)
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    comments_per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+
+    with tempfile.TemporaryDirectory() as directory:
+        uow = make_uow(os.path.join(directory, 'one_commit_each.db'))
+        before = measure(
+            lambda *comment: one_commit_each(uow, *comment), threads, comments_per_thread)
+
+        uow = make_uow(os.path.join(directory, 'group_commit.db'))
+        writer = GroupCommitWriter(uow, batch_size=100, window=0.002, timeout=10)
+        after = measure(writer.add_comment, threads, comments_per_thread)
+        writer.stop()
+
+    print(f'{threads} threads, {comments_per_thread} comments each')
+    print(f'One commit per comment: {before:8.1f} comments/sec')
+    print(f'Group commit:           {after:8.1f} comments/sec ({after / before:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+""" Compares the comment profanity check with better_profanity on long comments.
+
+Run from the repository root with: python -m benchmarks.profanity
+"""
+import random
+import timeit
+
+from better_profanity import profanity
+
+from covid.news.profanity import profanity_checker
+
+
+def make_comment(length: int, rng: random.Random, ending: str = '') -> str:
+    words = ['the', 'outbreak', 'in', 'Auckland', 'has', 'l3d', 'to', 'n3w', 'restrictions', 'COVID-19', 'cases',
+             'hospital', 'ministry', 'of', 'health', 'reported', "it's", 'a', '"big"', 'day', '@home', 'lockdown']
+    comment = list()
+    size = 0
+    while size < length:
+        word = rng.choice(words)
+        comment.append(word)
+        size += len(word) + 1
+    return ' '.join(comment) + ending
+
+
+def main():
+    rng = random.Random(2020)
+    print(f'{"comment":<28}{"better_profanity":>20}{"compiled":>14}{"speed-up":>12}')
+    for length in (200, 1000, 5000, 20000):
+        for label, ending in (('clean', ''), ('profane at end', ' sh1t')):
+            comment = make_comment(length, rng, ending)
+            assert profanity.contains_profanity(comment) == profanity_checker.contains_profanity(comment)
+
+            runs = max(1, 20000 // length)
+            before = min(timeit.repeat(lambda: profanity.contains_profanity(comment), number=runs, repeat=3)) / runs
+            after = min(timeit.repeat(lambda: profanity_checker.contains_profanity(comment), number=runs, repeat=3)) / runs
+            print(f'{f"{len(comment)} chars, {label}":<28}{before * 1000:>17.3f} ms{after * 1000:>11.3f} ms'
+                  f'{before / after:>11.1f}x')
+
+
+if __name__ == '__main__':
+    main()
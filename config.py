@@ -21,3 +21,80 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     REPOSITORY = environ.get('REPOSITORY')
+
+    # Response cache configuration. Set RESPONSE_CACHE_SIZE to 0 to disable caching of pages for logged-out users.
+    RESPONSE_CACHE_SIZE = int(environ.get('RESPONSE_CACHE_SIZE', 512))
+
+    # Cached pages and template fragments are rendered again once they're CACHE_MAX_AGE seconds old, even if nothing
+    # changed in this process, so that changes made through other processes show up. Set to 0 to keep them until the
+    # data changes in this process.
+    CACHE_MAX_AGE = float(environ.get('CACHE_MAX_AGE', 60))
+
+    # Template configuration. When JINJA_BYTECODE_CACHE_DIR is set, compiled templates are stored in that directory and
+    # reused by later processes. JINJA_PRECOMPILE_TEMPLATES compiles every template when the app is created.
+    # STREAM_ARTICLE_LISTINGS sends article listings while they are being rendered.
+    JINJA_BYTECODE_CACHE_DIR = environ.get('JINJA_BYTECODE_CACHE_DIR')
+    JINJA_PRECOMPILE_TEMPLATES = environ.get('JINJA_PRECOMPILE_TEMPLATES', 'True').lower() == 'true'
+    STREAM_ARTICLE_LISTINGS = environ.get('STREAM_ARTICLE_LISTINGS', 'True').lower() == 'true'
+
+    # Response compression. Text responses of at least COMPRESSION_MIN_SIZE bytes are compressed with gzip, or brotli
+    # when the brotli package is installed, at COMPRESSION_LEVEL (1 to 9).
+    COMPRESS_RESPONSES = environ.get('COMPRESS_RESPONSES', 'True').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(environ.get('COMPRESSION_MIN_SIZE', 500))
+    COMPRESSION_LEVEL = int(environ.get('COMPRESSION_LEVEL', 6))
+
+    # Number of threads for running independent read-only service calls concurrently within a request, on the database
+    # repository. The threads are shared by all requests, and each call opens its own connection, so a server with more
+    # threads than this waits for them. Off (0) by default; if set, size it to at least the server's thread count.
+    FAN_OUT_WORKERS = int(environ.get('FAN_OUT_WORKERS', 0))
+
+    # Number of SQLite connections used by the ASGI application in covid/api/asgi.py.
+    ASYNC_SQLITE_CONNECTIONS = int(environ.get('ASYNC_SQLITE_CONNECTIONS', 4))
+
+    # Password hashing pool. PASSWORD_HASH_WORKERS processes compute password hashes, with up to
+    # PASSWORD_HASH_QUEUE_SIZE further requests waiting for a process. When the queue is full, a login or registration
+    # waits PASSWORD_HASH_TIMEOUT seconds for room before it is turned away with 503 Service Unavailable. Set
+    # PASSWORD_HASH_WORKERS to 0 to hash passwords on the request thread.
+    PASSWORD_HASH_WORKERS = int(environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(environ.get('PASSWORD_HASH_QUEUE_SIZE', 16))
+    PASSWORD_HASH_TIMEOUT = float(environ.get('PASSWORD_HASH_TIMEOUT', 2.0))
+
+    # The /api/metrics endpoints are only served to requests with an 'Authorization: Bearer <METRICS_TOKEN>' header, and
+    # not at all when METRICS_TOKEN isn't set.
+    METRICS_TOKEN = environ.get('METRICS_TOKEN')
+
+    # Rate limits on logins, registrations and comments, per client IP address and per username. A client may make
+    # RATE_LIMIT_BURST such requests in quick succession, and then RATE_LIMIT_PER_MINUTE a minute; set
+    # RATE_LIMIT_PER_MINUTE to 0 to turn rate limiting off. Limits are tracked in memory unless RATE_LIMIT_STORE names a
+    # SQLite file, which is shared by all the server processes that use it.
+    RATE_LIMIT_BURST = int(environ.get('RATE_LIMIT_BURST', 10))
+    RATE_LIMIT_PER_MINUTE = float(environ.get('RATE_LIMIT_PER_MINUTE', 6))
+    RATE_LIMIT_STORE = environ.get('RATE_LIMIT_STORE')
+
+    # Comment moderation. When COMMENT_MODERATION is set, submitted comments are queued and a background thread checks
+    # them for profanity and publishes them in batches of up to MODERATION_BATCH_SIZE, collected over at most
+    # MODERATION_BATCH_WINDOW seconds.
+    COMMENT_MODERATION = environ.get('COMMENT_MODERATION', 'False').lower() == 'true'
+    MODERATION_BATCH_SIZE = int(environ.get('MODERATION_BATCH_SIZE', 50))
+    MODERATION_BATCH_WINDOW = float(environ.get('MODERATION_BATCH_WINDOW', 0.5))
+
+    # Group commit. When GROUP_COMMIT_COMMENTS is set, comments submitted at the same time are stored with one commit,
+    # in groups of up to GROUP_COMMIT_BATCH_SIZE collected over at most GROUP_COMMIT_WINDOW seconds. A request waits at
+    # most GROUP_COMMIT_TIMEOUT seconds for its comment to be committed.
+    GROUP_COMMIT_COMMENTS = environ.get('GROUP_COMMIT_COMMENTS', 'False').lower() == 'true'
+    GROUP_COMMIT_BATCH_SIZE = int(environ.get('GROUP_COMMIT_BATCH_SIZE', 100))
+    GROUP_COMMIT_WINDOW = float(environ.get('GROUP_COMMIT_WINDOW', 0.002))
+    GROUP_COMMIT_TIMEOUT = float(environ.get('GROUP_COMMIT_TIMEOUT', 10.0))
+
+    # Write-ahead log for the memory repository. When MEMORY_WAL_DIR names a directory, users and comments stored in
+    # memory are logged there and restored at startup. The log is synced to disk every WAL_SYNC_INTERVAL seconds, and
+    # compacted into a snapshot after every WAL_COMPACT_AFTER records.
+    MEMORY_WAL_DIR = environ.get('MEMORY_WAL_DIR')
+    WAL_SYNC_INTERVAL = float(environ.get('WAL_SYNC_INTERVAL', 0.1))
+    WAL_COMPACT_AFTER = int(environ.get('WAL_COMPACT_AFTER', 10000))
+
+    # Reloading the memory repository. When DATA_RELOAD is set, the data files are loaded again, without a restart,
+    # whenever the process receives SIGHUP. If DATA_RELOAD_INTERVAL is above 0, they're also checked every
+    # DATA_RELOAD_INTERVAL seconds and loaded again when they've changed.
+    DATA_RELOAD = environ.get('DATA_RELOAD', 'False').lower() == 'true'
+    DATA_RELOAD_INTERVAL = float(environ.get('DATA_RELOAD_INTERVAL', 5))
@@ -1,17 +1,29 @@
 """Initialize Flask app."""
 
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, clear_mappers
 from sqlalchemy.pool import NullPool, StaticPool
 
-from covid.adapters import memory_repository, database_repository
+from covid.adapters import memory_repository, database_repository, reloading, write_ahead_log
 from covid.adapters.orm import metadata, map_model_to_tables
 from covid.adapters.unit_of_work import SqlAlchemyUnitOfWork, InMemoryUnitOfWork
 
 import covid.adapters.unit_of_work as uow
+import covid.caching.response_cache as response_cache
+from covid.caching.data_version import data_version
+from covid.caching.fragment_cache import FragmentCacheExtension
+from covid.assets import compression
+import covid.utilities.fan_out as fan_out
+import covid.authentication.hashing as hashing
+import covid.news.moderation as moderation
+import covid.news.group_commit as group_commit
+import covid.rate_limiting.rate_limiter as rate_limiter
+from covid.rate_limiting.stores import LocalBucketStore, SqliteBucketStore
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 
 def create_app(test_config=None):
@@ -31,12 +43,38 @@ def create_app(test_config=None):
         app.config.from_mapping(test_config)
         data_path = app.config['TEST_DATA_PATH']
 
+    if write_ahead_log.write_ahead_log_instance is not None:
+        write_ahead_log.write_ahead_log_instance.close()
+        write_ahead_log.write_ahead_log_instance = None
+
+    if reloading.data_reloader_instance is not None:
+        reloading.data_reloader_instance.stop()
+        reloading.data_reloader_instance = None
+
     if app.config['REPOSITORY'] == 'memory':
         # Create the InMemoryUnitOfWork and MemoryRepository implementations for a memory-based repository.
-        repo = memory_repository.MemoryRepository()
+        if app.config['MEMORY_WAL_DIR']:
+            write_ahead_log.write_ahead_log_instance = write_ahead_log.WriteAheadLog(
+                app.config['MEMORY_WAL_DIR'], app.config['WAL_SYNC_INTERVAL'], app.config['WAL_COMPACT_AFTER'])
+        elif app.config['DATA_RELOAD']:
+            # A reload carries the users and comments stored since startup over to the new repository.
+            write_ahead_log.write_ahead_log_instance = write_ahead_log.InMemoryLog()
+        repo = memory_repository.MemoryRepository(write_ahead_log.write_ahead_log_instance)
         uow.uow_instance = InMemoryUnitOfWork(repo)
         memory_repository.populate(data_path, repo)
 
+        # Restore the users and comments stored since the data was first loaded.
+        if write_ahead_log.write_ahead_log_instance is not None:
+            write_ahead_log.replay(write_ahead_log.write_ahead_log_instance, repo)
+
+        # Reload the data files when they change, or when the process receives SIGHUP.
+        if app.config['DATA_RELOAD']:
+            reloader = reloading.DataReloader(
+                uow.uow_instance, data_path, write_ahead_log.write_ahead_log_instance,
+                app.config['DATA_RELOAD_INTERVAL'])
+            reloading.data_reloader_instance = reloader
+            reloader.handle_sighup()
+
     elif app.config['REPOSITORY'] == 'database':
         # Configure database.
         database_uri = app.config['SQLALCHEMY_DATABASE_URI']
@@ -57,6 +95,9 @@ def create_app(test_config=None):
             for table in reversed(metadata.sorted_tables):     # Remove any data from the tables.
                 engine.execute(table.delete())
             database_repository.populate(engine, data_path)    # Populate the database with fresh data.
+        else:
+            # The database may have been created by an earlier version of the web application.
+            database_repository.upgrade(engine)
 
         # Create the database session factory and unit of work objects.
         session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -65,6 +106,62 @@ def create_app(test_config=None):
         # Generate mappings that map domain model classes to the database tables.
         map_model_to_tables()
 
+    # The freshly loaded data supersedes anything cached against an earlier version.
+    data_version.max_age = app.config['CACHE_MAX_AGE']
+    data_version.bump()
+    response_cache.response_cache_instance = None
+    if app.config['RESPONSE_CACHE_SIZE'] > 0:
+        response_cache.response_cache_instance = response_cache.ResponseCache(app.config['RESPONSE_CACHE_SIZE'])
+
+    # Threads for running independent read-only service calls concurrently within a request.
+    if fan_out.executor is not None:
+        fan_out.executor.shutdown(wait=False)
+        fan_out.executor = None
+    if app.config['FAN_OUT_WORKERS'] > 0:
+        fan_out.executor = ThreadPoolExecutor(max_workers=app.config['FAN_OUT_WORKERS'], thread_name_prefix='fan-out')
+
+    # Worker processes for password hashing, so that logins and registrations don't hold up other requests.
+    if hashing.hasher is not None:
+        hashing.hasher.shutdown()
+        hashing.hasher = None
+    if app.config['PASSWORD_HASH_WORKERS'] > 0:
+        hashing.hasher = hashing.PasswordHasher(
+            app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_QUEUE_SIZE'], app.config['PASSWORD_HASH_TIMEOUT'])
+
+    # Rate limits on requests that hash passwords or write comments.
+    rate_limiter.rate_limiter_instance = None
+    if app.config['RATE_LIMIT_PER_MINUTE'] > 0:
+        rate_limit_store = app.config['RATE_LIMIT_STORE']
+        store = SqliteBucketStore(rate_limit_store) if rate_limit_store else LocalBucketStore()
+        rate_limiter.rate_limiter_instance = rate_limiter.RateLimiter(
+            store, app.config['RATE_LIMIT_BURST'], app.config['RATE_LIMIT_PER_MINUTE'])
+
+    # Background moderation of new comments.
+    if moderation.moderation_queue_instance is not None:
+        moderation.moderation_queue_instance.stop()
+        moderation.moderation_queue_instance = None
+    if app.config['COMMENT_MODERATION']:
+        moderation.moderation_queue_instance = moderation.ModerationQueue(
+            uow.uow_instance, app.config['MODERATION_BATCH_SIZE'], app.config['MODERATION_BATCH_WINDOW'])
+
+    # Writer that stores comments from concurrent requests with one commit.
+    if group_commit.group_commit_writer_instance is not None:
+        group_commit.group_commit_writer_instance.stop()
+        group_commit.group_commit_writer_instance = None
+    if app.config['GROUP_COMMIT_COMMENTS']:
+        group_commit.group_commit_writer_instance = group_commit.GroupCommitWriter(
+            uow.uow_instance, app.config['GROUP_COMMIT_BATCH_SIZE'], app.config['GROUP_COMMIT_WINDOW'],
+            app.config['GROUP_COMMIT_TIMEOUT'])
+
+    # Keep compiled templates on disk so that new worker processes don't have to compile them again.
+    bytecode_cache_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if bytecode_cache_dir:
+        os.makedirs(bytecode_cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+
+    # Render shared template fragments, such as the tag list, once per data version.
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
     # Build the application - these steps require an application context.
     with app.app_context():
         # Register blueprints.
@@ -80,6 +177,21 @@ def create_app(test_config=None):
         from .utilities import utilities
         app.register_blueprint(utilities.utilities_blueprint)
 
+        from .api import api
+        app.register_blueprint(api.api_blueprint)
+
+        from .assets import assets
+        app.register_blueprint(assets.assets_blueprint)
+
+        if app.config['COMPRESS_RESPONSES']:
+            # Compress text responses for clients that accept gzip or brotli.
+            app.after_request(compression.compress_response)
+
+        if app.config['JINJA_PRECOMPILE_TEMPLATES']:
+            # Compile all templates now, rather than on the first request that uses each of them.
+            for template_name in app.jinja_env.list_templates(extensions=['html']):
+                app.jinja_env.get_template(template_name)
+
         # Register a tear-down method that will be called after each request has been processed.
         @app.teardown_appcontext
         def shutdown_session(exception=None):
@@ -0,0 +1,150 @@
+import abc
+from datetime import date
+from typing import List, Tuple
+
+from covid.adapters.memory_repository import MemoryRepository
+from covid.domain.model import Article, Comment, Tag, User
+
+
+class AbstractAsyncRepository(abc.ABC):
+    """ Read-only repository for use from asyncio code.
+
+    The methods mirror those of AbstractRepository, but are coroutines. Implementations mustn't block the event loop
+    while they wait for storage.
+    """
+
+    @abc.abstractmethod
+    async def get_user(self, username) -> User:
+        """ Returns the User named username from the repository.
+
+        If there is no User with the given username, this method returns None.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_article(self, id: int) -> Article:
+        """ Returns Article with id from the repository.
+
+        If there is no Article with the given id, this method returns None.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_articles_by_date(self, target_date: date) -> List[Article]:
+        """ Returns a list of Articles that were published on target_date.
+
+        If there are no Articles on the given date, this method returns an empty list.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_number_of_articles(self) -> int:
+        """ Returns the number of Articles in the repository. """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_first_article(self) -> Article:
+        """ Returns the first Article, ordered by date, from the repository.
+
+        Returns None if the repository is empty.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_last_article(self) -> Article:
+        """ Returns the last Article, ordered by date, from the repository.
+
+        Returns None if the repository is empty.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_articles_by_id(self, id_list) -> List[Article]:
+        """ Returns a list of Articles, whose ids match those in id_list, from the repository.
+
+        If there are no matches, this method returns an empty list.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_article_ids_for_tag(self, tag_name: str) -> List[int]:
+        """ Returns a list of ids representing Articles that are tagged by tag_name.
+
+        If there are no Articles that are tagged by tag_name, this method returns an empty list.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_date_of_previous_article(self, article: Article) -> date:
+        """ Returns the date of an Article that immediately precedes article.
+
+        If article is the first Article in the repository, this method returns None because there are no Articles
+        on a previous date.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_date_of_next_article(self, article: Article) -> date:
+        """ Returns the date of an Article that immediately follows article.
+
+        If article is the last Article in the repository, this method returns None because there are no Articles
+        on a later date.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_tags(self) -> List[Tag]:
+        """ Returns the Tags stored in the repository. """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_comments_for_article(self, article_id: int, quantity: int, cursor=None) -> Tuple[List[Comment], tuple]:
+        """ Returns a page of up to quantity Comments on the Article identified by article_id, oldest first, and a cursor.
+
+        The cursor is an opaque (timestamp, key) position to pass back in to retrieve the following page; it is None when
+        there are no further Comments.
+        """
+        raise NotImplementedError
+
+
+class AsyncMemoryRepository(AbstractAsyncRepository):
+    # Calls into a MemoryRepository never wait on I/O, so each coroutine simply returns the wrapped repository's result.
+
+    def __init__(self, repo: MemoryRepository):
+        self._repo = repo
+
+    async def get_user(self, username) -> User:
+        return self._repo.get_user(username)
+
+    async def get_article(self, id: int) -> Article:
+        return self._repo.get_article(id)
+
+    async def get_articles_by_date(self, target_date: date) -> List[Article]:
+        return self._repo.get_articles_by_date(target_date)
+
+    async def get_number_of_articles(self) -> int:
+        return self._repo.get_number_of_articles()
+
+    async def get_first_article(self) -> Article:
+        return self._repo.get_first_article()
+
+    async def get_last_article(self) -> Article:
+        return self._repo.get_last_article()
+
+    async def get_articles_by_id(self, id_list) -> List[Article]:
+        return self._repo.get_articles_by_id(id_list)
+
+    async def get_article_ids_for_tag(self, tag_name: str) -> List[int]:
+        return self._repo.get_article_ids_for_tag(tag_name)
+
+    async def get_date_of_previous_article(self, article: Article) -> date:
+        return self._repo.get_date_of_previous_article(article)
+
+    async def get_date_of_next_article(self, article: Article) -> date:
+        return self._repo.get_date_of_next_article(article)
+
+    async def get_tags(self) -> List[Tag]:
+        return self._repo.get_tags()
+
+    async def get_comments_for_article(self, article_id: int, quantity: int, cursor=None) -> Tuple[List[Comment], tuple]:
+        return self._repo.get_comments_for_article(article_id, quantity, cursor)
@@ -0,0 +1,249 @@
+import asyncio
+import itertools
+import queue
+import sqlite3
+import threading
+from datetime import date, datetime
+from types import SimpleNamespace
+from typing import List, Tuple
+from urllib.parse import quote
+
+from covid.adapters.async_repository import AbstractAsyncRepository
+
+
+class AsyncSqliteConnection:
+    """ A SQLite connection that can be used from coroutines.
+
+    sqlite3 only offers blocking calls, so the connection is owned by a dedicated thread that runs statements one at a
+    time. Coroutines queue their statements and await the results, so the event loop is never blocked on the database.
+    """
+
+    def __init__(self, database: str, read_only: bool = True):
+        self._jobs = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, args=(database, read_only), name='async-sqlite', daemon=True)
+        self._thread.start()
+
+    def _run(self, database: str, read_only: bool):
+        try:
+            if read_only:
+                # The path is quoted, so that characters such as '?' and '#' in it aren't taken as part of the URI.
+                connection = sqlite3.connect(f'file:{quote(database)}?mode=ro', uri=True)
+            else:
+                connection = sqlite3.connect(database)
+        except sqlite3.Error as error:
+            self._fail_jobs(database, error)
+            return
+
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                loop, future, statement = job
+                try:
+                    result = statement(connection)
+                except Exception as error:
+                    loop.call_soon_threadsafe(_set_exception, future, error)
+                else:
+                    loop.call_soon_threadsafe(_set_result, future, result)
+        finally:
+            connection.close()
+
+    def _fail_jobs(self, database: str, error: sqlite3.Error):
+        # Without a connection, statements queued now and later fail straight away, rather than waiting forever.
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            loop, future, _ = job
+            failure = sqlite3.OperationalError(f'Could not open {database}: {error}')
+            loop.call_soon_threadsafe(_set_exception, future, failure)
+
+    async def _submit(self, statement):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._jobs.put((loop, future, statement))
+        return await future
+
+    async def fetchall(self, sql: str, parameters=()) -> list:
+        return await self._submit(lambda connection: connection.execute(sql, parameters).fetchall())
+
+    async def fetchone(self, sql: str, parameters=()):
+        return await self._submit(lambda connection: connection.execute(sql, parameters).fetchone())
+
+    def close(self):
+        # Statements already queued are run before the connection closes.
+        self._jobs.put(None)
+        self._thread.join()
+
+
+def _set_result(future, result):
+    if not future.cancelled():
+        future.set_result(result)
+
+
+def _set_exception(future, error):
+    if not future.cancelled():
+        future.set_exception(error)
+
+
+class AsyncSqlitePool:
+    # A fixed set of connections, handed out in turn, so that up to size statements run at the same time.
+
+    def __init__(self, database: str, size: int = 4):
+        self._connections = [AsyncSqliteConnection(database) for _ in range(size)]
+        self._next_connection = itertools.cycle(self._connections)
+
+    async def fetchall(self, sql: str, parameters=()) -> list:
+        return await next(self._next_connection).fetchall(sql, parameters)
+
+    async def fetchone(self, sql: str, parameters=()):
+        return await next(self._next_connection).fetchone(sql, parameters)
+
+    def close(self):
+        for connection in self._connections:
+            connection.close()
+
+
+# Timestamps are stored in the format written by SQLAlchemy's DateTime type.
+timestamp_format = '%Y-%m-%d %H:%M:%S.%f'
+
+article_columns = 'articles.id, articles.date, articles.title, articles.first_para, articles.hyperlink, ' \
+                  'articles.image_hyperlink, articles.comment_count'
+
+
+class AsyncSqliteRepository(AbstractAsyncRepository):
+    """ Reads the database written by SqlAlchemyRepository, without going through the ORM.
+
+    Results are read-only records with the same attributes as the domain model classes (an Article record has id, date,
+    title, tags, comment_count and so on), so the service layer's conversion functions work on them unchanged. Related
+    entities are only filled in as far as the conversion functions need: Article records have no comments, and Tag
+    records refer to their tagged Articles by id.
+    """
+
+    def __init__(self, database):
+        self._database = database
+
+    async def get_user(self, username):
+        row = await self._database.fetchone('SELECT username, password FROM users WHERE username = ?', (username,))
+        if row is None:
+            return None
+        return SimpleNamespace(username=row[0], password=row[1])
+
+    async def get_article(self, id: int):
+        articles = await self._articles_where('articles.id = ?', (id,))
+        return articles[0] if len(articles) > 0 else None
+
+    async def get_articles_by_date(self, target_date: date) -> list:
+        return await self._articles_where('articles.date = ?', (target_date.isoformat(),))
+
+    async def get_number_of_articles(self) -> int:
+        row = await self._database.fetchone('SELECT COUNT(*) FROM articles')
+        return row[0]
+
+    async def get_first_article(self):
+        articles = await self._articles_where('1 = 1', order_by='articles.date ASC, articles.id ASC LIMIT 1')
+        return articles[0] if len(articles) > 0 else None
+
+    async def get_last_article(self):
+        articles = await self._articles_where('1 = 1', order_by='articles.date DESC, articles.id DESC LIMIT 1')
+        return articles[0] if len(articles) > 0 else None
+
+    async def get_articles_by_id(self, id_list) -> list:
+        id_list = list(id_list)
+        if len(id_list) == 0:
+            return list()
+        placeholders = ', '.join('?' * len(id_list))
+        return await self._articles_where(f'articles.id IN ({placeholders})', id_list)
+
+    async def get_article_ids_for_tag(self, tag_name: str) -> List[int]:
+        rows = await self._database.fetchall(
+            'SELECT article_tags.article_id FROM article_tags JOIN tags ON tags.id = article_tags.tag_id '
+            'WHERE tags.name = ? ORDER BY article_tags.article_id ASC', (tag_name,))
+        return [row[0] for row in rows]
+
+    async def get_date_of_previous_article(self, article) -> date:
+        row = await self._database.fetchone(
+            'SELECT MAX(date) FROM articles WHERE date < ?', (article.date.isoformat(),))
+        return None if row[0] is None else date.fromisoformat(row[0])
+
+    async def get_date_of_next_article(self, article) -> date:
+        row = await self._database.fetchone(
+            'SELECT MIN(date) FROM articles WHERE date > ?', (article.date.isoformat(),))
+        return None if row[0] is None else date.fromisoformat(row[0])
+
+    async def get_tags(self) -> list:
+        rows = await self._database.fetchall(
+            'SELECT tags.id, tags.name, article_tags.article_id FROM tags '
+            'LEFT JOIN article_tags ON article_tags.tag_id = tags.id ORDER BY tags.id, article_tags.article_id')
+        return list(self._tags_from_rows(rows).values())
+
+    async def get_comments_for_article(self, article_id: int, quantity: int, cursor=None) -> Tuple[list, tuple]:
+        # Keyset pagination over the (article_id, timestamp, id) index; fetch one extra row to detect a following page.
+        sql = 'SELECT comments.id, users.username, comments.comment, comments.timestamp FROM comments ' \
+              'JOIN users ON users.id = comments.user_id WHERE comments.article_id = ?'
+        parameters = [article_id]
+        if cursor is not None:
+            timestamp = cursor[0].strftime(timestamp_format)
+            sql += ' AND (comments.timestamp > ? OR (comments.timestamp = ? AND comments.id > ?))'
+            parameters += [timestamp, timestamp, cursor[1]]
+        sql += ' ORDER BY comments.timestamp ASC, comments.id ASC LIMIT ?'
+        parameters.append(quantity + 1)
+        rows = await self._database.fetchall(sql, parameters)
+
+        article = SimpleNamespace(id=article_id)
+        page = [
+            SimpleNamespace(
+                id=row[0], user=SimpleNamespace(username=row[1]), article=article, comment=row[2],
+                timestamp=datetime.fromisoformat(row[3]))
+            for row in rows[:quantity]
+        ]
+
+        next_cursor = None
+        if len(rows) > quantity:
+            next_cursor = (page[-1].timestamp, page[-1].id)
+        return page, next_cursor
+
+    async def _articles_where(self, condition: str, parameters=(), order_by: str = 'articles.id ASC') -> list:
+        rows = await self._database.fetchall(
+            f'SELECT {article_columns} FROM articles WHERE {condition} ORDER BY {order_by}', parameters)
+        articles = [
+            SimpleNamespace(
+                id=row[0], date=date.fromisoformat(row[1]), title=row[2], first_para=row[3], hyperlink=row[4],
+                image_hyperlink=row[5], comment_count=row[6], comments=list(), tags=list())
+            for row in rows
+        ]
+        if len(articles) == 0:
+            return articles
+
+        # Attach the Articles' Tags, each listing every Article it's applied to.
+        placeholders = ', '.join('?' * len(articles))
+        tag_rows = await self._database.fetchall(
+            'SELECT tags.id, tags.name, all_tags.article_id, article_tags.article_id FROM article_tags '
+            'JOIN tags ON tags.id = article_tags.tag_id '
+            'JOIN article_tags AS all_tags ON all_tags.tag_id = tags.id '
+            f'WHERE article_tags.article_id IN ({placeholders}) ORDER BY tags.id, all_tags.article_id',
+            [article.id for article in articles])
+
+        tags = self._tags_from_rows(tag_rows)
+        articles_by_id = {article.id: article for article in articles}
+        attached = set()
+        for tag_id, _, _, article_id in tag_rows:
+            if (tag_id, article_id) not in attached:
+                attached.add((tag_id, article_id))
+                articles_by_id[article_id].tags.append(tags[tag_id])
+        return articles
+
+    @staticmethod
+    def _tags_from_rows(rows) -> dict:
+        # rows start with (tag id, tag name, tagged article id).
+        tags = dict()
+        tagged = set()
+        for row in rows:
+            tag_id, tag_name, tagged_article_id = row[0], row[1], row[2]
+            tag = tags.setdefault(tag_id, SimpleNamespace(tag_name=tag_name, tagged_articles=list()))
+            if tagged_article_id is not None and (tag_id, tagged_article_id) not in tagged:
+                tagged.add((tag_id, tagged_article_id))
+                tag.tagged_articles.append(SimpleNamespace(id=tagged_article_id))
+        return tags
@@ -0,0 +1,63 @@
+from __future__ import annotations
+from bisect import insort
+from typing import Dict, Hashable, List, Tuple
+
+
+# The keys are spread over FANOUT * FANOUT buckets, held in FANOUT groups.
+FANOUT = 64
+
+_EMPTY_GROUP = (dict(),) * FANOUT
+
+
+class CommentIndex:
+    """ Immutable map from a key, such as a username or an article id, to that key's Comment entries, each a
+    (timestamp, position, Comment) tuple, in sorted order.
+
+    add() returns a new CommentIndex holding more entries and leaves this one unchanged, sharing everything it doesn't
+    change with it. Only the group and bucket of each key that gains entries are copied, so a write costs the same
+    however many keys the index holds. Each key's entries are a list and a count, of which only the first count belong
+    to the index. An entry that sorts after all of them is appended to the list in place; the list is only copied when
+    an entry has to go anywhere else, or when the list has been appended to by an index that was never published.
+    """
+
+    def __init__(self, groups: tuple = None):
+        self._groups = groups if groups is not None else (_EMPTY_GROUP,) * FANOUT
+
+    def entries(self, key: Hashable) -> Tuple[list, int]:
+        # Returns the key's entries list and how many of them belong to this index.
+        group, bucket = self._slot(key)
+        return self._groups[group][bucket].get(key, ((), 0))
+
+    def add(self, new_entries: Dict[Hashable, List[tuple]]) -> CommentIndex:
+        groups = list(self._groups)
+        copied_groups = set()
+        copied_buckets = set()
+        for key, added in new_entries.items():
+            group, bucket = self._slot(key)
+            if group not in copied_groups:
+                groups[group] = list(groups[group])
+                copied_groups.add(group)
+            if (group, bucket) not in copied_buckets:
+                groups[group][bucket] = dict(groups[group][bucket])
+                copied_buckets.add((group, bucket))
+
+            entries, count = groups[group][bucket].get(key, (None, 0))
+            if entries is None:
+                entries = list()
+            for entry in sorted(added):
+                if len(entries) == count and (count == 0 or entries[-1] < entry):
+                    entries.append(entry)
+                else:
+                    entries = entries[:count]
+                    insort(entries, entry)
+                count += 1
+            groups[group][bucket][key] = (entries, count)
+
+        for group in copied_groups:
+            groups[group] = tuple(groups[group])
+        return CommentIndex(tuple(groups))
+
+    @staticmethod
+    def _slot(key: Hashable) -> Tuple[int, int]:
+        slot = hash(key) % (FANOUT * FANOUT)
+        return slot // FANOUT, slot % FANOUT
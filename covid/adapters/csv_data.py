@@ -0,0 +1,96 @@
+import csv
+import os
+from datetime import date, datetime
+from typing import Dict, List, Tuple
+
+from werkzeug.security import generate_password_hash
+
+from covid.adapters.repository import AbstractRepository
+from covid.domain.model import Article, Tag, User, Comment, make_tag_association, make_comment
+
+
+def read_csv_file(filename: str):
+    with open(filename) as infile:
+        reader = csv.reader(infile)
+
+        # Read first line of the the CSV file.
+        headers = next(reader)
+
+        # Read remaining rows from the CSV file.
+        for row in reader:
+            # Strip any leading/trailing white space from data read.
+            row = [item.strip() for item in row]
+            yield row
+
+
+def read_articles_and_tags(data_path: str) -> Tuple[List[Article], List[Tag]]:
+    articles = list()
+    tags = dict()
+
+    for data_row in read_csv_file(os.path.join(data_path, 'news_articles.csv')):
+
+        article_key = int(data_row[0])
+        number_of_tags = len(data_row) - 6
+        article_tags = data_row[-number_of_tags:]
+        del data_row[-number_of_tags:]
+
+        # Create Article object.
+        article = Article(
+            date=date.fromisoformat(data_row[1]),
+            title=data_row[2],
+            first_para=data_row[3],
+            hyperlink=data_row[4],
+            image_hyperlink=data_row[5],
+            id=article_key
+        )
+        articles.append(article)
+
+        # Add any new tags; associate the current article with tags.
+        for tag_name in article_tags:
+            if tag_name not in tags:
+                tags[tag_name] = Tag(tag_name)
+            make_tag_association(article, tags[tag_name])
+
+    return articles, list(tags.values())
+
+
+def read_users(data_path: str) -> Dict[str, User]:
+    # Returns the Users keyed by their ids in the CSV file, which the comments file refers to them by.
+    users = dict()
+
+    for data_row in read_csv_file(os.path.join(data_path, 'users.csv')):
+        user = User(
+            username=data_row[1],
+            password=generate_password_hash(data_row[2])
+        )
+        users[data_row[0]] = user
+    return users
+
+
+def read_comments(data_path: str, users: Dict[str, User], articles: Dict[int, Article]) -> List[Comment]:
+    comments = list()
+
+    for data_row in read_csv_file(os.path.join(data_path, 'comments.csv')):
+        comment = make_comment(
+            comment_text=data_row[3],
+            user=users[data_row[1]],
+            article=articles[int(data_row[2])],
+            timestamp=datetime.fromisoformat(data_row[4])
+        )
+        comments.append(comment)
+    return comments
+
+
+def populate(data_path: str, repo: AbstractRepository):
+    """ Loads the articles, tags, users and comments in the CSV files in data_path into repo.
+
+    Each kind of entity is read in full and stored with one call to the repository's bulk methods.
+    """
+    articles, tags = read_articles_and_tags(data_path)
+    repo.add_articles(articles)
+    repo.add_tags(tags)
+
+    users = read_users(data_path)
+    repo.add_users(users.values())
+
+    repo.add_comments(read_comments(data_path, users, {article.id: article for article in articles}))
@@ -1,29 +1,47 @@
-import csv
-import os
+from collections import Counter
+from datetime import date, datetime
+from typing import Iterable, Iterator, List, Tuple
 
-from datetime import date
-from typing import List
-
-from sqlalchemy import desc, asc
+from sqlalchemy import desc, asc, bindparam, inspect, select, tuple_
 from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
-from werkzeug.security import generate_password_hash
 
 from covid.domain.model import User, Article, Comment, Tag
-from covid.adapters.repository import AbstractRepository
-
-
-tags = None
+from covid.adapters import csv_data
+from covid.adapters.repository import AbstractRepository, RepositoryException
+from covid.adapters.related_articles import RelatedArticlesIndex
+from covid.adapters.trending import TrendingArticles
+from covid.adapters.orm import (
+    articles as articles_table, comments as comments_table, users as users_table, tags as tags_table,
+    article_tags as article_tags_table
+)
 
 
 class SqlAlchemyRepository(AbstractRepository):
 
-    def __init__(self, session):
+    def __init__(self, session, related_articles: RelatedArticlesIndex = None, trending: TrendingArticles = None):
         self._session = session
 
+        # The in-process indexes are normally shared by all repositories created by the same unit of work.
+        if related_articles is None:
+            related_articles = RelatedArticlesIndex()
+        self._related_articles = related_articles
+
+        if trending is None:
+            trending = TrendingArticles()
+        self._trending = trending
+
     def add_user(self, user: User):
         self._session.add(user)
 
+    def add_users(self, users: Iterable[User]):
+        # The bulk methods insert rows with executemany() statements on the session's connection, so they're part of
+        # the current transaction but don't load the objects into the session.
+        rows = [{'username': user.username, 'password': user.password} for user in users]
+        if len(rows) > 0:
+            self._session.execute(users_table.insert(), rows)
+
     def get_user(self, username) -> User:
         user = None
         try:
@@ -36,6 +54,25 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def add_article(self, article: Article):
         self._session.add(article)
+        self._tag_after_commit((article.id, article.date, tag.tag_name) for tag in article.tags)
+
+    def add_articles(self, articles: Iterable[Article]):
+        # Comment counts start at 0, and are raised as Comments are added.
+        articles = list(articles)
+        rows = [{
+            'id': article.id,
+            'date': article.date,
+            'title': article.title,
+            'first_para': article.first_para,
+            'hyperlink': article.hyperlink,
+            'image_hyperlink': article.image_hyperlink,
+            'comment_count': 0
+        } for article in articles]
+        if len(rows) > 0:
+            self._session.execute(articles_table.insert(), rows)
+
+        self._tag_after_commit(
+            (article.id, article.date, tag.tag_name) for article in articles for tag in article.tags)
 
     def get_article(self, id: int) -> Article:
         article = None
@@ -66,6 +103,33 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_articles_by_id(self, id_list):
         return self._session.query(Article).filter(Article._id.in_(id_list)).all()
 
+    def get_article_page(self, quantity: int, cursor: int = None) -> Tuple[List[Article], int]:
+        # Keyset pagination over the primary key; fetch one extra row to detect a following page.
+        query = self._session.query(Article)
+        if cursor is not None:
+            query = query.filter(Article._id > cursor)
+        page = query.order_by(asc(Article._id)).limit(quantity + 1).all()
+
+        next_cursor = None
+        if len(page) > quantity:
+            page = page[:quantity]
+            next_cursor = page[-1].id
+        return page, next_cursor
+
+    def iter_articles(self, batch_size: int = 1000) -> Iterator[Article]:
+        # Load Articles batch_size rows at a time rather than materialising the whole result. Each batch is read after
+        # the last id of the one before, and its Articles' Tags are loaded together in one more query.
+        last_id = None
+        while True:
+            query = self._session.query(Article).options(selectinload(Article._tags))
+            if last_id is not None:
+                query = query.filter(articles_table.c.id > last_id)
+            batch = query.order_by(asc(articles_table.c.id)).limit(batch_size).all()
+            if len(batch) == 0:
+                return
+            yield from batch
+            last_id = batch[-1].id
+
     def get_article_ids_for_tag(self, tag_name: str):
         # Use native SQL to retrieve article ids, since there is no mapped class for the article_tags table.
         row = self._session.execute('SELECT id FROM tags WHERE name = :tag_name', {'tag_name': tag_name}).fetchone()
@@ -85,6 +149,17 @@ class SqlAlchemyRepository(AbstractRepository):
 
         return article_ids
 
+    def get_related_article_ids(self, article_id: int, quantity: int) -> List[int]:
+        if not self._related_articles.loaded:
+            # Build the index from the article_tags table on first use.
+            rows = self._session.execute(
+                select([article_tags_table.c.article_id, articles_table.c.date, tags_table.c.name])
+                .select_from(article_tags_table.join(articles_table).join(tags_table))
+            ).fetchall()
+            self._related_articles.load(rows)
+
+        return self._related_articles.related_article_ids(article_id, quantity)
+
     def get_date_of_previous_article(self, article: Article):
         result = None
         prev = self._session.query(Article).filter(Article._date < article.date).order_by(desc(Article._date)).first()
@@ -106,123 +181,198 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def add_tag(self, tag: Tag):
         self._session.add(tag)
+        self._tag_after_commit((article.id, article.date, tag.tag_name) for article in tag.tagged_articles)
 
-    def get_comments(self):
-        return self._session.query(Comment).all()
-
-    def add_comment(self, comment: Comment):
-        super().add_comment(comment)
-        self._session.add(comment)
-
-
-def article_record_generator(filename: str):
-    with open(filename) as infile:
-        reader = csv.reader(infile)
-
-        # Read first line of the the CSV file.
-        headers = next(reader)
-
-        # Read remaining rows from the CSV file.
-        for row in reader:
-            article_data = row
-            article_key = article_data[0]
+    def add_tags(self, tags: Iterable[Tag]):
+        # Each Tag is inserted on its own for its generated id; the Tags' Articles are linked in one statement.
+        article_tag_rows = list()
+        for tag in tags:
+            tag_id = self._session.execute(tags_table.insert(), {'name': tag.tag_name}).inserted_primary_key[0]
 
-            # Strip any leading/trailing white space from data read.
-            article_data = [item.strip() for item in article_data]
-
-            number_of_tags = len(article_data) - 6
-            article_tags = article_data[-number_of_tags:]
-
-            # Add and new tags; associate the current article with tags.
-            for tag in article_tags:
-                if tag not in tags.keys():
-                    tags[tag] = list()
-                tags[tag].append(article_key)
-
-            del article_data[-number_of_tags:]
-
-            yield article_data
-
-
-def get_tag_records():
-    tag_records = list()
-    tag_key = 0
-
-    for tag in tags.keys():
-        tag_key = tag_key + 1
-        tag_records.append((tag_key, tag))
-    return tag_records
-
-
-def article_tags_generator():
-    article_tags_key = 0
-    tag_key = 0
-
-    for tag in tags.keys():
-        tag_key = tag_key + 1
-        for article_key in tags[tag]:
-            article_tags_key = article_tags_key + 1
-            yield article_tags_key, article_key, tag_key
-
-
-def generic_generator(filename, post_process=None):
-    with open(filename) as infile:
-        reader = csv.reader(infile)
-
-        # Read first line of the CSV file.
-        next(reader)
+            article_ids = list()
+            for article in tag.tagged_articles:
+                if article.id not in article_ids:
+                    article_ids.append(article.id)
+            article_tag_rows.extend({'article_id': article_id, 'tag_id': tag_id} for article_id in article_ids)
+            self._tag_after_commit((article.id, article.date, tag.tag_name) for article in tag.tagged_articles)
 
-        # Read remaining rows from the CSV file.
-        for row in reader:
-            # Strip any leading/trailing white space from data read.
-            row = [item.strip() for item in row]
+        if len(article_tag_rows) > 0:
+            self._session.execute(article_tags_table.insert(), article_tag_rows)
 
-            if post_process is not None:
-                row = post_process(row)
-            yield row
+    def get_comments(self):
+        return self._session.query(Comment).all()
 
+    def add_comment(self, comment: Comment):
+        # The mapper's backrefs link a new Comment from its User and Article without loading their Comments. Any count
+        # make_comment() has added to the Article is left unflushed, and discarded below.
+        with self._session.no_autoflush:
+            super().add_comment(comment)
+            self._session.add(comment)
+
+            # Increment the denormalised count in an UPDATE statement of its own, so concurrent writers can't lose
+            # updates. The Article's count is expired rather than flushed, and read back with the increment when next
+            # used.
+            self._session.execute(
+                articles_table.update()
+                .where(articles_table.c.id == comment.article.id)
+                .values(comment_count=articles_table.c.comment_count + 1)
+            )
+            state = inspect(comment.article, raiseerr=False)
+            if state is not None and state.session_id is not None:
+                self._session.expire(comment.article, ['_comment_count'])
+
+        # Count the Comment towards trending Articles only once it has been committed. The pending list is kept on the
+        # session, which is private to the current thread.
+        self._session.info.setdefault('uncommitted_comments', list()).append((comment.article.id, comment.timestamp))
+
+    def add_comments(self, comments: Iterable[Comment]):
+        comments = list(comments)
+        with self._session.no_autoflush:
+            for comment in comments:
+                AbstractRepository.add_comment(self, comment)
+
+            # Comments on Articles and Users loaded by the session must go through it, so that the objects it holds
+            # stay consistent. The rest, such as those read from the CSV files, are inserted directly.
+            inserted = list()
+            for comment in comments:
+                state = inspect(comment.article, raiseerr=False)
+                if state is not None and state.session_id is not None:
+                    self.add_comment(comment)
+                else:
+                    inserted.append(comment)
+        if len(inserted) == 0:
+            return
+
+        usernames = {comment.user.username for comment in inserted}
+        user_ids = dict(self._session.execute(
+            select([users_table.c.username, users_table.c.id]).where(users_table.c.username.in_(usernames))
+        ).fetchall())
+        missing = usernames - user_ids.keys()
+        if len(missing) > 0:
+            raise RepositoryException(f'Unknown users: {", ".join(sorted(missing))}')
+
+        self._session.execute(comments_table.insert(), [{
+            'user_id': user_ids[comment.user.username],
+            'article_id': comment.article.id,
+            'comment': comment.comment,
+            'timestamp': comment.timestamp
+        } for comment in inserted])
+
+        counts = Counter(comment.article.id for comment in inserted)
+        self._session.execute(
+            articles_table.update()
+            .where(articles_table.c.id == bindparam('article_id'))
+            .values(comment_count=articles_table.c.comment_count + bindparam('added')),
+            [{'article_id': article_id, 'added': added} for article_id, added in counts.items()]
+        )
+
+        self._session.info.setdefault('uncommitted_comments', list()).extend(
+            (comment.article.id, comment.timestamp) for comment in inserted)
+
+    def get_comments_for_article(self, article_id: int, quantity: int, cursor=None) -> Tuple[List[Comment], tuple]:
+        # Keyset pagination over the (article_id, timestamp, id) index; fetch one extra row to detect a following page.
+        query = self._session.query(Comment).filter(comments_table.c.article_id == article_id)
+        if cursor is not None:
+            query = query.filter(tuple_(comments_table.c.timestamp, comments_table.c.id) > tuple_(*cursor))
+        page = query.order_by(asc(comments_table.c.timestamp), asc(comments_table.c.id)).limit(quantity + 1).all()
+
+        next_cursor = None
+        if len(page) > quantity:
+            page = page[:quantity]
+            next_cursor = (page[-1].timestamp, page[-1].id)
+        return page, next_cursor
+
+    def iter_comments(self, article_id: int = None, batch_size: int = 1000) -> Iterator[Comment]:
+        if article_id is None:
+            query = self._session.query(Comment).order_by(asc(comments_table.c.id))
+        else:
+            query = self._session.query(Comment).filter(comments_table.c.article_id == article_id)
+            query = query.order_by(asc(comments_table.c.timestamp), asc(comments_table.c.id))
+
+        # Load Comments batch_size rows at a time rather than materialising the whole result, each with its User and
+        # Article.
+        query = query.options(joinedload(Comment._user), joinedload(Comment._article))
+        yield from query.yield_per(batch_size)
+
+    def get_comments_for_user(self, username: str, quantity: int, cursor=None) -> Tuple[List[Comment], tuple]:
+        user = self.get_user(username)
+        if user is None:
+            return list(), None
+
+        # Keyset pagination over the (user_id, timestamp, id) index; fetch one extra row to detect a following page.
+        query = self._session.query(Comment).filter(comments_table.c.user_id == user.id)
+        if cursor is not None:
+            query = query.filter(tuple_(comments_table.c.timestamp, comments_table.c.id) < tuple_(*cursor))
+        page = query.order_by(desc(comments_table.c.timestamp), desc(comments_table.c.id)).limit(quantity + 1).all()
+
+        next_cursor = None
+        if len(page) > quantity:
+            page = page[:quantity]
+            next_cursor = (page[-1].timestamp, page[-1].id)
+        return page, next_cursor
+
+    def get_most_commented_article_ids(self, quantity: int) -> List[Tuple[int, int]]:
+        # Reads the leading entries of the (comment_count, id) index rather than aggregating the comments table.
+        rows = self._session.execute(
+            select([articles_table.c.id, articles_table.c.comment_count])
+            .where(articles_table.c.comment_count > 0)
+            .order_by(desc(articles_table.c.comment_count), desc(articles_table.c.id))
+            .limit(quantity)
+        ).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def get_trending_article_ids(self, quantity: int, now: datetime = None) -> List[Tuple[int, float]]:
+        if not self._trending.loaded:
+            # Build the counters from the comments table on first use.
+            rows = self._session.execute(select([comments_table.c.article_id, comments_table.c.timestamp])).fetchall()
+            self._trending.load(rows)
+
+        return self._trending.top(quantity, now)
+
+    def after_commit(self):
+        # Tags and Comments committed before the indexes are loaded are picked up by the loads themselves.
+        uncommitted_tags = self._session.info.pop('uncommitted_tags', list())
+        if self._related_articles.loaded:
+            for article_id, article_date, tag_name in uncommitted_tags:
+                self._related_articles.tag_article(article_id, article_date, tag_name)
+
+        uncommitted_comments = self._session.info.pop('uncommitted_comments', list())
+        if self._trending.loaded:
+            for article_id, timestamp in uncommitted_comments:
+                self._trending.record(article_id, timestamp)
+
+    def after_rollback(self):
+        self._session.info.pop('uncommitted_tags', None)
+        self._session.info.pop('uncommitted_comments', None)
+
+    def _tag_after_commit(self, rows: Iterable[Tuple[int, date, str]]):
+        # The shared related articles index only learns of an Article's Tags once they have been committed. Like the
+        # Comments for trending Articles, the pending rows are kept on the session.
+        self._session.info.setdefault('uncommitted_tags', list()).extend(rows)
 
-def process_user(user_row):
-    user_row[2] = generate_password_hash(user_row[2])
-    return user_row
 
 
 def populate(engine: Engine, data_path: str):
-    conn = engine.raw_connection()
-    cursor = conn.cursor()
-
-    global tags
-    tags = dict()
-
-    insert_articles = """
-        INSERT INTO articles (
-        id, date, title, first_para, hyperlink, image_hyperlink)
-        VALUES (?, ?, ?, ?, ?, ?)"""
-    cursor.executemany(insert_articles, article_record_generator(os.path.join(data_path, 'news_articles.csv')))
-
-    insert_tags = """
-        INSERT INTO tags (
-        id, name)
-        VALUES (?, ?)"""
-    cursor.executemany(insert_tags, get_tag_records())
-
-    insert_article_tags = """
-        INSERT INTO article_tags (
-        id, article_id, tag_id)
-        VALUES (?, ?, ?)"""
-    cursor.executemany(insert_article_tags, article_tags_generator())
-
-    insert_users = """
-        INSERT INTO users (
-        id, username, password)
-        VALUES (?, ?, ?)"""
-    cursor.executemany(insert_users, generic_generator(os.path.join(data_path, 'users.csv'), process_user))
-
-    insert_comments = """
-        INSERT INTO comments (
-        id, user_id, article_id, comment, timestamp)
-        VALUES (?, ?, ?, ?, ?)"""
-    cursor.executemany(insert_comments, generic_generator(os.path.join(data_path, 'comments.csv')))
-
-    conn.commit()
-    conn.close()
+    # Load the CSV files through the repository's bulk methods, in a single transaction.
+    session = Session(bind=engine)
+    try:
+        csv_data.populate(data_path, SqlAlchemyRepository(session))
+        session.commit()
+    finally:
+        session.close()
+
+
+def upgrade(engine: Engine):
+    # Brings a database created by an earlier version up to date, and does nothing to one that already is.
+    with engine.begin() as connection:
+        article_columns = [column['name'] for column in inspect(connection).get_columns('articles')]
+        if 'comment_count' not in article_columns:
+            connection.execute('ALTER TABLE articles ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0')
+            connection.execute(
+                'UPDATE articles SET comment_count = '
+                '(SELECT count(*) FROM comments WHERE comments.article_id = articles.id)')
+
+        for table in (articles_table, comments_table):
+            for index in table.indexes:
+                index_columns = ', '.join(column.name for column in index.columns)
+                connection.execute(f'CREATE INDEX IF NOT EXISTS {index.name} ON {table.name} ({index_columns})')
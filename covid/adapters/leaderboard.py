@@ -0,0 +1,67 @@
+from heapq import heappop, heappush
+from threading import RLock
+from typing import List, Tuple
+
+
+class CommentLeaderboard:
+    """ Indexed binary max-heap of Articles keyed by comment count.
+
+    A position map from article id to heap slot lets a count be raised in place and sifted up in O(log n). Articles with
+    equal counts are ordered by decreasing id, which matches the ordering used by the SQL repository.
+    """
+
+    def __init__(self):
+        self._heap = list()
+        self._positions = dict()
+        self._counts = dict()
+        self._lock = RLock()
+
+    def increment(self, article_id: int, amount: int = 1):
+        with self._lock:
+            if article_id in self._positions:
+                self._counts[article_id] += amount
+                self._sift_up(self._positions[article_id])
+            else:
+                self._counts[article_id] = amount
+                self._heap.append(article_id)
+                self._positions[article_id] = len(self._heap) - 1
+                self._sift_up(len(self._heap) - 1)
+
+    def count(self, article_id: int) -> int:
+        return self._counts.get(article_id, 0)
+
+    def top(self, quantity: int) -> List[Tuple[int, int]]:
+        """ Returns up to quantity (article id, comment count) tuples, most commented Article first. """
+        with self._lock:
+            ranked = list()
+            if len(self._heap) == 0:
+                return ranked
+
+            # Walk the heap best-first using a small frontier heap of slot indices, visiting O(quantity) slots.
+            frontier = [(self._key(0), 0)]
+            while frontier and len(ranked) < quantity:
+                _, slot = heappop(frontier)
+                article_id = self._heap[slot]
+                ranked.append((article_id, self._counts[article_id]))
+                for child in (2 * slot + 1, 2 * slot + 2):
+                    if child < len(self._heap):
+                        heappush(frontier, (self._key(child), child))
+            return ranked
+
+    def _key(self, slot: int):
+        # Min-heap key for the frontier: largest count, then largest id, first.
+        article_id = self._heap[slot]
+        return -self._counts[article_id], -article_id
+
+    def _sift_up(self, slot: int):
+        while slot > 0:
+            parent = (slot - 1) // 2
+            if self._key(slot) >= self._key(parent):
+                break
+            self._swap(slot, parent)
+            slot = parent
+
+    def _swap(self, i: int, j: int):
+        self._heap[i], self._heap[j] = self._heap[j], self._heap[i]
+        self._positions[self._heap[i]] = i
+        self._positions[self._heap[j]] = j
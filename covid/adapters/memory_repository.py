@@ -1,41 +1,107 @@
-import csv
-import os
+from __future__ import annotations
+from collections import Counter
 from datetime import date, datetime
-from typing import List
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple
 
-from bisect import bisect, bisect_left, insort_left
-
-from werkzeug.security import generate_password_hash
+from bisect import bisect, bisect_left
+from threading import Lock, local
 
+from covid.adapters import csv_data, write_ahead_log
+from covid.adapters.comment_index import CommentIndex
 from covid.adapters.repository import AbstractRepository, RepositoryException
-from covid.domain.model import Article, Tag, User, Comment, make_tag_association, make_comment
+from covid.adapters.related_articles import RelatedArticlesIndex
+from covid.adapters.trending import TrendingArticles
+from covid.adapters.leaderboard import CommentLeaderboard
+from covid.adapters.write_ahead_log import WriteAheadLog
+from covid.domain.model import Article, Tag, User, Comment, attach_comment
+
+
+class MemoryTransaction:
+    # Writes held back until commit, each a store method with its items.
+
+    def __init__(self):
+        self.writes = list()
+
+
+class MemorySnapshot(NamedTuple):
+    # The repository's contents as of one commit. A snapshot is never changed once it has been published, except that
+    # later snapshots may append to the users and comments lists; user_count and comment_count say how many belong to
+    # this one.
+    articles: List[Article]
+    articles_index: Dict[int, Article]
+    article_ids: List[int]
+    tags: List[Tag]
+    users: List[User]
+    user_count: int
+    comments: List[Comment]
+    comment_count: int
+    user_comments: CommentIndex
+    article_comments: CommentIndex
 
 
 class MemoryRepository(AbstractRepository):
     # Articles ordered by date, not id. id is assumed unique.
+    #
+    # Writes made in a transaction, begun by InMemoryUnitOfWork, are held back until it commits and then stored together
+    # while holding a lock, so a failed request leaves nothing half-stored and readers don't see uncommitted writes.
+    # The Articles and Users are shared by every thread, so a Comment that doesn't yet have links from its Article and
+    # User is only linked to them when it's stored, too.
+    #
+    # Readers don't take the lock. Each write builds a new MemorySnapshot and publishes it with a single assignment, so
+    # a reader that takes self._snapshot once sees a consistent state for as long as it holds it. The related articles,
+    # trending and leaderboard indexes have locks of their own, and are updated just before a snapshot is published.
+
+    def __init__(self, log: WriteAheadLog = None):
+        self._snapshot = MemorySnapshot(
+            articles=list(),
+            articles_index=dict(),
+            article_ids=list(),
+            tags=list(),
+            users=list(),
+            user_count=0,
+            comments=list(),
+            comment_count=0,
+            user_comments=CommentIndex(),
+            article_comments=CommentIndex()
+        )
+        self._related_articles = RelatedArticlesIndex()
+        self._trending = TrendingArticles()
+        self._leaderboard = CommentLeaderboard()
+        self._write_lock = Lock()
+        self._transactions = local()
 
-    def __init__(self):
-        self._articles = list()
-        self._articles_index = dict()
-        self._tags = list()
-        self._users = list()
-        self._comments = list()
+        # Committed transactions' users and comments are appended to the log, if there is one.
+        self._log = log
+
+        # The repository that has taken this one's place, once it has been retired.
+        self._successor = None
+
+        # The records logged while retire() replays the log, which the replay may have missed.
+        self._handover = None
 
     def add_user(self, user: User):
-        self._users.append(user)
+        self._write(self._store_users, [user])
+
+    def add_users(self, users: Iterable[User]):
+        self._write(self._store_users, list(users))
 
     def get_user(self, username) -> User:
-        return next((user for user in self._users if user.username == username), None)
+        snapshot = self._snapshot
+        users = islice(snapshot.users, snapshot.user_count)
+        return next((user for user in users if user.username == username), None)
 
     def add_article(self, article: Article):
-        insort_left(self._articles, article)
-        self._articles_index[article.id] = article
+        self._write(self._store_articles, [article])
+
+    def add_articles(self, articles: Iterable[Article]):
+        self._write(self._store_articles, list(articles))
 
     def get_article(self, id: int) -> Article:
         article = None
 
         try:
-            article = self._articles_index[id]
+            article = self._snapshot.articles_index[id]
         except KeyError:
             pass  # Ignore exception and return None.
 
@@ -50,10 +116,11 @@ class MemoryRepository(AbstractRepository):
             image_hyperlink=None
         )
         matching_articles = list()
+        articles = self._snapshot.articles
 
         try:
-            index = self.article_index(target_article)
-            for article in self._articles[index:None]:
+            index = self.article_index(target_article, articles)
+            for article in articles[index:None]:
                 if article.date == target_date:
                     matching_articles.append(article)
                 else:
@@ -65,33 +132,60 @@ class MemoryRepository(AbstractRepository):
         return matching_articles
 
     def get_number_of_articles(self):
-        return len(self._articles)
+        return len(self._snapshot.articles)
 
     def get_first_article(self):
         article = None
+        articles = self._snapshot.articles
 
-        if len(self._articles) > 0:
-            article = self._articles[0]
+        if len(articles) > 0:
+            article = articles[0]
         return article
 
     def get_last_article(self):
         article = None
+        articles = self._snapshot.articles
 
-        if len(self._articles) > 0:
-            article = self._articles[-1]
+        if len(articles) > 0:
+            article = articles[-1]
         return article
 
     def get_articles_by_id(self, id_list):
+        articles_index = self._snapshot.articles_index
+
         # Strip out any ids in id_list that don't represent Article ids in the repository.
-        existing_ids = [id for id in id_list if id in self._articles_index]
+        existing_ids = [id for id in id_list if id in articles_index]
 
         # Fetch the Articles.
-        articles = [self._articles_index[id] for id in existing_ids]
+        articles = [articles_index[id] for id in existing_ids]
         return articles
 
+    def get_article_page(self, quantity: int, cursor: int = None) -> Tuple[List[Article], int]:
+        snapshot = self._snapshot
+
+        # The page starts just after the cursor id, or at the lowest id.
+        start = 0 if cursor is None else bisect(snapshot.article_ids, cursor)
+        page = snapshot.article_ids[start:start + quantity]
+
+        next_cursor = None
+        if start + quantity < len(snapshot.article_ids):
+            next_cursor = page[-1]
+        return [snapshot.articles_index[id] for id in page], next_cursor
+
+    def iter_articles(self, batch_size: int = 1000) -> Iterator[Article]:
+        # The iteration runs over the snapshot published when it starts, whatever is stored in the meantime.
+        snapshot = self._snapshot
+        article_ids = iter(snapshot.article_ids)
+
+        # Hand out the Articles in slices of batch_size.
+        batch = list(islice(article_ids, batch_size))
+        while len(batch) > 0:
+            yield from (snapshot.articles_index[id] for id in batch)
+            batch = list(islice(article_ids, batch_size))
+
     def get_article_ids_for_tag(self, tag_name: str):
         # Linear search, to find the first occurrence of a Tag with the name tag_name.
-        tag = next((tag for tag in self._tags if tag.tag_name == tag_name), None)
+        tag = next((tag for tag in self._snapshot.tags if tag.tag_name == tag_name), None)
 
         # Retrieve the ids of articles associated with the Tag.
         if tag is not None:
@@ -102,12 +196,16 @@ class MemoryRepository(AbstractRepository):
 
         return article_ids
 
+    def get_related_article_ids(self, article_id: int, quantity: int) -> List[int]:
+        return self._related_articles.related_article_ids(article_id, quantity)
+
     def get_date_of_previous_article(self, article: Article):
         previous_date = None
+        articles = self._snapshot.articles
 
         try:
-            index = self.article_index(article)
-            for stored_article in reversed(self._articles[0:index]):
+            index = self.article_index(article, articles)
+            for stored_article in reversed(articles[0:index]):
                 if stored_article.date < article.date:
                     previous_date = stored_article.date
                     break
@@ -119,10 +217,11 @@ class MemoryRepository(AbstractRepository):
 
     def get_date_of_next_article(self, article: Article):
         next_date = None
+        articles = self._snapshot.articles
 
         try:
-            index = self.article_index(article)
-            for stored_article in self._articles[index + 1:len(self._articles)]:
+            index = self.article_index(article, articles)
+            for stored_article in articles[index + 1:len(articles)]:
                 if stored_article.date > article.date:
                     next_date = stored_article.date
                     break
@@ -133,110 +232,247 @@ class MemoryRepository(AbstractRepository):
         return next_date
 
     def add_tag(self, tag: Tag):
-        self._tags.append(tag)
+        self._write(self._store_tags, [tag])
 
     def get_tags(self) -> List[Tag]:
         print('In memory repo, getting tags!')
-        return self._tags
+        return self._snapshot.tags
 
     def add_comment(self, comment: Comment):
-        super().add_comment(comment)
-        self._comments.append(comment)
-
-    def get_comments(self):
-        return self._comments
-
-    # Helper method to return article index.
-    def article_index(self, article: Article):
-        index = bisect_left(self._articles, article)
-        if index != len(self._articles) and self._articles[index].date == article.date:
-            return index
-        raise ValueError
-
-
-def read_csv_file(filename: str):
-    with open(filename) as infile:
-        reader = csv.reader(infile)
-
-        # Read first line of the the CSV file.
-        headers = next(reader)
-
-        # Read remaining rows from the CSV file.
-        for row in reader:
-            # Strip any leading/trailing white space from data read.
-            row = [item.strip() for item in row]
-            yield row
+        self.add_comments([comment])
 
+    def add_comments(self, comments: Iterable[Comment]):
+        comments = list(comments)
+        for comment in comments:
+            AbstractRepository.add_comment(self, comment)
+        self._write(self._store_comments, comments)
 
-def load_articles_and_tags(data_path: str, repo: MemoryRepository):
-    tags = dict()
+        unattached = [comment for comment in comments if not comment.attached]
+        if len(unattached) > 0:
+            self._write(self._attach_comments, unattached)
 
-    for data_row in read_csv_file(os.path.join(data_path, 'news_articles.csv')):
-
-        article_key = int(data_row[0])
-        number_of_tags = len(data_row) - 6
-        article_tags = data_row[-number_of_tags:]
-
-        # Add any new tags; associate the current article with tags.
-        for tag in article_tags:
-            if tag not in tags.keys():
-                tags[tag] = list()
-            tags[tag].append(article_key)
-
-        del data_row[-number_of_tags:]
-
-        # Create Article object.
-        article = Article(
-            date=date.fromisoformat(data_row[1]),
-            title=data_row[2],
-            first_para=data_row[3],
-            hyperlink=data_row[4],
-            image_hyperlink=data_row[5],
-            id=article_key
+    def get_comments(self):
+        snapshot = self._snapshot
+        return snapshot.comments[:snapshot.comment_count]
+
+    def get_comments_for_article(self, article_id: int, quantity: int, cursor=None) -> Tuple[List[Comment], tuple]:
+        article_comments, count = self._snapshot.article_comments.entries(article_id)
+
+        # The page starts just after the cursor position, or at the oldest Comment.
+        start = 0
+        if cursor is not None:
+            start = bisect_left(article_comments, tuple(cursor), 0, count)
+            if start < count and article_comments[start][:2] == tuple(cursor):
+                start += 1
+        page = article_comments[start:min(start + quantity, count)]
+
+        next_cursor = None
+        if start + quantity < count:
+            next_cursor = page[-1][:2]
+        return [comment for _, _, comment in page], next_cursor
+
+    def iter_comments(self, article_id: int = None, batch_size: int = 1000) -> Iterator[Comment]:
+        snapshot = self._snapshot
+        if article_id is None:
+            comments = islice(snapshot.comments, snapshot.comment_count)
+        else:
+            article_comments, count = snapshot.article_comments.entries(article_id)
+            comments = (comment for _, _, comment in islice(article_comments, count))
+
+        # Hand out the Comments in slices of batch_size.
+        batch = list(islice(comments, batch_size))
+        while len(batch) > 0:
+            yield from batch
+            batch = list(islice(comments, batch_size))
+
+    def get_comments_for_user(self, username: str, quantity: int, cursor=None) -> Tuple[List[Comment], tuple]:
+        user_comments, count = self._snapshot.user_comments.entries(username)
+
+        # The page ends just before the cursor position, or at the newest Comment.
+        end = count if cursor is None else bisect_left(user_comments, tuple(cursor), 0, count)
+        start = max(0, end - quantity)
+        page = user_comments[start:end]
+
+        next_cursor = None
+        if start > 0:
+            next_cursor = page[0][:2]
+        return [comment for _, _, comment in reversed(page)], next_cursor
+
+    def get_most_commented_article_ids(self, quantity: int) -> List[Tuple[int, int]]:
+        return self._leaderboard.top(quantity)
+
+    def get_trending_article_ids(self, quantity: int, now: datetime = None) -> List[Tuple[int, float]]:
+        return self._trending.top(quantity, now)
+
+    def begin_transaction(self):
+        # Starts a transaction on the current thread. Until it ends, writes from this thread are held back.
+        self._transactions.current = MemoryTransaction()
+
+    def commit_transaction(self):
+        transaction = getattr(self._transactions, 'current', None)
+        if transaction is None:
+            return
+
+        # Writers commit one at a time, and each commit's writes are published in a single snapshot. The writes are
+        # logged first, so that if they can't be logged nothing is stored.
+        with self._write_lock:
+            successor = self._successor
+            if successor is None:
+                if self._log is not None:
+                    logged = self._log.append(self._log_records(transaction.writes))
+                    if self._handover is not None:
+                        self._handover.extend(logged)
+                snapshot = self._snapshot
+                for store, items in transaction.writes:
+                    snapshot = store(snapshot, items)
+                self._snapshot = snapshot
+        self._transactions.current = MemoryTransaction()
+
+        if successor is not None:
+            # The transaction began before this repository was retired. Its Users and Comments are stored in the
+            # successor instead, against the successor's own Articles.
+            successor.begin_transaction()
+            try:
+                write_ahead_log.restore(self._log_records(transaction.writes), successor)
+                successor.commit_transaction()
+            finally:
+                successor.end_transaction()
+
+    def retire(self, successor: MemoryRepository, publish: Callable[[], None]):
+        """ Hands over to successor, which holds the data loaded from the CSV files, and calls publish() to put it in
+        this repository's place.
+
+        The Users and Comments in the log are replayed into successor while commits carry on here. Commits are then
+        held off only while the records logged meanwhile are replayed and successor is published, and transactions
+        that commit here afterwards are passed on to successor.
+        """
+        if self._log is None:
+            with self._write_lock:
+                publish()
+                self._successor = successor
+            return
+
+        # Commits made from here on keep the records they log, as the replay below may not see them.
+        with self._write_lock:
+            self._handover = list()
+        try:
+            records = self._log.records()
+            write_ahead_log.restore(records, successor)
+            last_lsn = records[-1]['lsn'] if len(records) > 0 else 0
+
+            with self._write_lock:
+                write_ahead_log.restore([record for record in self._handover if record['lsn'] > last_lsn], successor)
+                publish()
+                self._successor = successor
+        finally:
+            with self._write_lock:
+                self._handover = None
+
+    def rollback_transaction(self):
+        transaction = getattr(self._transactions, 'current', None)
+        if transaction is None:
+            return
+
+        # Nothing has been stored or linked yet, so the writes are simply dropped.
+        self._transactions.current = MemoryTransaction()
+
+    def end_transaction(self):
+        self._transactions.__dict__.pop('current', None)
+
+    def _write(self, store, items):
+        # Writes made outside a transaction are stored straight away.
+        transaction = getattr(self._transactions, 'current', None)
+        if transaction is None:
+            with self._write_lock:
+                self._snapshot = store(self._snapshot, items)
+        else:
+            transaction.writes.append((store, items))
+
+    def _log_records(self, writes) -> List[dict]:
+        # Articles and Tags come from the CSV files, so only Users and Comments are logged.
+        records = list()
+        for store, items in writes:
+            if store == self._store_users:
+                records.extend(write_ahead_log.user_record(user) for user in items)
+            elif store == self._store_comments:
+                records.extend(write_ahead_log.comment_record(comment) for comment in items)
+        return records
+
+    # The _store methods return a new snapshot holding the items, leaving the one they're given unchanged. Lists and
+    # dicts that change are copied; the users and comments lists are only ever appended to, so they're shared, and the
+    # comment indexes share what they don't change.
+
+    def _store_users(self, snapshot: MemorySnapshot, users: List[User]) -> MemorySnapshot:
+        del snapshot.users[snapshot.user_count:]
+        snapshot.users.extend(users)
+        return snapshot._replace(user_count=len(snapshot.users))
+
+    def _store_articles(self, snapshot: MemorySnapshot, articles: List[Article]) -> MemorySnapshot:
+        # New Articles go in front, in reverse, so that after a stable sort each one lands before any equal Article -
+        # where insort_left() would put it.
+        stored_articles = list(reversed(articles)) + snapshot.articles
+        stored_articles.sort()
+        article_ids = snapshot.article_ids + [article.id for article in articles]
+        article_ids.sort()
+        articles_index = dict(snapshot.articles_index)
+
+        for article in articles:
+            articles_index[article.id] = article
+
+            # Index any Tags the Article already carries.
+            for tag in article.tags:
+                self._related_articles.tag_article(article.id, article.date, tag.tag_name)
+
+        return snapshot._replace(articles=stored_articles, articles_index=articles_index, article_ids=article_ids)
+
+    def _store_tags(self, snapshot: MemorySnapshot, tags: List[Tag]) -> MemorySnapshot:
+        # Index the Articles the Tags have already been applied to.
+        for tag in tags:
+            for article in tag.tagged_articles:
+                self._related_articles.tag_article(article.id, article.date, tag.tag_name)
+
+        return snapshot._replace(tags=snapshot.tags + tags)
+
+    def _store_comments(self, snapshot: MemorySnapshot, comments: List[Comment]) -> MemorySnapshot:
+        # Keep each User's and each Article's Comments sorted by (timestamp, key), where the key is the Comment's position
+        # in the comments list. The indexes share all but the entries they gain with the snapshot's.
+        new_user_comments = dict()
+        new_article_comments = dict()
+
+        del snapshot.comments[snapshot.comment_count:]
+        for comment in comments:
+            entry = (comment.timestamp, len(snapshot.comments), comment)
+            new_user_comments.setdefault(comment.user.username, list()).append(entry)
+            new_article_comments.setdefault(comment.article.id, list()).append(entry)
+            snapshot.comments.append(comment)
+
+        for comment in comments:
+            self._trending.record(comment.article.id, comment.timestamp)
+        for article_id, count in Counter(comment.article.id for comment in comments).items():
+            self._leaderboard.increment(article_id, count)
+
+        return snapshot._replace(
+            comment_count=len(snapshot.comments),
+            user_comments=snapshot.user_comments.add(new_user_comments),
+            article_comments=snapshot.article_comments.add(new_article_comments)
         )
 
-        # Add the Article to the repository.
-        repo.add_article(article)
-
-    # Create Tag objects, associate them with Articles and add them to the repository.
-    for tag_name in tags.keys():
-        tag = Tag(tag_name)
-        for article_id in tags[tag_name]:
-            article = repo.get_article(article_id)
-            make_tag_association(article, tag)
-        repo.add_tag(tag)
+    @staticmethod
+    def _attach_comments(snapshot: MemorySnapshot, comments: List[Comment]) -> MemorySnapshot:
+        # Links each Comment from its User and Article, as make_comment() does. The snapshot itself doesn't change.
+        for comment in comments:
+            attach_comment(comment)
+        return snapshot
 
-
-def load_users(data_path: str, repo: MemoryRepository):
-    users = dict()
-
-    for data_row in read_csv_file(os.path.join(data_path, 'users.csv')):
-        user = User(
-            username=data_row[1],
-            password=generate_password_hash(data_row[2])
-        )
-        repo.add_user(user)
-        users[data_row[0]] = user
-    return users
-
-
-def load_comments(data_path: str, repo: MemoryRepository, users):
-    for data_row in read_csv_file(os.path.join(data_path, 'comments.csv')):
-        comment = make_comment(
-            comment_text=data_row[3],
-            user=users[data_row[1]],
-            article=repo.get_article(int(data_row[2])),
-            timestamp=datetime.fromisoformat(data_row[4])
-        )
-        repo.add_comment(comment)
+    # Helper method to return article index.
+    def article_index(self, article: Article, articles: List[Article] = None):
+        if articles is None:
+            articles = self._snapshot.articles
+        index = bisect_left(articles, article)
+        if index != len(articles) and articles[index].date == article.date:
+            return index
+        raise ValueError
 
 
 def populate(data_path: str, repo: MemoryRepository):
-    # Load articles and tags into the repository.
-    load_articles_and_tags(data_path, repo)
-
-    # Load users into the repository.
-    users = load_users(data_path, repo)
-
-    # Load comments into the repository.
-    load_comments(data_path, repo, users)
+    csv_data.populate(data_path, repo)
@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Table, MetaData, Column, Integer, String, Date, DateTime,
-    ForeignKey
+    ForeignKey, Index
 )
 from sqlalchemy.orm import mapper, relationship
 
@@ -21,7 +21,10 @@ comments = Table(
     Column('user_id', ForeignKey('users.id')),
     Column('article_id', ForeignKey('articles.id')),
     Column('comment', String(1024), nullable=False),
-    Column('timestamp', DateTime, nullable=False)
+    Column('timestamp', DateTime, nullable=False),
+    # Keyset indexes for paging through a user's comments and an article's comments.
+    Index('ix_comments_user_id_timestamp', 'user_id', 'timestamp', 'id'),
+    Index('ix_comments_article_id_timestamp', 'article_id', 'timestamp', 'id')
 )
 
 articles = Table(
@@ -31,7 +34,10 @@ articles = Table(
     Column('title', String(255), nullable=False),
     Column('first_para', String(1024), nullable=False),
     Column('hyperlink', String(255), nullable=False),
-    Column('image_hyperlink', String(255), nullable=False)
+    Column('image_hyperlink', String(255), nullable=False),
+    # Denormalised count of the article's comments, maintained on every insert into the comments table.
+    Column('comment_count', Integer, nullable=False, default=0, server_default='0'),
+    Index('ix_articles_comment_count', 'comment_count', 'id')
 )
 
 tags = Table(
@@ -65,6 +71,7 @@ def map_model_to_tables():
         '_first_para': articles.c.first_para,
         '_hyperlink': articles.c.hyperlink,
         '_image_hyperlink': articles.c.image_hyperlink,
+        '_comment_count': articles.c.comment_count,
         '_comments': relationship(model.Comment, backref='_article')
     })
     mapper(model.Tag, tags, properties={
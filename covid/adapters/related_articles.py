@@ -0,0 +1,67 @@
+from datetime import date
+from threading import RLock
+from typing import List
+
+
+class RelatedArticlesIndex:
+    """ Sparse Article x Tag matrix used to find Articles that share Tags.
+
+    Rows (article id -> tag names) and columns (tag name -> article ids) are both kept so that tagging an Article only
+    touches the Articles that already carry the same Tag. Shared-tag counts are maintained incrementally as Articles are
+    tagged, and each Article's ranked list of related Articles is cached until one of its counts changes.
+    """
+
+    def __init__(self):
+        self._article_tags = dict()
+        self._tag_articles = dict()
+        self._article_dates = dict()
+        self._overlap = dict()
+        self._ranked = dict()
+        self._lock = RLock()
+        self.loaded = False
+
+    def tag_article(self, article_id: int, article_date: date, tag_name: str):
+        with self._lock:
+            self._article_dates[article_id] = article_date
+            article_tags = self._article_tags.setdefault(article_id, set())
+            if tag_name in article_tags:
+                # The matrix cell is already set; tagging is idempotent.
+                return
+            article_tags.add(tag_name)
+
+            tagged_ids = self._tag_articles.setdefault(tag_name, set())
+            overlap = self._overlap.setdefault(article_id, dict())
+            for other_id in tagged_ids:
+                overlap[other_id] = overlap.get(other_id, 0) + 1
+                other_overlap = self._overlap.setdefault(other_id, dict())
+                other_overlap[article_id] = other_overlap.get(article_id, 0) + 1
+
+                # The other Article's ranking has changed, so discard its cached list.
+                self._ranked.pop(other_id, None)
+            tagged_ids.add(article_id)
+            self._ranked.pop(article_id, None)
+
+    def load(self, rows):
+        # rows is an iterable of (article id, article date, tag name) tuples.
+        with self._lock:
+            for article_id, article_date, tag_name in rows:
+                self.tag_article(article_id, article_date, tag_name)
+            self.loaded = True
+
+    def related_article_ids(self, article_id: int, quantity: int) -> List[int]:
+        ranked = self._ranked.get(article_id)
+        if ranked is None:
+            ranked = self._rank(article_id)
+        return ranked[:quantity]
+
+    def _rank(self, article_id: int) -> List[int]:
+        with self._lock:
+            overlap = self._overlap.get(article_id, dict())
+
+            # Most shared Tags first; ties go to the most recent Article, then to the lowest id.
+            ranked = sorted(
+                overlap.keys(),
+                key=lambda other_id: (-overlap[other_id], -self._article_dates[other_id].toordinal(), other_id)
+            )
+            self._ranked[article_id] = ranked
+            return ranked
@@ -0,0 +1,103 @@
+import logging
+import os
+import signal
+from threading import Event, Lock, Thread, current_thread, main_thread
+
+from covid.adapters import memory_repository
+from covid.adapters.memory_repository import MemoryRepository
+from covid.adapters.unit_of_work import InMemoryUnitOfWork
+from covid.caching.data_version import data_version
+
+
+logger = logging.getLogger(__name__)
+
+
+# Reloader for the memory repository, created by create_app() when DATA_RELOAD is set.
+data_reloader_instance = None
+
+
+class DataReloader:
+    """ Reloads the memory repository from the CSV files in data_path without a restart.
+
+    A reload builds a new MemoryRepository in the background while requests carry on with the current one, then swaps
+    it into the unit of work. The Users and Comments stored since startup are carried over from the log, which may be
+    a WriteAheadLog or an InMemoryLog. Units of work already running keep the repository they started with, and the old
+    repository is freed once the last of them finishes.
+
+    If interval is above 0, a thread checks the files every interval seconds and reloads them when any has changed.
+    """
+
+    def __init__(self, uow: InMemoryUnitOfWork, data_path: str, log, interval: float):
+        self._uow = uow
+        self._data_path = data_path
+        self._log = log
+        self._reload_lock = Lock()
+        self._file_versions = self._read_file_versions()
+        self.reloads = 0
+
+        self._previous_sighup_handler = None
+
+        self._stopping = Event()
+        self._thread = None
+        if interval > 0:
+            self._thread = Thread(target=self._watch, args=(interval,), name='data-reloader', daemon=True)
+            self._thread.start()
+
+    def reload(self):
+        # One reload at a time; a reload asked for meanwhile waits, then loads the files again.
+        with self._reload_lock:
+            # Files that fail to load aren't retried until they change again.
+            self._file_versions = self._read_file_versions()
+            repo = MemoryRepository(self._log)
+            memory_repository.populate(self._data_path, repo)
+
+            def publish():
+                self._uow.repo = repo
+            self._uow.repo.retire(repo, publish)
+            self.reloads += 1
+
+        # Pages cached against the old data are out of date.
+        data_version.bump()
+
+    def reload_in_background(self):
+        # For signal handlers, which shouldn't hold up the thread they interrupt.
+        Thread(target=self._reload_logging_errors, name='data-reload', daemon=True).start()
+
+    def handle_sighup(self):
+        # Signal handlers can only be set from the main thread, and not at all on platforms without SIGHUP.
+        if hasattr(signal, 'SIGHUP') and current_thread() is main_thread():
+            self._previous_sighup_handler = signal.signal(signal.SIGHUP, self._on_sighup)
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        # A stopped reloader no longer answers SIGHUP, and isn't kept alive by the handler.
+        if self._previous_sighup_handler is not None and current_thread() is main_thread():
+            if signal.getsignal(signal.SIGHUP) == self._on_sighup:
+                signal.signal(signal.SIGHUP, self._previous_sighup_handler)
+            self._previous_sighup_handler = None
+
+    def _on_sighup(self, signum, frame):
+        self.reload_in_background()
+
+    def _watch(self, interval: float):
+        while not self._stopping.wait(interval):
+            if self._read_file_versions() != self._file_versions:
+                self._reload_logging_errors()
+
+    def _reload_logging_errors(self):
+        # A reload that fails, say because a file is only half written, leaves the current repository in place.
+        try:
+            self.reload()
+        except Exception:
+            logger.exception('Could not reload the data in %s', self._data_path)
+
+    def _read_file_versions(self) -> dict:
+        versions = dict()
+        for name in sorted(os.listdir(self._data_path)):
+            if name.endswith('.csv'):
+                stat = os.stat(os.path.join(self._data_path, name))
+                versions[name] = (stat.st_mtime_ns, stat.st_size)
+        return versions
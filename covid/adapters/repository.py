@@ -1,11 +1,11 @@
 import abc
-from typing import List
+from typing import Iterable, Iterator, List, Tuple
 
 from sqlalchemy import desc, asc
 
 from covid.domain.model import User, Article, Tag, Comment
 
-from datetime import date
+from datetime import date, datetime
 
 
 class RepositoryException(Exception):
@@ -21,6 +21,11 @@ class AbstractRepository(abc.ABC):
         """" Adds a User to the repository. """
         raise NotImplementedError
 
+    def add_users(self, users: Iterable[User]):
+        """ Adds Users to the repository in one batch. """
+        for user in users:
+            self.add_user(user)
+
     @abc.abstractmethod
     def get_user(self, username) -> User:
         """ Returns the User named username from the repository.
@@ -34,6 +39,11 @@ class AbstractRepository(abc.ABC):
         """ Adds an Article to the repository. """
         raise NotImplementedError
 
+    def add_articles(self, articles: Iterable[Article]):
+        """ Adds Articles to the repository in one batch. """
+        for article in articles:
+            self.add_article(article)
+
     @abc.abstractmethod
     def get_article(self, id: int) -> Article:
         """ Returns Article with id from the repository.
@@ -79,6 +89,23 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_article_page(self, quantity: int, cursor: int = None) -> Tuple[List[Article], int]:
+        """ Returns a page of up to quantity Articles, in increasing id order, and a cursor.
+
+        The cursor is the id of the last Article on the page, to pass back in to retrieve the following page; it is None
+        when there are no further Articles.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def iter_articles(self, batch_size: int = 1000) -> Iterator[Article]:
+        """ Returns an iterator over all Articles, in increasing id order.
+
+        Articles are fetched batch_size at a time, so iterating over a large number of Articles uses bounded memory.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_article_ids_for_tag(self, tag_name: str):
         """ Returns a list of ids representing Articles that are tagged by tag_name.
@@ -87,6 +114,15 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_related_article_ids(self, article_id: int, quantity: int) -> List[int]:
+        """ Returns the ids of up to quantity Articles that share the most Tags with the Article identified by article_id.
+
+        Articles sharing the same number of Tags are ordered most recent first. If the Article doesn't exist or shares no
+        Tags with any other Article, this method returns an empty list.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_date_of_previous_article(self, article: Article):
         """ Returns the date of an Article that immediately precedes article.
@@ -110,6 +146,11 @@ class AbstractRepository(abc.ABC):
         """ Adds a Tag to the repository. """
         raise NotImplementedError
 
+    def add_tags(self, tags: Iterable[Tag]):
+        """ Adds Tags to the repository in one batch. """
+        for tag in tags:
+            self.add_tag(tag)
+
     @abc.abstractmethod
     def get_tags(self) -> List[Tag]:
         """ Returns the Tags stored in the repository. """
@@ -119,19 +160,75 @@ class AbstractRepository(abc.ABC):
     def add_comment(self, comment: Comment):
         """ Adds a Comment to the repository.
 
-        If the Comment doesn't have bidirectional links with an Article and a User, this method raises a
-        RepositoryException and doesn't update the repository.
+        The Comment must have an Article and a User, or this method raises a RepositoryException and doesn't update the
+        repository. If make_comment() hasn't already linked them to the Comment, the repository does when it's stored.
         """
-        if comment.user is None or comment not in comment.user.comments:
+        if comment.user is None:
             raise RepositoryException('Comment not correctly attached to a User')
-        if comment.article is None or comment not in comment.article.comments:
+        if comment.article is None:
             raise RepositoryException('Comment not correctly attached to an Article')
 
+    def add_comments(self, comments: Iterable[Comment]):
+        """ Adds Comments to the repository in one batch.
+
+        If any of the Comments isn't one add_comment() accepts, this method raises a RepositoryException and doesn't add
+        any of them.
+        """
+        comments = list(comments)
+        for comment in comments:
+            AbstractRepository.add_comment(self, comment)
+        for comment in comments:
+            self.add_comment(comment)
+
     @abc.abstractmethod
     def get_comments(self):
         """ Returns the Comments stored in the repository. """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_comments_for_article(self, article_id: int, quantity: int, cursor=None) -> Tuple[List[Comment], tuple]:
+        """ Returns a page of up to quantity Comments on the Article identified by article_id, oldest first, and a cursor.
+
+        The cursor is an opaque (timestamp, key) position to pass back in to retrieve the following page; it is None when
+        there are no further Comments. If the Article doesn't exist, this method returns an empty page.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def iter_comments(self, article_id: int = None, batch_size: int = 1000) -> Iterator[Comment]:
+        """ Returns an iterator over the Comments on the Article identified by article_id, or over all Comments if
+        article_id is None.
+
+        Comments are fetched batch_size at a time, so iterating over a large number of Comments uses bounded memory.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_comments_for_user(self, username: str, quantity: int, cursor=None) -> Tuple[List[Comment], tuple]:
+        """ Returns a page of up to quantity Comments made by the User named username, newest first, and a cursor.
+
+        The cursor is an opaque (timestamp, key) position to pass back in to retrieve the following page; it is None when
+        there are no further Comments. If there is no User named username, this method returns an empty page.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_most_commented_article_ids(self, quantity: int) -> List[Tuple[int, int]]:
+        """ Returns up to quantity (article id, comment count) tuples, ordered by decreasing comment count.
+
+        Articles with the same number of Comments are ordered by decreasing id. Articles without Comments are excluded.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_trending_article_ids(self, quantity: int, now: datetime = None) -> List[Tuple[int, float]]:
+        """ Returns up to quantity (article id, comments per hour) tuples, ordered by decreasing comment rate.
+
+        The rate is measured over a sliding window that ends at now, or at the most recent Comment if that is later or
+        now isn't given. If there are no Comments in the window, this method returns an empty list.
+        """
+        raise NotImplementedError
+
 
 
 
@@ -0,0 +1,101 @@
+from datetime import datetime
+from heapq import heapify, heappop, heappush
+from threading import RLock
+from typing import List, Tuple
+
+
+def hour_of(timestamp: datetime) -> int:
+    # Number of whole hours since 0001-01-01, used to bucket Comment timestamps.
+    return timestamp.toordinal() * 24 + timestamp.hour
+
+
+class TrendingArticles:
+    """ Sliding-window comment counters for ranking Articles by comment velocity.
+
+    Comments are counted in hourly buckets; buckets that fall out of the window are subtracted from the per-Article
+    totals as the window advances. The window ends at the hour of the newest Comment recorded (or a later hour supplied
+    when querying). A max-heap of (count, article id) entries is updated on every change; entries that no longer match an
+    Article's total are discarded lazily when the heap is read.
+    """
+
+    def __init__(self, window_hours: int = 24):
+        self._window_hours = window_hours
+        self._buckets = dict()
+        self._totals = dict()
+        self._heap = list()
+        self._newest_hour = None
+        self._lock = RLock()
+        self.loaded = False
+
+    @property
+    def window_hours(self) -> int:
+        return self._window_hours
+
+    def record(self, article_id: int, timestamp: datetime):
+        hour = hour_of(timestamp)
+
+        with self._lock:
+            self._advance_to(hour)
+            if hour <= self._newest_hour - self._window_hours:
+                # The Comment is older than the window, so it can't affect the ranking.
+                return
+
+            bucket = self._buckets.setdefault(hour, dict())
+            bucket[article_id] = bucket.get(article_id, 0) + 1
+            self._set_total(article_id, self._totals.get(article_id, 0) + 1)
+
+    def load(self, rows):
+        # rows is an iterable of (article id, timestamp) tuples.
+        with self._lock:
+            if self.loaded:
+                # Another thread loaded the counters while this one was reading the rows.
+                return
+            for article_id, timestamp in rows:
+                self.record(article_id, timestamp)
+            self.loaded = True
+
+    def top(self, quantity: int, now: datetime = None) -> List[Tuple[int, float]]:
+        """ Returns up to quantity (article id, comments per hour) tuples, busiest Article first. """
+        with self._lock:
+            if now is not None:
+                self._advance_to(hour_of(now))
+
+            ranked = list()
+            valid_entries = list()
+            while self._heap and len(ranked) < quantity:
+                entry = heappop(self._heap)
+                count, article_id = -entry[0], entry[1]
+                if self._totals.get(article_id) != count or article_id in ranked:
+                    # Stale or duplicate entry.
+                    continue
+                ranked.append(article_id)
+                valid_entries.append(entry)
+
+            # Put back the entries that are still current.
+            for entry in valid_entries:
+                heappush(self._heap, entry)
+
+            return [(article_id, self._totals[article_id] / self._window_hours) for article_id in ranked]
+
+    def _advance_to(self, hour: int):
+        if self._newest_hour is not None and hour <= self._newest_hour:
+            return
+        self._newest_hour = hour
+
+        # Drop the buckets that have slid out of the window.
+        cutoff = hour - self._window_hours
+        for expired_hour in [bucket_hour for bucket_hour in self._buckets if bucket_hour <= cutoff]:
+            for article_id, count in self._buckets.pop(expired_hour).items():
+                self._set_total(article_id, self._totals[article_id] - count)
+
+    def _set_total(self, article_id: int, total: int):
+        if total > 0:
+            self._totals[article_id] = total
+            heappush(self._heap, (-total, article_id))
+        else:
+            del self._totals[article_id]
+
+        if len(self._heap) > 4 * len(self._totals) + 64:
+            # Too many stale entries have built up; rebuild the heap from the current totals.
+            self._heap = [(-count, article_id) for article_id, count in self._totals.items()]
+            heapify(self._heap)
@@ -1,13 +1,17 @@
 from __future__ import annotations
 import abc
+from threading import local
 
 from sqlalchemy.orm import scoped_session
+from sqlalchemy.pool import StaticPool
 
 from flask import _app_ctx_stack
 
 from covid.adapters.repository import AbstractRepository
 from covid.adapters.memory_repository import MemoryRepository
 from covid.adapters.database_repository import SqlAlchemyRepository
+from covid.adapters.related_articles import RelatedArticlesIndex
+from covid.adapters.trending import TrendingArticles
 
 
 uow_instance = None
@@ -16,12 +20,21 @@ uow_instance = None
 class AbstractUnitOfWork(abc.ABC):
     repo: AbstractRepository
 
+    # Whether read-only service calls gain from running concurrently, each with a unit of work from for_task().
+    concurrent_reads = False
+
     def __enter__(self) -> AbstractUnitOfWork:
         return self
 
     def __exit__(self, *args):
         self.rollback()
 
+    def for_task(self) -> AbstractUnitOfWork:
+        return self
+
+    def close_current_session(self):
+        pass
+
     @abc.abstractmethod
     def commit(self):
         raise NotImplementedError
@@ -33,13 +46,30 @@ class AbstractUnitOfWork(abc.ABC):
 
 class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
 
-    def __init__(self, session_factory):
+    def __init__(self, session_factory, related_articles: RelatedArticlesIndex = None, trending: TrendingArticles = None):
         self.session_factory = session_factory
         self.session = None
 
+        # In-process indexes derived from the database, shared by every repository this unit of work creates.
+        self.related_articles = related_articles if related_articles is not None else RelatedArticlesIndex()
+        self.trending = trending if trending is not None else TrendingArticles()
+
+    @property
+    def concurrent_reads(self) -> bool:
+        # A StaticPool, as used for an in-memory SQLite database, hands every session the same connection, which
+        # mustn't be used by several threads at once.
+        bind = getattr(self.session_factory, 'kw', dict()).get('bind')
+        return not isinstance(getattr(bind, 'pool', None), StaticPool)
+
+    def for_task(self) -> SqlAlchemyUnitOfWork:
+        # A unit of work for a task running on another thread. It has its own session, but shares the indexes.
+        return SqlAlchemyUnitOfWork(self.session_factory, self.related_articles, self.trending)
+
     def __enter__(self):
         self.session = scoped_session(self.session_factory, scopefunc=_app_ctx_stack.__ident_func__)
-        self.repo = SqlAlchemyRepository(self.session)
+        self.repo = SqlAlchemyRepository(
+            self.session, related_articles=self.related_articles, trending=self.trending
+        )
         return super().__enter__()
 
     def __exit__(self, *args):
@@ -47,9 +77,11 @@ class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
 
     def commit(self):
         self.session.commit()
+        self.repo.after_commit()
 
     def rollback(self):
         self.session.rollback()
+        self.repo.after_rollback()
 
     def close_current_session(self):
         if self.session is not None:
@@ -59,11 +91,33 @@ class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
 class InMemoryUnitOfWork(AbstractUnitOfWork):
 
     def __init__(self, repo: MemoryRepository):
-        self.repo = repo
+        self._repo = repo
+        self._pinned = local()
         self.committed = False
 
+    @property
+    def repo(self) -> MemoryRepository:
+        # Within a with block, the repository the block started with, even if another has been swapped in since.
+        return getattr(self._pinned, 'repo', self._repo)
+
+    @repo.setter
+    def repo(self, repo: MemoryRepository):
+        # Swaps in another repository. Blocks already running carry on with the one they started with.
+        self._repo = repo
+
+    def __enter__(self):
+        self._pinned.repo = self._repo
+        self.repo.begin_transaction()
+        return super().__enter__()
+
+    def __exit__(self, *args):
+        super().__exit__()
+        self.repo.end_transaction()
+        del self._pinned.repo
+
     def commit(self):
+        self.repo.commit_transaction()
         self.committed = True
 
     def rollback(self):
-        pass
+        self.repo.rollback_transaction()
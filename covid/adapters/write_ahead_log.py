@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Iterator, List
+
+from covid.adapters.repository import AbstractRepository
+from covid.domain.model import User, Comment
+
+
+logger = logging.getLogger(__name__)
+
+
+# Log used by the memory repository, created by create_app() when MEMORY_WAL_DIR is set.
+write_ahead_log_instance = None
+
+
+SNAPSHOT_FILE = 'snapshot.jsonl'
+
+
+class WriteAheadLog:
+    """ An append-only log of the users and comments stored in a MemoryRepository, so that they survive a restart.
+
+    MemoryRepository appends a committed transaction's records before it publishes them, and the records reach the
+    operating system before the commit returns. fsync() is called on a background thread at most every sync_interval
+    seconds, so a crash of the process loses nothing, and a crash of the machine loses at most the last sync_interval
+    seconds of writes.
+
+    Records are JSON lines, each with a log sequence number (lsn), in segment files named after the first lsn they
+    hold. After compact_after records, the log moves on to a new segment and a background thread merges the earlier
+    segments into the snapshot file, which replaces them. At startup, the snapshot and then the segments are replayed
+    on top of the data loaded from the CSV files.
+    """
+
+    def __init__(self, directory: str, sync_interval: float, compact_after: int):
+        self._directory = directory
+        self._sync_interval = sync_interval
+        self._compact_after = compact_after
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = Lock()
+        self._file = None
+        self._next_lsn = None
+        self._dirty = False
+        self._since_compaction = 0
+        self._compaction = None
+
+        self._stopping = Event()
+        self._sync_thread = Thread(target=self._sync_periodically, name='write-ahead-log-sync', daemon=True)
+        self._sync_thread.start()
+
+    def records(self) -> List[dict]:
+        # Returns every record logged so far, oldest first.
+        with self._lock:
+            return self._read()
+
+    def append(self, records: List[dict]) -> List[dict]:
+        # Returns the records as logged, each with its lsn.
+        if len(records) == 0:
+            return list()
+
+        with self._lock:
+            if self._next_lsn is None:
+                self._read()
+            if self._file is None:
+                self._file = self._open_segment()
+
+            logged = list()
+            for record in records:
+                logged.append(dict(record, lsn=self._next_lsn))
+                self._next_lsn += 1
+            self._file.write(''.join(json.dumps(record) + '\n' for record in logged))
+            self._file.flush()
+            self._dirty = True
+
+            self._since_compaction += len(records)
+            if self._since_compaction >= self._compact_after and self._compaction is None:
+                self._start_compaction()
+            return logged
+
+    def sync(self):
+        with self._lock:
+            if self._dirty:
+                os.fsync(self._file.fileno())
+                self._dirty = False
+
+    def close(self):
+        self._stopping.set()
+        self._sync_thread.join()
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+        with self._lock:
+            self._close_segment()
+
+    def _read(self) -> List[dict]:
+        # Called holding the lock, so that no record is half-written and no file is removed by a compaction meanwhile.
+        records = list(read_records([os.path.join(self._directory, SNAPSHOT_FILE)] + self._segments()))
+        self._next_lsn = records[-1]['lsn'] + 1 if len(records) > 0 else 1
+        return records
+
+    def _sync_periodically(self):
+        while not self._stopping.wait(self._sync_interval):
+            self.sync()
+
+    def _start_compaction(self):
+        # Called holding the lock. The current segment is closed, so the compaction thread only reads files that are
+        # no longer written to.
+        self._close_segment()
+        self._since_compaction = 0
+        self._compaction = Thread(
+            target=self._compact, args=(self._segments(),), name='write-ahead-log-compaction', daemon=True)
+        self._compaction.start()
+
+    def _compact(self, segments: List[str]):
+        try:
+            snapshot_path = os.path.join(self._directory, SNAPSHOT_FILE)
+            new_snapshot_path = snapshot_path + '.new'
+            with open(new_snapshot_path, 'w') as outfile:
+                for record in read_records([snapshot_path] + segments):
+                    outfile.write(json.dumps(record) + '\n')
+                outfile.flush()
+                os.fsync(outfile.fileno())
+
+            # The new snapshot replaces the old one in a single step, and only then are the segments it holds removed.
+            with self._lock:
+                os.replace(new_snapshot_path, snapshot_path)
+                self._sync_directory()
+                for segment in segments:
+                    os.remove(segment)
+        except OSError:
+            logger.exception('Could not compact the write-ahead log in %s', self._directory)
+        finally:
+            with self._lock:
+                self._compaction = None
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            self._dirty = False
+
+    def _open_segment(self):
+        # A segment is never written to again once closed, nor after a restart. A segment whose only record was cut
+        # short by a crash has the name the next one would get, so the next one is given a numbered name instead.
+        attempt = 0
+        while True:
+            try:
+                return open(self._segment_path(self._next_lsn, attempt), 'x')
+            except FileExistsError:
+                attempt += 1
+
+    def _segments(self) -> List[str]:
+        # Ordered by first lsn, then by attempt.
+        names = [name for name in os.listdir(self._directory) if name.startswith('wal-') and name.endswith('.log')]
+        names.sort(key=lambda name: tuple(int(part) for part in name[len('wal-'):-len('.log')].split('-')))
+        return [os.path.join(self._directory, name) for name in names]
+
+    def _segment_path(self, first_lsn: int, attempt: int = 0) -> str:
+        if attempt == 0:
+            return os.path.join(self._directory, f'wal-{first_lsn:012d}.log')
+        return os.path.join(self._directory, f'wal-{first_lsn:012d}-{attempt}.log')
+
+    def _sync_directory(self):
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(self._directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+class InMemoryLog:
+    """ Keeps the records a MemoryRepository would write to a WriteAheadLog in memory instead.
+
+    They're lost on restart, but let a reload rebuild the repository from the CSV files without losing the users and
+    comments stored since the application started.
+    """
+
+    def __init__(self):
+        self._records = list()
+        self._lock = Lock()
+
+    def records(self) -> List[dict]:
+        with self._lock:
+            return list(self._records)
+
+    def append(self, records: List[dict]) -> List[dict]:
+        with self._lock:
+            first_lsn = len(self._records) + 1
+            logged = [dict(record, lsn=lsn) for lsn, record in enumerate(records, first_lsn)]
+            self._records.extend(logged)
+            return logged
+
+    def close(self):
+        pass
+
+
+def read_records(paths: List[str]) -> Iterator[dict]:
+    last_lsn = 0
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path) as infile:
+            for line in infile:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A write cut short by a crash can only be at the end of a segment, as no segment is written to
+                    # again after a restart.
+                    logger.warning('Ignoring incomplete record at the end of %s', path)
+                    break
+                # Records already merged into the snapshot may still be in a segment that wasn't yet removed.
+                if record['lsn'] > last_lsn:
+                    last_lsn = record['lsn']
+                    yield record
+
+
+def user_record(user: User) -> dict:
+    return {'type': 'user', 'username': user.username, 'password': user.password}
+
+
+def comment_record(comment: Comment) -> dict:
+    return {
+        'type': 'comment',
+        'username': comment.user.username,
+        'article_id': comment.article.id,
+        'comment': comment.comment,
+        'timestamp': comment.timestamp.isoformat()
+    }
+
+
+def replay(log: WriteAheadLog, repo: AbstractRepository):
+    """ Stores the users and comments in log in repo, which already holds the articles and users they refer to. """
+    restore(log.records(), repo)
+
+
+def restore(records: List[dict], repo: AbstractRepository):
+    users = dict()
+    comment_records = list()
+    for record in records:
+        if record['type'] == 'user':
+            users[record['username']] = User(record['username'], record['password'])
+        elif record['type'] == 'comment':
+            comment_records.append(record)
+    repo.add_users(users.values())
+
+    articles = dict()
+    comments = list()
+    for record in comment_records:
+        username, article_id = record['username'], record['article_id']
+        if username not in users:
+            users[username] = repo.get_user(username)
+        if article_id not in articles:
+            articles[article_id] = repo.get_article(article_id)
+        user, article = users[username], articles[article_id]
+
+        if user is None or article is None:
+            # The CSV files no longer hold the article or user the comment was made on or by.
+            logger.warning('Skipping logged comment on article %d by %s', article_id, username)
+            continue
+        comments.append(Comment(user, article, record['comment'], datetime.fromisoformat(record['timestamp'])))
+    repo.add_comments(comments)
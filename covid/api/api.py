@@ -0,0 +1,155 @@
+import hmac
+from datetime import date
+from functools import wraps
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context, abort, current_app
+from flask.json import JSONEncoder, dumps
+
+import covid.adapters.unit_of_work as uow
+import covid.authentication.hashing as hashing
+import covid.news.moderation as moderation
+import covid.news.services as services
+import covid.utilities.services as utilities_services
+
+
+# Configure Blueprint.
+api_blueprint = Blueprint(
+    'api_bp', __name__, url_prefix='/api')
+
+
+class ApiJSONEncoder(JSONEncoder):
+    # Writes dates and timestamps in ISO 8601 form rather than as HTTP dates.
+    def default(self, o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return super().default(o)
+
+
+api_blueprint.json_encoder = ApiJSONEncoder
+
+default_page_size = 20
+max_page_size = 100
+
+
+@api_blueprint.route('/articles', methods=['GET'])
+def articles():
+    try:
+        articles, next_cursor = services.get_article_page(page_size(), request.args.get('cursor'), uow.uow_instance)
+    except ValueError:
+        abort(400)
+    return jsonify(articles=articles, next_cursor=next_cursor)
+
+
+@api_blueprint.route('/articles/<int:article_id>', methods=['GET'])
+def article(article_id):
+    try:
+        return jsonify(services.get_article(article_id, uow.uow_instance, with_comments=False))
+    except services.NonExistentArticleException:
+        return not_found('No article with id {}'.format(article_id))
+
+
+@api_blueprint.route('/articles/<int:article_id>/comments', methods=['GET'])
+def article_comments(article_id):
+    try:
+        comments, next_cursor = services.get_comment_page_for_article(
+            article_id, page_size(), request.args.get('cursor'), uow.uow_instance)
+    except services.NonExistentArticleException:
+        return not_found('No article with id {}'.format(article_id))
+    except ValueError:
+        abort(400)
+    return jsonify(comments=comments, next_cursor=next_cursor)
+
+
+@api_blueprint.route('/tags', methods=['GET'])
+def tags():
+    return jsonify(tags=utilities_services.get_tag_names(uow.uow_instance))
+
+
+@api_blueprint.route('/tags/<tag_name>/articles', methods=['GET'])
+def tag_articles(tag_name):
+    quantity = page_size()
+    cursor = int_arg('cursor', 0)
+
+    article_ids = services.get_article_ids_for_tag(tag_name, uow.uow_instance)
+    articles = services.get_articles_by_id(article_ids[cursor:cursor + quantity], uow.uow_instance)
+
+    next_cursor = cursor + quantity if cursor + quantity < len(article_ids) else None
+    return jsonify(articles=articles, next_cursor=next_cursor)
+
+
+@api_blueprint.route('/users/<username>/comments', methods=['GET'])
+def user_comments(username):
+    try:
+        comments, next_cursor = services.get_comments_for_user(
+            username, page_size(), request.args.get('cursor'), uow.uow_instance)
+    except services.UnknownUserException:
+        return not_found('No user named {}'.format(username))
+    except ValueError:
+        abort(400)
+    return jsonify(comments=comments, next_cursor=next_cursor)
+
+
+@api_blueprint.route('/export/articles.ndjson', methods=['GET'])
+def export_articles():
+    return ndjson_response(services.iter_articles(uow.uow_instance))
+
+
+@api_blueprint.route('/export/comments.ndjson', methods=['GET'])
+def export_comments():
+    return ndjson_response(services.iter_comments(uow.uow_instance))
+
+
+def metrics_token_required(view):
+    # Metrics are only served to requests that carry METRICS_TOKEN as a bearer token, and not at all if it isn't set.
+    @wraps(view)
+    def wrapped_view(**kwargs):
+        token = current_app.config.get('METRICS_TOKEN')
+        authorization = request.headers.get('Authorization', '')
+        if not token or not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+            response = jsonify(error='A valid metrics token is required')
+            response.status_code = 403
+            return response
+        return view(**kwargs)
+    return wrapped_view
+
+
+@api_blueprint.route('/metrics/password-hashing', methods=['GET'])
+@metrics_token_required
+def password_hashing_metrics():
+    # Queue wait and hash times, in seconds, for the password hashing pool.
+    if hashing.hasher is None:
+        return jsonify(enabled=False)
+    return jsonify(enabled=True, **hashing.hasher.metrics.snapshot())
+
+
+@api_blueprint.route('/metrics/comment-moderation', methods=['GET'])
+@metrics_token_required
+def comment_moderation_metrics():
+    # Counts of comments submitted, and approved, rejected or failed by the moderation queue.
+    if moderation.moderation_queue_instance is None:
+        return jsonify(enabled=False)
+    return jsonify(enabled=True, **moderation.moderation_queue_instance.metrics())
+
+
+def ndjson_response(items):
+    # Streams one JSON document per line. The repository hands out records a batch at a time, so the whole archive is
+    # never held in memory.
+    lines = (dumps(item, cls=ApiJSONEncoder) + '\n' for item in items)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+
+def page_size():
+    return min(max(int_arg('limit', default_page_size), 1), max_page_size)
+
+
+def int_arg(name, default):
+    try:
+        return int(request.args.get(name, default))
+    except ValueError:
+        abort(400)
+
+
+def not_found(message):
+    response = jsonify(error=message)
+    response.status_code = 404
+    return response
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+import re
+from datetime import date
+from urllib.parse import parse_qs, unquote
+
+from flask import Config
+
+from covid.adapters import memory_repository
+from covid.adapters.async_repository import AbstractAsyncRepository, AsyncMemoryRepository
+from covid.adapters.async_sqlite import AsyncSqlitePool, AsyncSqliteRepository
+import covid.news.async_services as services
+import covid.utilities.async_services as utilities_services
+
+
+default_page_size = 20
+max_page_size = 100
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class AsyncApi:
+    """ ASGI application serving the read-only JSON API from coroutines.
+
+    Flask 1.1 views are synchronous, so each in-flight request holds a worker thread. Served by an ASGI server, this
+    application handles each request as a coroutine on one event loop, so many slow clients can be connected at once
+    without a thread each. Database work runs on the connection threads of the async repository.
+    """
+
+    def __init__(self, repo: AbstractAsyncRepository, on_shutdown=None):
+        self.repo = repo
+        self._on_shutdown = on_shutdown
+        self._routes = [
+            (re.compile(r'/api/articles/(?P<article_id>\d+)'), self.article),
+            (re.compile(r'/api/articles/(?P<article_id>\d+)/comments'), self.article_comments),
+            (re.compile(r'/api/articles_by_date'), self.articles_by_date),
+            (re.compile(r'/api/tags'), self.tags),
+            (re.compile(r'/api/tags/(?P<tag_name>[^/]+)/articles'), self.tag_articles),
+            (re.compile(r'/api/random_articles'), self.random_articles),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            status, payload = await self._dispatch(scope)
+            body = json.dumps(payload, default=to_json).encode('utf-8')
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+            })
+            await send({'type': 'http.response.body', 'body': body if scope['method'] != 'HEAD' else b''})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._on_shutdown is not None:
+                    self._on_shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _dispatch(self, scope):
+        if scope['method'] not in ('GET', 'HEAD'):
+            return 405, {'error': 'Method not allowed'}
+
+        query = {name: values[0] for name, values in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        for pattern, view in self._routes:
+            match = pattern.fullmatch(scope['path'])
+            if match is not None:
+                try:
+                    return 200, await view(query, **{name: unquote(value) for name, value in match.groupdict().items()})
+                except HttpError as error:
+                    return error.status, {'error': error.message}
+        return 404, {'error': 'Not found'}
+
+    async def article(self, query, article_id):
+        try:
+            return await services.get_article(int(article_id), self.repo)
+        except services.NonExistentArticleException:
+            raise HttpError(404, f'No article with id {article_id}')
+
+    async def article_comments(self, query, article_id):
+        try:
+            comments, next_cursor = await services.get_comment_page_for_article(
+                int(article_id), page_size(query), query.get('cursor'), self.repo)
+        except services.NonExistentArticleException:
+            raise HttpError(404, f'No article with id {article_id}')
+        except ValueError:
+            raise HttpError(400, 'Invalid cursor')
+        return {'comments': comments, 'next_cursor': next_cursor}
+
+    async def articles_by_date(self, query):
+        try:
+            target_date = date.fromisoformat(query['date']) if 'date' in query else None
+        except ValueError:
+            raise HttpError(400, 'Invalid date')
+
+        if target_date is None:
+            first_article, last_article = await asyncio.gather(
+                services.get_first_article(self.repo), services.get_last_article(self.repo))
+            target_date = first_article['date']
+            articles, previous_date, next_date = await services.get_articles_by_date(target_date, self.repo)
+        else:
+            # The three lookups are independent, so they wait on the database together.
+            first_article, last_article, (articles, previous_date, next_date) = await asyncio.gather(
+                services.get_first_article(self.repo),
+                services.get_last_article(self.repo),
+                services.get_articles_by_date(target_date, self.repo))
+
+        return {
+            'date': target_date,
+            'articles': articles,
+            'previous_date': previous_date,
+            'next_date': next_date,
+            'first_date': first_article['date'],
+            'last_date': last_article['date']
+        }
+
+    async def tags(self, query):
+        return {'tags': await utilities_services.get_tag_names(self.repo)}
+
+    async def tag_articles(self, query, tag_name):
+        quantity = page_size(query)
+        cursor = int_arg(query, 'cursor', 0)
+
+        article_ids = await services.get_article_ids_for_tag(tag_name, self.repo)
+        articles = await services.get_articles_by_id(article_ids[cursor:cursor + quantity], self.repo)
+
+        next_cursor = cursor + quantity if cursor + quantity < len(article_ids) else None
+        return {'articles': articles, 'next_cursor': next_cursor}
+
+    async def random_articles(self, query):
+        return {'articles': await utilities_services.get_random_articles(page_size(query, 3), self.repo)}
+
+
+def to_json(value):
+    # Writes dates and timestamps in ISO 8601 form, as the Flask API does.
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def page_size(query, default=default_page_size):
+    return min(max(int_arg(query, 'limit', default), 1), max_page_size)
+
+
+def int_arg(query, name, default):
+    try:
+        return int(query.get(name, default))
+    except ValueError:
+        raise HttpError(400, f'Invalid {name}')
+
+
+def create_asgi_app(test_config=None):
+    """ Construct the ASGI application, e.g. with uvicorn --factory covid.api.asgi:create_asgi_app.
+
+    Configuration is read as for create_app(). With the database repository, the database named by
+    SQLALCHEMY_DATABASE_URI must be a SQLite file that has already been populated by the Flask application.
+    """
+    config = Config(os.getcwd())
+    config.from_object('config.Config')
+    data_path = os.path.join('covid', 'adapters', 'data')
+
+    if test_config is not None:
+        config.from_mapping(test_config)
+        data_path = config['TEST_DATA_PATH']
+
+    if config['REPOSITORY'] == 'memory':
+        repo = memory_repository.MemoryRepository()
+        memory_repository.populate(data_path, repo)
+        return AsyncApi(AsyncMemoryRepository(repo))
+
+    database_uri = config['SQLALCHEMY_DATABASE_URI']
+    if not database_uri.startswith('sqlite:///'):
+        raise ValueError('The async API requires a file-based SQLite database')
+
+    pool = AsyncSqlitePool(database_uri[len('sqlite:///'):], config['ASYNC_SQLITE_CONNECTIONS'])
+    return AsyncApi(AsyncSqliteRepository(pool), on_shutdown=pool.close)
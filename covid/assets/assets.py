@@ -0,0 +1,64 @@
+import mimetypes
+import os
+
+import click
+from flask import Blueprint, current_app, request, send_from_directory, abort
+
+from covid.assets import compression
+from covid.assets.build import build_static_assets, load_manifest, encoded_suffixes
+
+
+# Configure Blueprint. The build command is available as 'flask assets build'.
+assets_blueprint = Blueprint(
+    'assets_bp', __name__, cli_group='assets')
+
+# Hashed files never change, so browsers may keep them for a year without revalidating.
+far_future_max_age = 365 * 24 * 60 * 60
+
+
+def dist_folder(app):
+    return os.path.join(app.static_folder, 'dist')
+
+
+@assets_blueprint.record_once
+def load_static_manifest(state):
+    state.app.extensions['static_manifest'] = load_manifest(dist_folder(state.app))
+
+
+@assets_blueprint.app_url_defaults
+def use_hashed_static_files(endpoint, values):
+    # url_for('static', filename='css/main.css') refers to the built copy of the file, when there is one.
+    if endpoint == 'static' and 'filename' in values:
+        hashed_filename = current_app.extensions['static_manifest'].get(values['filename'])
+        if hashed_filename is not None:
+            values['filename'] = 'dist/' + hashed_filename
+
+
+@assets_blueprint.route('/static/dist/<path:filename>', methods=['GET'])
+def hashed_static_file(filename):
+    folder = dist_folder(current_app)
+    mimetype, _ = mimetypes.guess_type(filename)
+
+    # Send a precompressed copy if the client accepts one and the build produced it.
+    encoding = compression.choose_encoding(request.accept_encodings)
+    if encoding is not None and os.path.isfile(os.path.join(folder, filename + encoded_suffixes[encoding])):
+        response = send_from_directory(folder, filename + encoded_suffixes[encoding], mimetype=mimetype)
+        response.content_encoding = encoding
+    elif os.path.isfile(os.path.join(folder, filename)):
+        response = send_from_directory(folder, filename, mimetype=mimetype)
+    else:
+        abort(404)
+
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = far_future_max_age
+    response.headers['Cache-Control'] += ', immutable'
+    return response
+
+
+@assets_blueprint.cli.command('build')
+def build_command():
+    """ Write hashed and precompressed copies of the static files. """
+    manifest = build_static_assets(current_app.static_folder, dist_folder(current_app))
+    current_app.extensions['static_manifest'] = manifest
+    click.echo(f'Built {len(manifest)} static files in {dist_folder(current_app)}')
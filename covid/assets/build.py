@@ -0,0 +1,72 @@
+import hashlib
+import json
+import mimetypes
+import os
+
+from covid.assets import compression
+
+
+manifest_filename = 'manifest.json'
+encoded_suffixes = {'gzip': '.gz', 'br': '.br'}
+
+
+def hashed_filename(filename: str, content: bytes) -> str:
+    # css/main.css becomes css/main.<first 12 hex digits of the content's SHA-256>.css.
+    root, extension = os.path.splitext(filename)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+
+
+def build_static_assets(static_folder: str, output_folder: str) -> dict:
+    """ Writes a content-hashed copy of each file under static_folder to output_folder, and returns the manifest.
+
+    Compressible files also get precompressed .gz copies, and .br copies when the brotli package is installed. The
+    manifest maps each file's path relative to static_folder to its hashed path relative to output_folder, and is
+    saved as manifest.json in output_folder. Files from earlier builds are left in place, so pages rendered before a
+    deployment can still load the assets they refer to.
+    """
+    manifest = dict()
+    output_folder = os.path.abspath(output_folder)
+
+    for directory, subdirectories, filenames in os.walk(static_folder):
+        # Don't pick up the output of a previous build.
+        subdirectories[:] = [name for name in subdirectories
+                             if os.path.abspath(os.path.join(directory, name)) != output_folder]
+
+        for name in filenames:
+            source_path = os.path.join(directory, name)
+            filename = os.path.relpath(source_path, static_folder).replace(os.sep, '/')
+            with open(source_path, 'rb') as source_file:
+                content = source_file.read()
+
+            target = hashed_filename(filename, content)
+            write_file(os.path.join(output_folder, target), content)
+
+            mimetype, _ = mimetypes.guess_type(filename)
+            if mimetype in compression.compressible_mimetypes:
+                for encoding in compression.available_encodings():
+                    compressed = compression.compress(content, encoding, 9)
+                    if len(compressed) < len(content):
+                        write_file(os.path.join(output_folder, target + encoded_suffixes[encoding]), compressed)
+
+            manifest[filename] = target
+
+    write_file(os.path.join(output_folder, manifest_filename), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def load_manifest(output_folder: str) -> dict:
+    # Returns an empty manifest if the assets haven't been built.
+    try:
+        with open(os.path.join(output_folder, manifest_filename)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return dict()
+
+
+def write_file(path: str, content: bytes):
+    # Write to a temporary file and rename it, so a running server never serves a partly written file.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as output_file:
+        output_file.write(content)
+    os.replace(temporary_path, path)
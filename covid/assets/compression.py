@@ -0,0 +1,104 @@
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    # Brotli is optional; without it, responses are only gzip-compressed.
+    brotli = None
+
+
+compressible_mimetypes = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript', 'application/json',
+    'application/x-ndjson', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon'
+}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """ Returns the content coding to use for a client sending the given Accept-Encoding values, or None.
+
+    Brotli is preferred over gzip when the client accepts both equally.
+    """
+    best_encoding = None
+    best_quality = 0
+    for encoding in available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best_encoding, best_quality = encoding, quality
+    return best_encoding
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'br':
+        # Brotli qualities run from 0 to 11, rather than from 1 to 9.
+        return brotli.compress(data, quality=min(level + 2, 11))
+
+    # A gzip stream written by zlib carries no timestamp, so equal inputs give equal outputs.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def gzip_stream(chunks, level: int):
+    # Compresses a streamed response, flushing after each chunk so that the client can render it as it arrives.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def is_compressible(response) -> bool:
+    return response.mimetype in compressible_mimetypes
+
+
+def compress_response(response):
+    # Registered as an after_request hook. Compresses successful text responses of at least COMPRESSION_MIN_SIZE bytes
+    # for clients that accept gzip or brotli. Files sent by send_file are left alone, since they're passed straight
+    # through to the server.
+    if not is_compressible(response):
+        return response
+
+    # Caches between the client and the app must store a separate copy per content coding.
+    response.vary.add('Accept-Encoding')
+
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or request.method == 'HEAD'):
+        return response
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    level = current_app.config['COMPRESSION_LEVEL']
+    if response.is_streamed:
+        # The length of a streamed response isn't known in advance, so it's compressed with gzip as it's sent.
+        if request.accept_encodings['gzip'] <= 0:
+            return response
+        encoding = 'gzip'
+        response.response = gzip_stream(response.response, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESSION_MIN_SIZE']:
+            return response
+        response.set_data(compress(data, encoding, level))
+
+    # The compressed body is a different representation, so it needs its own entity tag.
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(f'{etag}-{encoding}', weak)
+
+    response.content_encoding = encoding
+    return response
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, session, request
+from flask import Blueprint, render_template, redirect, url_for, session, request, make_response
 
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField
@@ -10,13 +10,23 @@ from functools import wraps
 
 import covid.utilities.utilities as utilities
 import covid.authentication.services as services
+import covid.authentication.hashing as hashing
 import covid.adapters.unit_of_work as uow
+from covid.rate_limiting.rate_limiter import limit
 
 # Configure Blueprint.
 authentication_blueprint = Blueprint(
     'authentication_bp', __name__, url_prefix='/authentication')
 
 
+@authentication_blueprint.before_request
+def limit_credential_posts():
+    # Each login or registration attempt costs a password hash, so attempts are rate limited per client and per
+    # username before the form is processed.
+    if request.method == 'POST':
+        return limit(request.endpoint, request.form.get('username'))
+
+
 @authentication_blueprint.route('/register', methods=['GET', 'POST'])
 def register():
     form = RegistrationForm()
@@ -40,8 +50,9 @@ def register():
         form=form,
         username_error_message=username_not_unique,
         handler_url=url_for('authentication_bp.register'),
-        selected_articles=utilities.get_selected_articles(),
-        tag_urls=utilities.get_tags_and_urls()
+        selected_articles=utilities.Lazy(utilities.get_selected_articles),
+        trending_articles=utilities.Lazy(utilities.get_trending_articles),
+        tag_urls=utilities.Lazy(utilities.get_tags_and_urls)
     )
 
 
@@ -80,11 +91,20 @@ def login():
         username_error_message=username_not_recognised,
         password_error_message=password_does_not_match_username,
         form=form,
-        selected_articles=utilities.get_selected_articles(),
-        tag_urls=utilities.get_tags_and_urls()
+        selected_articles=utilities.Lazy(utilities.get_selected_articles),
+        trending_articles=utilities.Lazy(utilities.get_trending_articles),
+        tag_urls=utilities.Lazy(utilities.get_tags_and_urls)
     )
 
 
+@authentication_blueprint.errorhandler(hashing.PasswordHasherBusyException)
+def password_hasher_busy(error):
+    # Every password hashing process is busy and the queue is full; ask the browser to try again shortly.
+    response = make_response('The server is busy - please try again in a moment', 503)
+    response.headers['Retry-After'] = '5'
+    return response
+
+
 @authentication_blueprint.route('/logout')
 def logout():
     session.clear()
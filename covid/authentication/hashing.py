@@ -0,0 +1,154 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+
+from werkzeug import security
+
+
+class PasswordHasherBusyException(Exception):
+    pass
+
+
+class HashingMetrics:
+    """ Running totals of time spent on password hashes, shared by the request threads.
+
+    Queue wait is the time from a request asking for a hash until a worker process starts on it, including any time spent
+    waiting for room in the queue. Hash time is the time the worker spends computing the hash.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.pool_restarts = 0
+        self.in_flight = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, queue_wait: float, hash_time: float):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.queue_wait_total += queue_wait
+            self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+            self.hash_time_total += hash_time
+            self.hash_time_max = max(self.hash_time_max, hash_time)
+
+    def failed(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def record_rejection(self):
+        with self._lock:
+            self.rejected += 1
+
+    def record_pool_restart(self):
+        with self._lock:
+            self.pool_restarts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            completed = max(self.completed, 1)
+            return {
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'pool_restarts': self.pool_restarts,
+                'in_flight': self.in_flight,
+                'queue_wait_mean': self.queue_wait_total / completed,
+                'queue_wait_max': self.queue_wait_max,
+                'hash_time_mean': self.hash_time_total / completed,
+                'hash_time_max': self.hash_time_max
+            }
+
+
+class PasswordHasher:
+    """ Computes PBKDF2 password hashes on a pool of worker processes.
+
+    Hashing is deliberately slow and holds the GIL, so a burst of logins run on the request threads would stall every
+    other page. Here at most workers hashes run at once, and at most queue_size more wait for a worker. A request that
+    finds the queue full waits up to timeout seconds for room, then gets PasswordHasherBusyException rather than
+    joining an ever longer queue.
+
+    If a worker process dies, the pool refuses all further work. It's then replaced with a new one, and the hash that
+    found it broken is tried once more.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float):
+        self._workers = workers
+        self._executor = self._new_executor()
+        self._executor_lock = Lock()
+        self._slots = BoundedSemaphore(workers + queue_size)
+        self._timeout = timeout
+        self.metrics = HashingMetrics()
+
+    def run(self, function, *args):
+        requested = time.perf_counter()
+        if not self._slots.acquire(timeout=self._timeout):
+            self.metrics.record_rejection()
+            raise PasswordHasherBusyException
+
+        self.metrics.started()
+        try:
+            result, hash_time = self._call(function, *args)
+        except BaseException:
+            self.metrics.failed()
+            raise
+        finally:
+            self._slots.release()
+
+        self.metrics.finished(time.perf_counter() - requested - hash_time, hash_time)
+        return result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def _call(self, function, *args):
+        executor = self._executor
+        try:
+            return executor.submit(timed_call, function, *args).result()
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            return self._executor.submit(timed_call, function, *args).result()
+
+    def _replace_executor(self, broken: ProcessPoolExecutor):
+        # Requests that found the same pool broken replace it only once.
+        with self._executor_lock:
+            if self._executor is broken:
+                self._executor = self._new_executor()
+                self.metrics.record_pool_restart()
+        broken.shutdown(wait=False)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Worker processes are started fresh rather than forked from a process that holds database connections.
+        return ProcessPoolExecutor(max_workers=self._workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def timed_call(function, *args):
+    # Runs in a worker process; perf_counter values aren't comparable between processes, so only a duration is returned.
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+# Hasher shared by all requests, created by create_app() when PASSWORD_HASH_WORKERS is greater than 0.
+hasher: PasswordHasher = None
+
+
+def generate_password_hash(password: str) -> str:
+    if hasher is None:
+        return security.generate_password_hash(password)
+    return hasher.run(security.generate_password_hash, password)
+
+
+def check_password_hash(password_hash: str, password: str) -> bool:
+    if hasher is None:
+        return security.check_password_hash(password_hash, password)
+    return hasher.run(security.check_password_hash, password_hash, password)
@@ -1,6 +1,5 @@
-from werkzeug.security import generate_password_hash, check_password_hash
-
 from covid.adapters import unit_of_work
+from covid.authentication.hashing import generate_password_hash, check_password_hash
 from covid.domain.model import User
 
 
@@ -23,7 +22,8 @@ def add_user(username: str, password: str, uow: unit_of_work.AbstractUnitOfWork)
         if user is not None:
             raise NameNotUniqueException
 
-        # Encrypt password so that the database doesn't store passwords 'in the clear'.
+        # Encrypt password so that the database doesn't store passwords 'in the clear'. Hashing runs on the password
+        # hashing pool, if there is one.
         password_hash = generate_password_hash(password)
 
         # Create and store the new User, with password encrypted.
@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+from threading import Lock
+from time import monotonic
+from typing import Tuple
+
+
+class DataVersion:
+    """ Identifies the current state of the content shown on cacheable pages.
+
+    The version number is bumped whenever that content changes - when a Comment is added or data is loaded - so that
+    anything cached against an earlier number can be recognised as stale.
+
+    A process is only told about its own changes. If max_age is above 0, the version also moves on once it's max_age
+    seconds old, so that cached content picks up changes made by other processes sharing the database, and randomly
+    chosen content such as the Editor's picks is chosen afresh, at least that often.
+    """
+
+    def __init__(self, max_age: float = 0):
+        self.max_age = max_age
+        self._lock = Lock()
+        self._current = (0, self._now())
+        self._set_at = monotonic()
+
+    @property
+    def number(self) -> int:
+        return self.current()[0]
+
+    def current(self) -> Tuple[int, datetime]:
+        """ Returns the version number and the time at which it was set, read together. """
+        if self.max_age > 0 and monotonic() - self._set_at >= self.max_age:
+            with self._lock:
+                # Only the first of the requests that find the version expired moves it on.
+                if monotonic() - self._set_at >= self.max_age:
+                    self._set(self._current[0] + 1)
+        return self._current
+
+    def bump(self):
+        with self._lock:
+            self._set(self._current[0] + 1)
+
+    def _set(self, number: int):
+        self._current = (number, self._now())
+        self._set_at = monotonic()
+
+    @staticmethod
+    def _now() -> datetime:
+        # HTTP dates have a resolution of one second.
+        return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+data_version = DataVersion()
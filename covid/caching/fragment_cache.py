@@ -0,0 +1,65 @@
+from threading import Lock
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from covid.caching.data_version import data_version
+
+
+class FragmentCache:
+    """ Rendered template fragments, keyed by fragment name and tagged with the data version they were rendered from. """
+
+    def __init__(self):
+        self._fragments = dict()
+        self._lock = Lock()
+
+    def get(self, key, version: int):
+        with self._lock:
+            entry = self._fragments.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1]
+
+    def put(self, key, version: int, fragment):
+        with self._lock:
+            self._fragments[key] = (version, fragment)
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+
+class FragmentCacheExtension(Extension):
+    """ Adds a {% cache %} tag that renders its body once per data version.
+
+        {% cache 'tag_list' %} ... {% endcache %}
+
+    Further comma-separated expressions after the name become part of the key. The body is only evaluated on a miss, so
+    lazily computed template values used inside it aren't computed on a hit.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(key_parts)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key_parts, caller):
+        key = tuple(key_parts)
+        version = data_version.number
+
+        fragment = self.environment.fragment_cache.get(key, version)
+        if fragment is None:
+            fragment = caller()
+            self.environment.fragment_cache.put(key, version, fragment)
+        return fragment
@@ -0,0 +1,143 @@
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from threading import Lock
+
+from flask import current_app, request, session, make_response, Response
+
+from covid.assets import compression
+from covid.caching.data_version import data_version
+from covid.caching.single_flight import SingleFlight
+
+
+response_cache_instance = None
+
+
+class CachedPage:
+    def __init__(self, body: bytes, mimetype: str, version: int, last_modified: datetime):
+        self.body = body
+        self.mimetype = mimetype
+        self.version = version
+        self.last_modified = last_modified
+        self.etag = hashlib.sha1(body).hexdigest()
+        self._encoded_bodies = dict()
+
+    def encoded_body(self, encoding: str) -> bytes:
+        # Compressed copies of the page are kept with it, so each one is only compressed once.
+        body = self._encoded_bodies.get(encoding)
+        if body is None:
+            body = compression.compress(self.body, encoding, current_app.config['COMPRESSION_LEVEL'])
+            self._encoded_bodies[encoding] = body
+        return body
+
+    def to_response(self) -> Response:
+        encoding = None
+        if (current_app.config.get('COMPRESS_RESPONSES') and compression.is_compressible(self)
+                and len(self.body) >= current_app.config['COMPRESSION_MIN_SIZE']):
+            encoding = compression.choose_encoding(request.accept_encodings)
+
+        if encoding is None:
+            response = Response(self.body, mimetype=self.mimetype)
+            response.set_etag(self.etag)
+        else:
+            # Each content coding is a separate representation, with its own entity tag.
+            response = Response(self.encoded_body(encoding), mimetype=self.mimetype)
+            response.content_encoding = encoding
+            response.set_etag(f'{self.etag}-{encoding}')
+        response.last_modified = self.last_modified
+
+        # Browsers may keep the page, but must revalidate it before each use.
+        response.cache_control.no_cache = True
+
+        # Answer If-None-Match and If-Modified-Since requests with 304 Not Modified where possible.
+        return response.make_conditional(request)
+
+
+class ResponseCache:
+    """ Least-recently-used cache of rendered pages, keyed by endpoint and query arguments.
+
+    Each page records the data version it was rendered from, and is treated as a miss once the version moves on. Stale
+    pages stay available through get_stale() until they are replaced or evicted, and renders of the same page and
+    version are coordinated through renders, so that only one request rebuilds a page at a time.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self._max_entries = max_entries
+        self._pages = OrderedDict()
+        self._lock = Lock()
+        self.renders = SingleFlight()
+
+    def get(self, key, version: int) -> CachedPage:
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None or page.version != version:
+                return None
+            self._pages.move_to_end(key)
+            return page
+
+    def get_stale(self, key) -> CachedPage:
+        # Returns the most recent page for key, whatever its version.
+        with self._lock:
+            return self._pages.get(key)
+
+    def put(self, key, page: CachedPage):
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self._max_entries:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+def request_key():
+    return request.endpoint, tuple(sorted(request.args.items(multi=True)))
+
+
+def cached_page(view):
+    # Serves logged-out visitors from the response cache. Pages for logged-in users depend on the session, so they are
+    # always rendered afresh.
+    @wraps(view)
+    def wrapped_view(**kwargs):
+        cache = response_cache_instance
+        if cache is None or 'username' in session:
+            return view(**kwargs)
+
+        key = request_key()
+        version, last_modified = data_version.current()
+        page = cache.get(key, version)
+
+        if page is None:
+            render_key = (key, version)
+            stale_page = cache.get_stale(key)
+            if stale_page is not None and cache.renders.in_flight(render_key):
+                # Another request is already rebuilding the page; serve the previous version meanwhile.
+                return stale_page.to_response()
+
+            def render():
+                # The page may have been stored while this request was waiting to become the leader.
+                cached = cache.get(key, version)
+                if cached is not None:
+                    return cached
+
+                response = make_response(view(**kwargs))
+                if response.status_code != 200:
+                    # Don't cache redirects or errors.
+                    return response
+
+                # The page is stored against the version read before rendering, so a concurrent change invalidates it.
+                rendered = CachedPage(response.get_data(), response.mimetype, version, last_modified)
+                cache.put(key, rendered)
+                return rendered
+
+            result, shared = cache.renders.do(render_key, render)
+            if not isinstance(result, CachedPage):
+                # Uncacheable responses aren't shared between requests, so followers render their own.
+                return result if not shared else view(**kwargs)
+            page = result
+
+        return page.to_response()
+    return wrapped_view
@@ -0,0 +1,51 @@
+from threading import Event, Lock
+
+
+class _Call:
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """ Collapses concurrent computations of the same key into one.
+
+    The first caller for a key (the leader) runs the computation; callers that arrive while it is in flight wait for the
+    leader and share its result, or its exception.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = dict()
+
+    def in_flight(self, key) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, compute):
+        """ Returns (result, shared), where shared is True for callers that received the leader's result. """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = compute()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
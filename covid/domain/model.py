@@ -37,6 +37,9 @@ class User:
 
 
 class Comment:
+    # Whether the Comment's User and Article refer to it, which make_comment() and attach_comment() see to.
+    _attached = False
+
     def __init__(
             self, user: User, article: 'Article', comment: str, timestamp: datetime
     ):
@@ -61,6 +64,10 @@ class Comment:
     def timestamp(self) -> datetime:
         return self._timestamp
 
+    @property
+    def attached(self) -> bool:
+        return self._attached
+
     def __eq__(self, other):
         if not isinstance(other, Comment):
             return False
@@ -81,6 +88,7 @@ class Article:
         self._hyperlink = hyperlink
         self._image_hyperlink = image_hyperlink
         self._comments = list()
+        self._comment_count = 0
         self._tags = list()
 
     @property
@@ -111,6 +119,10 @@ class Article:
     def comments(self) -> list:
         return self._comments
 
+    @property
+    def comment_count(self) -> int:
+        return self._comment_count
+
     @property
     def tags(self) -> list:
         return self._tags
@@ -123,6 +135,7 @@ class Article:
 
     def add_comment(self, comment: Comment):
         self._comments.append(comment)
+        self._comment_count += 1
 
     def add_tag(self, tag: 'Tag'):
         self._tags.append(tag)
@@ -180,12 +193,17 @@ class Tag:
 
 def make_comment(comment_text: str, user: User, article: Article, timestamp: datetime = datetime.today()):
     comment = Comment(user, article, comment_text, timestamp)
-    user.add_comment(comment)
-    article.add_comment(comment)
+    attach_comment(comment)
 
     return comment
 
 
+def attach_comment(comment: Comment):
+    comment.user.add_comment(comment)
+    comment.article.add_comment(comment)
+    comment._attached = True
+
+
 def make_tag_association(article: Article, tag: Tag):
     article.add_tag(tag)
     tag.add_article(article)
@@ -11,6 +11,7 @@ home_blueprint = Blueprint(
 def home():
     return render_template(
         'home/home.html',
-        selected_articles=utilities.get_selected_articles(),
-        tag_urls=utilities.get_tags_and_urls()
+        selected_articles=utilities.Lazy(utilities.get_selected_articles),
+        trending_articles=utilities.Lazy(utilities.get_trending_articles),
+        tag_urls=utilities.Lazy(utilities.get_tags_and_urls)
     )
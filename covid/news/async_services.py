@@ -0,0 +1,64 @@
+from covid.adapters.async_repository import AbstractAsyncRepository
+from covid.news.services import (
+    NonExistentArticleException, article_to_dict, articles_to_dict, comments_to_dict, encode_cursor, decode_cursor
+)
+
+
+# Coroutine versions of the read-only functions in covid.news.services. They return the same dicts, and raise the same
+# exceptions, as their synchronous counterparts.
+
+async def get_article(article_id: int, repo: AbstractAsyncRepository):
+    article = await repo.get_article(article_id)
+
+    if article is None:
+        raise NonExistentArticleException
+
+    return article_to_dict(article, with_comments=False)
+
+
+async def get_first_article(repo: AbstractAsyncRepository):
+    article = await repo.get_first_article()
+    return article_to_dict(article, with_comments=False)
+
+
+async def get_last_article(repo: AbstractAsyncRepository):
+    article = await repo.get_last_article()
+    return article_to_dict(article, with_comments=False)
+
+
+async def get_articles_by_date(date, repo: AbstractAsyncRepository):
+    # Returns articles for the target date (empty if no matches), the date of the previous article (might be null), the
+    # date of the next article (might be null).
+    articles = await repo.get_articles_by_date(date)
+
+    articles_dto = list()
+    prev_date = next_date = None
+
+    if len(articles) > 0:
+        prev_date = await repo.get_date_of_previous_article(articles[0])
+        next_date = await repo.get_date_of_next_article(articles[0])
+
+        # Convert Articles to dictionary form. Comments are fetched a page at a time when they're shown.
+        articles_dto = articles_to_dict(articles, with_comments=False)
+
+    return articles_dto, prev_date, next_date
+
+
+async def get_article_ids_for_tag(tag_name, repo: AbstractAsyncRepository):
+    return await repo.get_article_ids_for_tag(tag_name)
+
+
+async def get_articles_by_id(id_list, repo: AbstractAsyncRepository):
+    articles = await repo.get_articles_by_id(id_list)
+    return articles_to_dict(articles, with_comments=False)
+
+
+async def get_comment_page_for_article(article_id, quantity, cursor, repo: AbstractAsyncRepository):
+    # Returns a page of the article's comments, oldest first, and the cursor for the following page (None on the last
+    # page).
+    if await repo.get_article(article_id) is None:
+        raise NonExistentArticleException
+
+    comments, next_cursor = await repo.get_comments_for_article(article_id, quantity, decode_cursor(cursor))
+
+    return comments_to_dict(comments), encode_cursor(next_cursor)
@@ -0,0 +1,84 @@
+import queue
+from concurrent.futures import Future
+from datetime import datetime
+from threading import Lock, Thread
+
+from covid.adapters.unit_of_work import AbstractUnitOfWork
+import covid.news.services as services
+from covid.utilities.batching import next_batch
+
+
+# Writer used by comment_on_article(), created by create_app() when GROUP_COMMIT_COMMENTS is set.
+group_commit_writer_instance = None
+
+
+class GroupCommitWriter:
+    """ Stores comments from concurrent requests together, with one commit for each group.
+
+    A commit to a SQLite file waits for the disk, and that wait, not the insert, limits how many comments a second can
+    be stored one at a time. Here each request hands its comment to a writer thread and waits. The writer takes every
+    comment queued while it was busy, up to batch_size of them and waiting at most window seconds for more, stores the
+    group with add_comments() and commits once. add_comment() returns only once its comment has been committed, or
+    raises the exception that stopped it being stored, so callers get the same acknowledgement as from
+    services.add_comment(). If the comment isn't stored within timeout seconds, add_comment() raises TimeoutError
+    instead; the comment may still be committed later.
+    """
+
+    def __init__(self, uow: AbstractUnitOfWork, batch_size: int, window: float, timeout: float):
+        self._uow = uow
+        self._batch_size = batch_size
+        self._window = window
+        self._timeout = timeout
+        self._pending = queue.Queue()
+        self._stopped = False
+        self._stop_lock = Lock()
+        self._thread = Thread(target=self._run, name='group-commit', daemon=True)
+        self._thread.start()
+
+    def add_comment(self, article_id: int, comment_text: str, username: str):
+        future = Future()
+        with self._stop_lock:
+            # Once the writer has stopped, nothing would take the comment off the queue.
+            if self._stopped:
+                raise RuntimeError('The group commit writer has stopped')
+            self._pending.put((future, {
+                'article_id': article_id,
+                'comment_text': comment_text,
+                'username': username,
+                'timestamp': datetime.today()
+            }))
+        outcome = future.result(self._timeout)
+        if outcome is not None:
+            raise outcome
+
+    def stop(self):
+        # Stores the comments already queued, then stops the writer thread.
+        with self._stop_lock:
+            self._stopped = True
+            self._pending.put(None)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = next_batch(self._pending, self._batch_size, self._window)
+            if len(batch) > 0:
+                self._write(batch)
+                for _ in batch:
+                    self._pending.task_done()
+
+    def _write(self, batch):
+        task_uow = None
+        try:
+            task_uow = self._uow.for_task()
+            outcomes = services.add_comments([new_comment for _, new_comment in batch], task_uow)
+        except Exception as error:
+            # Nothing in the group was committed.
+            for future, _ in batch:
+                future.set_exception(error)
+        else:
+            for (future, _), outcome in zip(batch, outcomes):
+                future.set_result(outcome)
+        finally:
+            if task_uow is not None:
+                task_uow.close_current_session()
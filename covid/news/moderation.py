@@ -0,0 +1,101 @@
+import logging
+import queue
+from datetime import datetime
+from threading import Lock, Thread
+
+from covid.adapters.unit_of_work import AbstractUnitOfWork
+from covid.news.profanity import profanity_checker
+import covid.news.services as services
+from covid.utilities.batching import next_batch
+
+
+logger = logging.getLogger(__name__)
+
+
+# Queue used by comment_on_article(), created by create_app() when COMMENT_MODERATION is set.
+moderation_queue_instance = None
+
+
+class ModerationQueue:
+    """ Comments accepted from visitors but not yet published.
+
+    Submitting a comment only appends it to the queue. A background thread takes comments off the queue in batches of
+    up to batch_size, waiting at most batch_window seconds for a batch to fill, checks them for profanity, and stores
+    the approved ones with a single commit. The comment form has already turned away profane comments; the check here
+    covers any submitted otherwise. Comments are kept in memory until they're published, so any still queued
+    when the process exits are lost.
+    """
+
+    def __init__(self, uow: AbstractUnitOfWork, batch_size: int, batch_window: float):
+        self._uow = uow
+        self._batch_size = batch_size
+        self._batch_window = batch_window
+        self._pending = queue.Queue()
+        self._lock = Lock()
+        self.submitted = 0
+        self.approved = 0
+        self.rejected = 0
+        self.failed = 0
+        self._thread = Thread(target=self._run, name='comment-moderation', daemon=True)
+        self._thread.start()
+
+    def submit(self, article_id: int, comment_text: str, username: str):
+        # The comment is timestamped now, rather than when it's published.
+        self._pending.put({
+            'article_id': article_id,
+            'comment_text': comment_text,
+            'username': username,
+            'timestamp': datetime.today()
+        })
+        with self._lock:
+            self.submitted += 1
+
+    def drain(self):
+        # Waits until every comment submitted so far has been approved and published, or rejected.
+        self._pending.join()
+
+    def stop(self):
+        # Publishes the comments already queued, then stops the background thread.
+        self._pending.put(None)
+        self._thread.join()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'pending': self._pending.qsize(),
+                'submitted': self.submitted,
+                'approved': self.approved,
+                'rejected': self.rejected,
+                'failed': self.failed
+            }
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = next_batch(self._pending, self._batch_size, self._batch_window)
+            if len(batch) > 0:
+                self._moderate(batch)
+                for _ in batch:
+                    self._pending.task_done()
+
+    def _moderate(self, batch):
+        approved = [
+            new_comment for new_comment in batch if not profanity_checker.contains_profanity(new_comment['comment_text'])
+        ]
+
+        task_uow = None
+        try:
+            task_uow = self._uow.for_task()
+            outcomes = services.add_comments(approved, task_uow) if len(approved) > 0 else list()
+        except Exception:
+            logger.exception('Could not publish %d moderated comments', len(approved))
+            outcomes = [Exception('Could not publish the comment') for _ in approved]
+        finally:
+            if task_uow is not None:
+                task_uow.close_current_session()
+
+        published = sum(1 for outcome in outcomes if outcome is None)
+        with self._lock:
+            self.approved += published
+            self.rejected += len(batch) - len(approved)
+            self.failed += len(approved) - published
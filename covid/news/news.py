@@ -1,18 +1,24 @@
 from datetime import date
 
 from flask import Blueprint
-from flask import request, render_template, redirect, url_for, session
+from flask import request, render_template, redirect, url_for, session, current_app, abort
 
-from better_profanity import profanity
 from flask_wtf import FlaskForm
 from wtforms import TextAreaField, HiddenField, SubmitField
 from wtforms.validators import DataRequired, Length, ValidationError
 
 import covid.adapters.unit_of_work as uow
 import covid.utilities.utilities as utilities
+import covid.utilities.urls as urls
 import covid.news.services as services
+from covid.news.profanity import profanity_checker
+import covid.news.moderation as moderation
+import covid.news.group_commit as group_commit
 
 from covid.authentication.authentication import login_required
+from covid.caching.response_cache import cached_page
+from covid.rate_limiting.rate_limiter import limit
+from covid.utilities.fan_out import fan_out
 
 
 # Configure Blueprint.
@@ -21,21 +27,14 @@ news_blueprint = Blueprint(
 
 
 @news_blueprint.route('/articles_by_date', methods=['GET'])
+@cached_page
 def articles_by_date():
+    comments_per_page = 20
+
     # Read query parameters.
     target_date = request.args.get('date')
     article_to_show_comments = request.args.get('view_comments_for')
-
-    # Fetch the first and last articles in the series.
-    first_article = services.get_first_article(uow.uow_instance)
-    last_article = services.get_last_article(uow.uow_instance)
-
-    if target_date is None:
-        # No date query parameter, so return articles from day 1 of the series.
-        target_date = first_article['date']
-    else:
-        # Convert target_date from string to date.
-        target_date = date.fromisoformat(target_date)
+    comments_cursor = comments_cursor_arg()
 
     if article_to_show_comments is None:
         # No view-comments query parameter, so set to a non-existent article id.
@@ -44,9 +43,25 @@ def articles_by_date():
         # Convert article_to_show_comments from string to int.
         article_to_show_comments = int(article_to_show_comments)
 
-    # Fetch article(s) for the target date. This call also returns the previous and next dates for articles immediately
-    # before and after the target date.
-    articles, previous_date, next_date = services.get_articles_by_date(target_date, uow.uow_instance)
+    if target_date is None:
+        # No date query parameter, so return articles from day 1 of the series. Fetch the first and last articles in the
+        # series, then the article(s) for the first day.
+        first_article, last_article = fan_out(
+            uow.uow_instance, (services.get_first_article,), (services.get_last_article,))
+        target_date = first_article['date']
+        articles, previous_date, next_date = services.get_articles_by_date(target_date, uow.uow_instance)
+    else:
+        # Convert target_date from string to date.
+        target_date = date.fromisoformat(target_date)
+
+        # Fetch the first and last articles in the series and the article(s) for the target date, which don't depend on
+        # each other, concurrently. get_articles_by_date also returns the previous and next dates for articles
+        # immediately before and after the target date.
+        first_article, last_article, (articles, previous_date, next_date) = fan_out(
+            uow.uow_instance,
+            (services.get_first_article,),
+            (services.get_last_article,),
+            (services.get_articles_by_date, target_date))
 
     first_article_url = None
     last_article_url = None
@@ -65,19 +80,21 @@ def articles_by_date():
             next_article_url = url_for('news_bp.articles_by_date', date=next_date.isoformat())
             last_article_url = url_for('news_bp.articles_by_date', date=last_article['date'].isoformat())
 
-        # Construct urls for viewing article comments and adding comments.
-        for article in articles:
-            article['view_comment_url'] = url_for('news_bp.articles_by_date', date=target_date, view_comments_for=article['id'])
-            article['add_comment_url'] = url_for('news_bp.comment_on_article', article=article['id'])
+        # Recommend articles related to the article whose comments are shown, otherwise to the first article.
+        related_article_id = next(
+            (article['id'] for article in articles if article['id'] == article_to_show_comments), articles[0]['id'])
 
         # Generate the webpage to display the articles.
-        return render_template(
-            'news/articles.html',
+        return render_articles(
             title='Articles',
             articles_title=target_date.strftime('%A %B %e %Y'),
-            articles=articles,
-            selected_articles=utilities.get_selected_articles(len(articles) * 2),
-            tag_urls=utilities.get_tags_and_urls(),
+            articles=prepare_articles(
+                articles, 'news_bp.articles_by_date', dict(date=target_date), article_to_show_comments,
+                comments_cursor, comments_per_page),
+            selected_articles=utilities.Lazy(utilities.get_selected_articles, len(articles) * 2),
+            trending_articles=utilities.Lazy(utilities.get_trending_articles),
+            related_articles=utilities.get_related_articles(related_article_id),
+            tag_urls=utilities.Lazy(utilities.get_tags_and_urls),
             first_article_url=first_article_url,
             last_article_url=last_article_url,
             prev_article_url=prev_article_url,
@@ -90,13 +107,16 @@ def articles_by_date():
 
 
 @news_blueprint.route('/articles_by_tag', methods=['GET'])
+@cached_page
 def articles_by_tag():
     articles_per_page = 3
+    comments_per_page = 20
 
     # Read query parameters.
     tag_name = request.args.get('tag')
     cursor = request.args.get('cursor')
     article_to_show_comments = request.args.get('view_comments_for')
+    comments_cursor = comments_cursor_arg()
 
     if article_to_show_comments is None:
         # No view-comments query parameter, so set to a non-existent article id.
@@ -115,8 +135,9 @@ def articles_by_tag():
     # Retrieve article ids for articles that are tagged with tag_name.
     article_ids = services.get_article_ids_for_tag(tag_name, uow.uow_instance)
 
-    # Retrieve the batch of articles to display on the Web page.
-    articles = services.get_articles_by_id(article_ids[cursor:cursor + articles_per_page], uow.uow_instance)
+    # Select the batch of articles to display on the Web page. The articles themselves are fetched while the page is
+    # rendered.
+    page_article_ids = article_ids[cursor:cursor + articles_per_page]
 
     first_article_url = None
     last_article_url = None
@@ -137,19 +158,25 @@ def articles_by_tag():
             last_cursor -= articles_per_page
         last_article_url = url_for('news_bp.articles_by_tag', tag=tag_name, cursor=last_cursor)
 
-    # Construct urls for viewing article comments and adding comments.
-    for article in articles:
-        article['view_comment_url'] = url_for('news_bp.articles_by_tag', tag=tag_name, cursor=cursor, view_comments_for=article['id'])
-        article['add_comment_url'] = url_for('news_bp.comment_on_article', article=article['id'])
+    # Recommend articles related to the article whose comments are shown, otherwise to the first article.
+    related_articles = list()
+    if len(page_article_ids) > 0:
+        related_article_id = next(
+            (article_id for article_id in page_article_ids if article_id == article_to_show_comments),
+            page_article_ids[0])
+        related_articles = utilities.get_related_articles(related_article_id)
 
     # Generate the webpage to display the articles.
-    return render_template(
-        'news/articles.html',
+    return render_articles(
         title='Articles',
         articles_title='Articles tagged by ' + tag_name,
-        articles=articles,
-        selected_articles=utilities.get_selected_articles(len(articles) * 2),
-        tag_urls=utilities.get_tags_and_urls(),
+        articles=prepare_articles(
+            services.iter_articles_by_id(page_article_ids, uow.uow_instance), 'news_bp.articles_by_tag',
+            dict(tag=tag_name, cursor=cursor), article_to_show_comments, comments_cursor, comments_per_page),
+        selected_articles=utilities.Lazy(utilities.get_selected_articles, len(page_article_ids) * 2),
+        trending_articles=utilities.Lazy(utilities.get_trending_articles),
+        related_articles=related_articles,
+        tag_urls=utilities.Lazy(utilities.get_tags_and_urls),
         first_article_url=first_article_url,
         last_article_url=last_article_url,
         prev_article_url=prev_article_url,
@@ -158,6 +185,93 @@ def articles_by_tag():
     )
 
 
+@news_blueprint.route('/most_discussed', methods=['GET'])
+@cached_page
+def most_discussed():
+    articles_to_show = 10
+    comments_per_page = 20
+
+    # Read query parameters.
+    article_to_show_comments = request.args.get('view_comments_for')
+    comments_cursor = comments_cursor_arg()
+
+    if article_to_show_comments is None:
+        # No view-comments query parameter, so set to a non-existent article id.
+        article_to_show_comments = -1
+    else:
+        # Convert article_to_show_comments from string to int.
+        article_to_show_comments = int(article_to_show_comments)
+
+    # Retrieve the most commented articles from the leaderboard.
+    articles = services.get_most_commented_articles(articles_to_show, uow.uow_instance)
+
+    # Generate the webpage to display the articles.
+    return render_articles(
+        title='Articles',
+        articles_title='Most discussed articles',
+        articles=prepare_articles(
+            articles, 'news_bp.most_discussed', dict(), article_to_show_comments, comments_cursor, comments_per_page),
+        selected_articles=utilities.Lazy(utilities.get_selected_articles),
+        trending_articles=utilities.Lazy(utilities.get_trending_articles),
+        tag_urls=utilities.Lazy(utilities.get_tags_and_urls),
+        first_article_url=None,
+        last_article_url=None,
+        prev_article_url=None,
+        next_article_url=None,
+        show_comments_for_article=article_to_show_comments
+    )
+
+
+@news_blueprint.route('/user_comments', methods=['GET'])
+def user_comments():
+    comments_per_page = 10
+
+    # Read query parameters.
+    username = request.args.get('username')
+    cursor = request.args.get('cursor')
+
+    try:
+        # Retrieve the page of comments that precedes the cursor, or the newest comments if there's no cursor.
+        comments, next_cursor = services.get_comments_for_user(username, comments_per_page, cursor, uow.uow_instance)
+    except services.UnknownUserException:
+        # No such user, so return the homepage.
+        return redirect(url_for('home_bp.home'))
+    except ValueError:
+        # The cursor is malformed.
+        abort(400)
+
+    first_page_url = None
+    next_page_url = None
+
+    if cursor is not None:
+        # There are newer comments, so generate a URL for the 'first' navigation button.
+        first_page_url = url_for('news_bp.user_comments', username=username)
+
+    if next_cursor is not None:
+        # There are older comments, so generate a URL for the 'next' navigation button.
+        next_page_url = url_for('news_bp.user_comments', username=username, cursor=next_cursor)
+
+    # Generate the webpage to display the comments.
+    return render_template(
+        'news/user_comments.html',
+        title='Comments',
+        comments_title='Comments by ' + username,
+        comments=comments,
+        selected_articles=utilities.Lazy(utilities.get_selected_articles),
+        trending_articles=utilities.Lazy(utilities.get_trending_articles),
+        tag_urls=utilities.Lazy(utilities.get_tags_and_urls),
+        first_page_url=first_page_url,
+        next_page_url=next_page_url
+    )
+
+
+@news_blueprint.before_request
+def limit_comment_posts():
+    # Rate limit new comments per client and per user before they are validated and stored.
+    if request.method == 'POST' and request.endpoint == 'news_bp.comment_on_article':
+        return limit(request.endpoint, session.get('username'))
+
+
 @news_blueprint.route('/comment', methods=['GET', 'POST'])
 @login_required
 def comment_on_article():
@@ -174,11 +288,18 @@ def comment_on_article():
         # Extract the article id, representing the commented article, from the form.
         article_id = int(form.article_id.data)
 
-        # Use the service layer to store the new comment.
-        services.add_comment(article_id, form.comment.data, username, uow.uow_instance)
-
         # Retrieve the article in dict form.
-        article = services.get_article(article_id, uow.uow_instance)
+        article = services.get_article(article_id, uow.uow_instance, with_comments=False)
+
+        if moderation.moderation_queue_instance is not None:
+            # Queue the comment, to be checked and published in the background.
+            moderation.moderation_queue_instance.submit(article_id, form.comment.data, username)
+        elif group_commit.group_commit_writer_instance is not None:
+            # Store the comment together with those from other requests, and wait for it to be committed.
+            group_commit.group_commit_writer_instance.add_comment(article_id, form.comment.data, username)
+        else:
+            # Use the service layer to store the new comment.
+            services.add_comment(article_id, form.comment.data, username, uow.uow_instance)
 
         # Cause the web browser to display the page of all articles that have the same date as the commented article,
         # and display all comments, including the new comment.
@@ -198,18 +319,58 @@ def comment_on_article():
 
     # For a GET or an unsuccessful POST, retrieve the article to comment in dict form, and return a Web page that allows
     # the user to enter a comment. The generated Web page includes a form object.
-    article = services.get_article(article_id, uow.uow_instance)
+    article = services.get_article(article_id, uow.uow_instance, with_comments=False)
+    article['comments'], _ = services.get_comment_page_for_article(article_id, 20, None, uow.uow_instance)
     return render_template(
         'news/comment_on_article.html',
         title='Edit article',
         article=article,
         form=form,
         handler_url=url_for('news_bp.comment_on_article'),
-        selected_articles=utilities.get_selected_articles(),
-        tag_urls=utilities.get_tags_and_urls()
+        selected_articles=utilities.Lazy(utilities.get_selected_articles),
+        trending_articles=utilities.Lazy(utilities.get_trending_articles),
+        related_articles=utilities.get_related_articles(int(article_id)),
+        tag_urls=utilities.Lazy(utilities.get_tags_and_urls)
     )
 
 
+def comments_cursor_arg():
+    # Returns the comments_cursor query parameter. A malformed cursor is rejected with 400 Bad Request before any of the
+    # page, which may be streamed, has been sent.
+    comments_cursor = request.args.get('comments_cursor')
+    try:
+        services.decode_cursor(comments_cursor)
+    except ValueError:
+        abort(400)
+    return comments_cursor
+
+
+def prepare_articles(articles, view_endpoint, view_args, article_to_show_comments, comments_cursor, comments_per_page):
+    # Yields the articles with URLs for viewing and adding comments, and a page of comments for the article whose
+    # comments are shown. articles can be any iterable, so a listing can be prepared while the page is rendered.
+    for article in articles:
+        article['view_comment_url'] = urls.build_url(view_endpoint, **view_args, view_comments_for=article['id'])
+        article['add_comment_url'] = urls.build_url('news_bp.comment_on_article', article=article['id'])
+
+        if article['id'] == article_to_show_comments:
+            # Fetch a page of the article's comments, and a URL for the following page if there is one.
+            article['comments'], next_comments_cursor = services.get_comment_page_for_article(
+                article['id'], comments_per_page, comments_cursor, uow.uow_instance)
+            if next_comments_cursor is not None:
+                article['more_comments_url'] = urls.build_url(
+                    view_endpoint, **view_args, view_comments_for=article['id'], comments_cursor=next_comments_cursor)
+
+        yield article
+
+
+def render_articles(**context):
+    # With STREAM_ARTICLE_LISTINGS set, the page header and the first articles are sent before the remaining articles
+    # have been fetched.
+    if current_app.config['STREAM_ARTICLE_LISTINGS']:
+        return utilities.stream_template('news/articles.html', **context)
+    return render_template('news/articles.html', **context)
+
+
 class ProfanityFree:
     def __init__(self, message=None):
         if not message:
@@ -217,7 +378,8 @@ class ProfanityFree:
         self.message = message
 
     def __call__(self, form, field):
-        if profanity.contains_profanity(field.data):
+        # Checked here even with comment moderation, so that the user is told why their comment won't be published.
+        if profanity_checker.contains_profanity(field.data):
             raise ValidationError(self.message)
 
 
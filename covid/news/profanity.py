@@ -0,0 +1,178 @@
+import re
+from threading import Lock
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+from better_profanity.constants import ALLOWED_CHARACTERS
+from better_profanity.utils import read_wordlist, get_complete_path_of_file
+
+
+# The characters that may stand in for each letter, as in better_profanity.
+chars_mapping = {
+    'a': ('a', '@', '*', '4'),
+    'i': ('i', '*', 'l', '1'),
+    'o': ('o', '*', '0', '@'),
+    'u': ('u', '*', 'v'),
+    'v': ('v', '*', 'u'),
+    'l': ('l', '1'),
+    'e': ('e', '*', '3'),
+    's': ('s', '$', '5'),
+    't': ('t', '7'),
+}
+
+
+# Upper limit on the number of cached whole-word transitions.
+max_word_transitions = 50000
+
+
+class ProfanityChecker:
+    """ Finds profane words and phrases in text in a single pass, with the same results as better_profanity.
+
+    better_profanity expands every word in its list into all of its leetspeak spellings (around 180,000 of them), and
+    looks up each word of the text, and each run of following words, in that set. Here the word list is compiled into
+    a trie over plain letters instead, and each character of the text is read as every letter it may stand for ('@'
+    may be an 'a' or an 'o'). The trie is walked as a DFA whose states are sets of trie nodes; each state's transitions
+    are worked out the first time they're needed and then kept, so checking a comment is a dict lookup per character.
+
+    As with better_profanity, words are runs of letters, digits and the characters @$*"' and matching is case
+    insensitive. A phrase in the list, such as 'hand job', matches consecutive words either run together ('handjob')
+    or with the separators found in the text between them. Unlike better_profanity, a match whose last word is a single
+    character at the very end of the text isn't missed.
+    """
+
+    def __init__(self, words: Iterable[str]):
+        words = [word.lower() for word in words]
+
+        # Like better_profanity, a match may run on over as many following words as the longest phrase has.
+        self._max_following = max([1] + [word.count(' ') for word in words])
+
+        # The trie. Node 0 is the root; children[node] maps a character to the child node.
+        self._children: List[Dict[str, int]] = [dict()]
+        self._ends = set()
+        for word in words:
+            node = 0
+            for char in word:
+                child = self._children[node].get(char)
+                if child is None:
+                    child = len(self._children)
+                    self._children[node][char] = child
+                    self._children.append(dict())
+                node = child
+            self._ends.add(node)
+
+        self._readings = dict()
+        for letter, stand_ins in chars_mapping.items():
+            for char in stand_ins:
+                self._readings.setdefault(char, {char}).add(letter)
+
+        # Any other character can't continue a match, so it needn't have transitions of its own.
+        self._alphabet = set(self._readings).union(*(children.keys() for children in self._children))
+
+        # DFA states, numbered in order of discovery. State 0 is dead, and state 1 is the start.
+        self._state_ids: Dict[FrozenSet[int], int] = dict()
+        self._states: List[FrozenSet[int]] = list()
+        self._accepting: List[bool] = list()
+        self._transitions: Dict[Tuple[int, str], int] = dict()
+        self._lock = Lock()
+        self._state(frozenset())
+        self._state(frozenset([0]))
+
+        self._word_transitions: Dict[Tuple[int, str], int] = dict()
+
+        self._separator = re.compile('([^' + character_ranges(ALLOWED_CHARACTERS) + ']+)')
+
+    @classmethod
+    def from_default_wordlist(cls):
+        return cls(read_wordlist(get_complete_path_of_file('profanity_wordlist.txt')))
+
+    def contains_profanity(self, text: str) -> bool:
+        # Alternating words and separators, starting and ending with a (possibly empty) word.
+        parts = self._separator.split(text)
+        run = self._run
+        accepting = self._accepting
+
+        for first in range(0, len(parts), 2):
+            if not parts[first]:
+                continue
+            joined = spaced = run(1, parts[first])
+            if accepting[joined]:
+                return True
+
+            # Try to extend the match over the following words.
+            following = first + 2
+            while (joined or spaced) and following < min(len(parts), first + 2 * self._max_following + 1):
+                if not parts[following]:
+                    break
+                if joined:
+                    joined = run(joined, parts[following])
+                if spaced:
+                    spaced = run(run(spaced, parts[following - 1]), parts[following])
+                if accepting[joined] or accepting[spaced]:
+                    return True
+                following += 2
+        return False
+
+    def _run(self, state: int, chars: str) -> int:
+        # Returns the state reached from state on chars. Comments are mostly made of the same few thousand words, so
+        # whole words are looked up first.
+        key = (state, chars)
+        end_state = self._word_transitions.get(key)
+        if end_state is not None:
+            return end_state
+
+        transitions = self._transitions
+        end_state = state
+        for char in chars.lower():
+            next_state = transitions.get((end_state, char))
+            if next_state is None:
+                next_state = self._step(end_state, char) if char in self._alphabet else 0
+            end_state = next_state
+            if not end_state:
+                break
+
+        if len(self._word_transitions) >= max_word_transitions:
+            self._word_transitions = dict()
+        self._word_transitions[key] = end_state
+        return end_state
+
+    def _step(self, state: int, char: str) -> int:
+        # Request threads share the checker, so new states are added one thread at a time.
+        with self._lock:
+            nodes = frozenset(
+                child
+                for node in self._states[state]
+                for letter in self._readings.get(char, (char,))
+                for child in (self._children[node].get(letter),)
+                if child is not None)
+            next_state = self._state(nodes)
+            self._transitions[(state, char)] = next_state
+            return next_state
+
+    def _state(self, nodes: FrozenSet[int]) -> int:
+        state = self._state_ids.get(nodes)
+        if state is None:
+            state = len(self._states)
+            self._state_ids[nodes] = state
+            self._states.append(nodes)
+            self._accepting.append(not nodes.isdisjoint(self._ends))
+        return state
+
+
+def character_ranges(chars) -> str:
+    # Writes chars for a regular expression character class as ranges such as a-z, which re matches much faster than a
+    # class listing thousands of characters one by one.
+    codes = sorted(ord(char) for char in chars)
+    ranges = list()
+    first = last = codes[0]
+    for code in codes[1:]:
+        if code != last + 1:
+            ranges.append((first, last))
+            first = code
+        last = code
+    ranges.append((first, last))
+    return ''.join(
+        re.escape(chr(first)) if first == last else f'{re.escape(chr(first))}-{re.escape(chr(last))}'
+        for first, last in ranges)
+
+
+# Compiled once, when the application starts.
+profanity_checker = ProfanityChecker.from_default_wordlist()
@@ -1,7 +1,9 @@
+from datetime import datetime
 from typing import List
 
 from covid.adapters import unit_of_work
-from covid.domain.model import make_comment, Article, Comment, Tag
+from covid.caching.data_version import data_version
+from covid.domain.model import Article, Comment, Tag
 
 
 class NonExistentArticleException(Exception):
@@ -23,15 +25,53 @@ def add_comment(article_id: int, comment_text: str, username: str, uow: unit_of_
         if user is None:
             raise UnknownUserException
 
-        # Create comment.
-        comment = make_comment(comment_text, user, article)
+        # Create comment. The repository links it to the article and user once it's committed, so other requests
+        # don't see it before then.
+        comment = Comment(user, article, comment_text, datetime.today())
 
         # Update the repository.
         uow.repo.add_comment(comment)
         uow.commit()
 
+    # Pages showing the article, its comment count or the rankings are now out of date.
+    data_version.bump()
 
-def get_article(article_id: int, uow: unit_of_work.AbstractUnitOfWork):
+
+def add_comments(new_comments: List[dict], uow: unit_of_work.AbstractUnitOfWork) -> list:
+    # Stores a batch of comments, each a dict with article_id, comment_text, username and timestamp, in one commit.
+    # Returns a list holding, for each comment in turn, None if it was stored or the exception that prevented it.
+    outcomes = list()
+    articles = dict()
+    users = dict()
+    comments = list()
+    with uow:
+        for new_comment in new_comments:
+            # Batches often hold several comments on the same article, or by the same user, so each is looked up once.
+            article_id, username = new_comment['article_id'], new_comment['username']
+            if article_id not in articles:
+                articles[article_id] = uow.repo.get_article(article_id)
+            if username not in users:
+                users[username] = uow.repo.get_user(username)
+            article, user = articles[article_id], users[username]
+
+            if article is None:
+                outcomes.append(NonExistentArticleException())
+            elif user is None:
+                outcomes.append(UnknownUserException())
+            else:
+                comments.append(Comment(user, article, new_comment['comment_text'], new_comment['timestamp']))
+                outcomes.append(None)
+
+        if len(comments) > 0:
+            uow.repo.add_comments(comments)
+            uow.commit()
+
+    if any(outcome is None for outcome in outcomes):
+        data_version.bump()
+    return outcomes
+
+
+def get_article(article_id: int, uow: unit_of_work.AbstractUnitOfWork, with_comments=True):
     article = None
     with uow:
         article = uow.repo.get_article(article_id)
@@ -39,7 +79,7 @@ def get_article(article_id: int, uow: unit_of_work.AbstractUnitOfWork):
         if article is None:
             raise NonExistentArticleException
 
-    return article_to_dict(article)
+    return article_to_dict(article, with_comments)
 
 
 def get_first_article(uow: unit_of_work.AbstractUnitOfWork):
@@ -47,14 +87,14 @@ def get_first_article(uow: unit_of_work.AbstractUnitOfWork):
     with uow:
         article = uow.repo.get_first_article()
 
-    return article_to_dict(article)
+    return article_to_dict(article, with_comments=False)
 
 
 def get_last_article(uow: unit_of_work.AbstractUnitOfWork):
     article = None
     with uow:
         article = uow.repo.get_last_article()
-    return article_to_dict(article)
+    return article_to_dict(article, with_comments=False)
 
 
 def get_articles_by_date(date, uow: unit_of_work.AbstractUnitOfWork):
@@ -69,8 +109,8 @@ def get_articles_by_date(date, uow: unit_of_work.AbstractUnitOfWork):
             prev_date = uow.repo.get_date_of_previous_article(articles[0])
             next_date = uow.repo.get_date_of_next_article(articles[0])
 
-            # Convert Articles to dictionary form.
-            articles_dto = articles_to_dict(articles)
+            # Convert Articles to dictionary form. Comments are fetched a page at a time when they're shown.
+            articles_dto = articles_to_dict(articles, with_comments=False)
 
         return articles_dto, prev_date, next_date
 
@@ -86,8 +126,52 @@ def get_articles_by_id(id_list, uow: unit_of_work.AbstractUnitOfWork):
     with uow:
         articles = uow.repo.get_articles_by_id(id_list)
 
-        # Convert Articles to dictionary form.
-        articles_as_dict = articles_to_dict(articles)
+        # Convert Articles to dictionary form. Comments are fetched a page at a time when they're shown.
+        articles_as_dict = articles_to_dict(articles, with_comments=False)
+
+        return articles_as_dict
+
+
+def iter_articles_by_id(id_list, uow: unit_of_work.AbstractUnitOfWork, batch_size=20):
+    # Yields Articles in dictionary form, fetching batch_size Articles at a time.
+    for start in range(0, len(id_list), batch_size):
+        with uow:
+            articles = uow.repo.get_articles_by_id(id_list[start:start + batch_size])
+
+            # Convert Articles to dictionary form. Comments are fetched a page at a time when they're shown.
+            articles_as_dict = articles_to_dict(articles, with_comments=False)
+
+        yield from articles_as_dict
+
+
+def get_article_page(quantity, cursor, uow: unit_of_work.AbstractUnitOfWork):
+    # Returns a page of articles in id order, and the cursor for the following page (None on the last page).
+    with uow:
+        articles, next_cursor = uow.repo.get_article_page(quantity, None if cursor is None else int(cursor))
+
+        return articles_to_dict(articles, with_comments=False), None if next_cursor is None else str(next_cursor)
+
+
+def iter_articles(uow: unit_of_work.AbstractUnitOfWork, batch_size=1000):
+    # Generates every article one dict at a time. The unit of work stays open until the generator is exhausted or
+    # closed.
+    # Each tag is given by name only; listing every article it's applied to would repeat much of the export.
+    with uow:
+        for article in uow.repo.iter_articles(batch_size):
+            yield article_to_dict(article, with_comments=False, with_tagged_articles=False)
+
+
+def get_most_commented_articles(quantity, uow: unit_of_work.AbstractUnitOfWork):
+    with uow:
+        most_commented = uow.repo.get_most_commented_article_ids(quantity)
+        article_ids = [article_id for article_id, _ in most_commented]
+        articles = uow.repo.get_articles_by_id(article_ids)
+
+        # Restore the ranking, which isn't necessarily preserved when fetching Articles by id.
+        articles.sort(key=lambda article: article_ids.index(article.id))
+
+        # Convert Articles to dictionary form. Comments are fetched a page at a time when they're shown.
+        articles_as_dict = articles_to_dict(articles, with_comments=False)
 
         return articles_as_dict
 
@@ -102,11 +186,70 @@ def get_comments_for_article(article_id, uow: unit_of_work.AbstractUnitOfWork):
         return comments_to_dict(article.comments)
 
 
+def get_comment_page_for_article(article_id, quantity, cursor, uow: unit_of_work.AbstractUnitOfWork):
+    # Returns a page of the article's comments, oldest first, and the cursor for the following page (None on the last
+    # page).
+    with uow:
+        if uow.repo.get_article(article_id) is None:
+            raise NonExistentArticleException
+
+        comments, next_cursor = uow.repo.get_comments_for_article(article_id, quantity, decode_cursor(cursor))
+
+        return comments_to_dict(comments), encode_cursor(next_cursor)
+
+
+def iter_comments_for_article(article_id, uow: unit_of_work.AbstractUnitOfWork, batch_size=1000):
+    # Generates the article's comments one dict at a time. The unit of work stays open until the generator is exhausted
+    # or closed, and NonExistentArticleException is raised when iteration starts.
+    with uow:
+        if uow.repo.get_article(article_id) is None:
+            raise NonExistentArticleException
+
+        for comment in uow.repo.iter_comments(article_id, batch_size):
+            yield comment_to_dict(comment)
+
+
+def iter_comments(uow: unit_of_work.AbstractUnitOfWork, batch_size=1000):
+    # Generates every comment one dict at a time, with the same lifetime as iter_articles().
+    with uow:
+        for comment in uow.repo.iter_comments(None, batch_size):
+            yield comment_to_dict(comment)
+
+
+def get_comments_for_user(username: str, quantity: int, cursor: str, uow: unit_of_work.AbstractUnitOfWork):
+    # Returns a page of the user's comments, newest first, and the cursor for the following page (None on the last page).
+    with uow:
+        if uow.repo.get_user(username) is None:
+            raise UnknownUserException
+
+        comments, next_cursor = uow.repo.get_comments_for_user(username, quantity, decode_cursor(cursor))
+
+        return comments_to_dict(comments), encode_cursor(next_cursor)
+
+
+# ============================================
+# Functions to convert keyset cursors to and from query-string form
+# ============================================
+
+def encode_cursor(cursor):
+    if cursor is None:
+        return None
+    timestamp, key = cursor
+    return f'{timestamp.isoformat()},{key}'
+
+
+def decode_cursor(cursor: str):
+    if cursor is None:
+        return None
+    timestamp, key = cursor.split(',', 1)
+    return datetime.fromisoformat(timestamp), int(key)
+
+
 # ============================================
 # Functions to convert model entities to dicts
 # ============================================
 
-def article_to_dict(article: Article):
+def article_to_dict(article: Article, with_comments=True, with_tagged_articles=True):
     article_dict = {
         'id': article.id,
         'date': article.date,
@@ -114,14 +257,16 @@ def article_to_dict(article: Article):
         'first_para': article.first_para,
         'hyperlink': article.hyperlink,
         'image_hyperlink': article.image_hyperlink,
-        'comments': comments_to_dict(article.comments),
-        'tags': tags_to_dict(article.tags)
+        'comment_count': article.comment_count,
+        'tags': tags_to_dict(article.tags, with_tagged_articles)
     }
+    if with_comments:
+        article_dict['comments'] = comments_to_dict(article.comments)
     return article_dict
 
 
-def articles_to_dict(articles: List[Article]):
-    return [article_to_dict(article) for article in articles]
+def articles_to_dict(articles: List[Article], with_comments=True):
+    return [article_to_dict(article, with_comments) for article in articles]
 
 
 def comment_to_dict(comment: Comment):
@@ -138,16 +283,17 @@ def comments_to_dict(comments: List[Comment]):
     return [comment_to_dict(comment) for comment in comments]
 
 
-def tag_to_dict(tag: Tag):
+def tag_to_dict(tag: Tag, with_tagged_articles=True):
     tag_dict = {
-        'name': tag.tag_name,
-        'tagged_articles': [article.id for article in tag.tagged_articles]
+        'name': tag.tag_name
     }
+    if with_tagged_articles:
+        tag_dict['tagged_articles'] = [article.id for article in tag.tagged_articles]
     return tag_dict
 
 
-def tags_to_dict(tags: List[Tag]):
-    return [tag_to_dict(tag) for tag in tags]
+def tags_to_dict(tags: List[Tag], with_tagged_articles=True):
+    return [tag_to_dict(tag, with_tagged_articles) for tag in tags]
 
 
 # ============================================
@@ -0,0 +1,46 @@
+import math
+import time
+
+from flask import request, make_response
+
+from covid.rate_limiting.stores import AbstractBucketStore
+
+
+rate_limiter_instance = None
+
+
+class RateLimiter:
+    """ Token-bucket rate limits on expensive requests, per client IP address and per username.
+
+    Each kind of request (its scope, e.g. 'login') has its own buckets. A client may make burst requests in quick
+    succession, after which it is held to per_minute requests a minute.
+    """
+
+    def __init__(self, store: AbstractBucketStore, burst: int, per_minute: float):
+        self.store = store
+        self.capacity = burst
+        self.rate = per_minute / 60
+
+    def check(self, scope: str, remote_addr: str, username: str = None) -> float:
+        # Takes a token for the request, and returns 0 if it may go ahead or the seconds to wait if it may not.
+        keys = [f'{scope}:ip:{remote_addr}']
+        if username:
+            keys.append(f'{scope}:user:{username}')
+        return self.store.take(keys, self.capacity, self.rate, time.time())
+
+
+def limit(scope: str, username: str = None):
+    """ Returns a 429 Too Many Requests response if the current request is over its rate limit, or None if it isn't.
+
+    Meant for before_request hooks, so that a request over its limit is turned away before the view does any work.
+    """
+    if rate_limiter_instance is None:
+        return None
+
+    wait = rate_limiter_instance.check(scope, request.remote_addr, username)
+    if wait == 0:
+        return None
+
+    response = make_response('Too many requests - please wait a moment and try again', 429)
+    response.headers['Retry-After'] = str(math.ceil(wait))
+    return response
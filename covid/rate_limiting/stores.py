@@ -0,0 +1,102 @@
+import abc
+import sqlite3
+import threading
+from typing import Dict, List, Tuple
+
+
+# Number of takes between sweeps that forget idle buckets.
+prune_interval = 1000
+
+
+class AbstractBucketStore(abc.ABC):
+    """ Holds the state of token buckets: the tokens left in each bucket, and when that was last worked out.
+
+    A bucket holds up to capacity tokens and gains rate tokens per second. A missing bucket is full, so a bucket that
+    has been idle long enough to refill can be forgotten.
+    """
+
+    @abc.abstractmethod
+    def take(self, keys: List[str], capacity: float, rate: float, now: float) -> float:
+        """ Takes a token from each of the buckets named by keys, as one atomic step.
+
+        Returns 0 if every bucket had a token. Otherwise no tokens are taken, and the number of seconds until every
+        bucket will have a token is returned.
+        """
+        raise NotImplementedError
+
+
+def refill(tokens: float, updated: float, capacity: float, rate: float, now: float) -> float:
+    return min(capacity, tokens + max(now - updated, 0) * rate)
+
+
+def take_from(buckets: Dict[str, Tuple[float, float]], keys, capacity, rate, now) -> Tuple[float, dict]:
+    # Works out the outcome of a take on buckets, a dict of key: (tokens, updated). Returns the wait as for take(), and
+    # the new states of the buckets.
+    levels = {key: refill(*buckets.get(key, (capacity, now)), capacity, rate, now) for key in keys}
+    shortfall = max(1 - tokens for tokens in levels.values())
+    if shortfall > 0:
+        return shortfall / rate, {}
+    return 0, {key: (tokens - 1, now) for key, tokens in levels.items()}
+
+
+class LocalBucketStore(AbstractBucketStore):
+    # Buckets held in this process, for a server that runs a single process.
+
+    def __init__(self):
+        self._buckets = dict()
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, keys, capacity, rate, now):
+        with self._lock:
+            wait, updated = take_from(self._buckets, keys, capacity, rate, now)
+            self._buckets.update(updated)
+
+            self._takes += 1
+            if self._takes % prune_interval == 0:
+                idle_since = now - capacity / rate
+                self._buckets = {key: state for key, state in self._buckets.items() if state[1] > idle_since}
+            return wait
+
+
+class SqliteBucketStore(AbstractBucketStore):
+    """ Buckets kept in a SQLite file, so that all the processes of a server on one machine share them.
+
+    Each take is a write transaction, which SQLite runs one at a time across processes.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        self._takes = 0
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads, so each thread opens its own.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            self._local.connection = connection
+        return connection
+
+    def take(self, keys, capacity, rate, now):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            placeholders = ', '.join('?' * len(keys))
+            rows = connection.execute(
+                f'SELECT key, tokens, updated FROM buckets WHERE key IN ({placeholders})', list(keys)).fetchall()
+            wait, updated = take_from({key: (tokens, at) for key, tokens, at in rows}, keys, capacity, rate, now)
+            connection.executemany(
+                'INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                [(key, tokens, at) for key, (tokens, at) in updated.items()])
+
+            self._takes += 1
+            if self._takes % prune_interval == 0:
+                connection.execute('DELETE FROM buckets WHERE updated <= ?', (now - capacity / rate,))
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return wait
@@ -0,0 +1,25 @@
+import random
+
+from covid.adapters.async_repository import AbstractAsyncRepository
+from covid.utilities.services import articles_to_dict
+
+
+# Coroutine versions of the read-only functions in covid.utilities.services.
+
+async def get_tag_names(repo: AbstractAsyncRepository):
+    tags = await repo.get_tags()
+    return [tag.tag_name for tag in tags]
+
+
+async def get_random_articles(quantity, repo: AbstractAsyncRepository):
+    article_count = await repo.get_number_of_articles()
+
+    if quantity >= article_count:
+        # Reduce the quantity of ids to generate if the repository has an insufficient number of articles.
+        quantity = article_count - 1
+
+    # Pick distinct and random articles.
+    random_ids = random.sample(range(1, article_count), quantity)
+    articles = await repo.get_articles_by_id(random_ids)
+
+    return articles_to_dict(articles)
@@ -0,0 +1,27 @@
+import queue
+import time
+
+
+def next_batch(pending: queue.Queue, size: int, window: float):
+    """ Takes the next batch of up to size items off pending, and returns it with a flag that is True once told to stop.
+
+    Waits as long as it takes for the first item, then at most window seconds for the batch to fill. A None item asks
+    the consumer to stop after the batch; it's marked done here, and the items in the batch are left for the caller to
+    mark done.
+    """
+    batch = list()
+    deadline = None
+    while len(batch) < size:
+        try:
+            if deadline is None:
+                item = pending.get()
+                deadline = time.monotonic() + window
+            else:
+                item = pending.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            break
+        if item is None:
+            pending.task_done()
+            return batch, True
+        batch.append(item)
+    return batch, False
@@ -0,0 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from covid.adapters.unit_of_work import AbstractUnitOfWork
+
+
+# Thread pool shared by all requests, created by create_app() when FAN_OUT_WORKERS is greater than 0.
+executor: ThreadPoolExecutor = None
+
+
+def fan_out(uow: AbstractUnitOfWork, *calls) -> list:
+    """ Runs independent, read-only service calls concurrently and returns their results in order.
+
+    Each call is a tuple of a service function and its arguments other than the unit of work, e.g.
+    (services.get_articles_by_date, target_date). On the thread pool each call gets its own unit of work, and so its
+    own database session, which is closed when the call returns. Calls run one after another on the calling thread if
+    there is no thread pool, or if the unit of work gains nothing from concurrency. An exception raised by any call is
+    re-raised here once all calls have been submitted.
+    """
+    if executor is None or not uow.concurrent_reads or len(calls) < 2:
+        return [function(*args, uow) for function, *args in calls]
+
+    futures = [executor.submit(run_task, function, args, uow.for_task()) for function, *args in calls]
+    return [future.result() for future in futures]
+
+
+def run_task(function, args, task_uow: AbstractUnitOfWork):
+    try:
+        return function(*args, task_uow)
+    finally:
+        task_uow.close_current_session()
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List
 import random
 
@@ -28,6 +29,37 @@ def get_random_articles(quantity, uow: unit_of_work.AbstractUnitOfWork):
         return articles_to_dict(articles)
 
 
+def get_related_articles(article_id, quantity, uow: unit_of_work.AbstractUnitOfWork):
+    with uow:
+        related_ids = uow.repo.get_related_article_ids(article_id, quantity)
+        articles = uow.repo.get_articles_by_id(related_ids)
+
+        # Restore the ranking, which isn't necessarily preserved when fetching Articles by id.
+        articles.sort(key=lambda article: related_ids.index(article.id))
+
+        return articles_to_dict(articles)
+
+
+def get_trending_articles(quantity, uow: unit_of_work.AbstractUnitOfWork, now: datetime = None):
+    # The window ends at the current time, so articles stop trending once their comments are a day old.
+    if now is None:
+        now = datetime.now()
+
+    with uow:
+        trending = uow.repo.get_trending_article_ids(quantity, now)
+        trending_ids = [article_id for article_id, _ in trending]
+        rates = dict(trending)
+        articles = uow.repo.get_articles_by_id(trending_ids)
+
+        # Restore the ranking, and include the comment rate with each Article.
+        articles.sort(key=lambda article: trending_ids.index(article.id))
+        articles_as_dict = articles_to_dict(articles)
+        for article, article_dict in zip(articles, articles_as_dict):
+            article_dict['comments_per_hour'] = rates[article.id]
+
+        return articles_as_dict
+
+
 # ============================================
 # Functions to convert dicts to model entities
 # ============================================
@@ -0,0 +1,53 @@
+from threading import Lock
+
+from flask import request, url_for
+from werkzeug.urls import url_quote, url_quote_plus
+
+
+class UrlTemplate:
+    """ URL for an endpoint with a placeholder for each of its arguments.
+
+    The template is built once by calling url_for with placeholder values, so it follows the blueprint's route and
+    URL prefix. URLs are then produced by quoting the argument values and substituting them with str.format, without
+    going through werkzeug's URL map.
+    """
+
+    def __init__(self, endpoint: str, arg_names: tuple):
+        placeholders = {name: '__url_arg_{}__'.format(index) for index, name in enumerate(arg_names)}
+        url = url_for(endpoint, **placeholders)
+
+        # Escape literal braces, then turn each placeholder into a named format field.
+        path = url.split('?', 1)[0]
+        format_string = url.replace('{', '{{').replace('}', '}}')
+        self._quoters = dict()
+        for name, placeholder in placeholders.items():
+            # Route arguments are quoted as werkzeug's default converter does, query arguments as url_encode does.
+            self._quoters[name] = _quote_path_value if placeholder in path else url_quote_plus
+            format_string = format_string.replace(placeholder, '{' + name + '}')
+        self._format_string = format_string
+
+    def build(self, **values) -> str:
+        return self._format_string.format(
+            **{name: quote(str(values[name])) for name, quote in self._quoters.items()})
+
+
+def _quote_path_value(value: str) -> str:
+    return url_quote(value, safe='/:')
+
+
+_templates = dict()
+_templates_lock = Lock()
+
+
+def build_url(endpoint: str, **values) -> str:
+    """ Equivalent to url_for(endpoint, **values) for fully qualified endpoints, using a cached UrlTemplate.
+
+    Values must not be None, and arguments must be passed in the same order for the template to be reused.
+    """
+    key = (endpoint, tuple(values), request.script_root)
+    template = _templates.get(key)
+    if template is None:
+        template = UrlTemplate(endpoint, tuple(values))
+        with _templates_lock:
+            _templates[key] = template
+    return template.build(**values)
@@ -1,7 +1,8 @@
-from flask import Blueprint, request, render_template, redirect, url_for, session
+from flask import Blueprint, request, render_template, redirect, session, current_app, stream_with_context, Response
 
 import covid.adapters.unit_of_work as uow
 import covid.utilities.services as services
+import covid.utilities.urls as urls
 
 
 # Configure Blueprint.
@@ -9,11 +10,63 @@ utilities_blueprint = Blueprint(
     'utilities_bp', __name__)
 
 
+class Lazy:
+    """ Template value that is computed the first time the template uses it.
+
+    Values only used inside cached template fragments are then never computed when the fragment is served from the
+    fragment cache.
+    """
+
+    def __init__(self, compute, *args):
+        self._compute = compute
+        self._args = args
+        self._value = None
+        self._computed = False
+
+    @property
+    def args(self) -> tuple:
+        # The arguments the value is computed from, which a fragment cache key can include without computing it.
+        return self._args
+
+    @property
+    def value(self):
+        if not self._computed:
+            self._value = self._compute(*self._args)
+            self._computed = True
+        return self._value
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __bool__(self):
+        return bool(self.value)
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def __contains__(self, item):
+        return item in self.value
+
+
+def stream_template(template_name, **context):
+    # Renders the template as it is sent, rather than building the whole page first.
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+
+    # Send the page in chunks of several template events, rather than one write per event.
+    stream.enable_buffering(20)
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+
 def get_tags_and_urls():
     tag_names = services.get_tag_names(uow.uow_instance)
     tag_urls = dict()
     for tag_name in tag_names:
-        tag_urls[tag_name] = url_for('news_bp.articles_by_tag', tag=tag_name)
+        tag_urls[tag_name] = urls.build_url('news_bp.articles_by_tag', tag=tag_name)
 
     return tag_urls
 
@@ -22,5 +75,21 @@ def get_selected_articles(quantity=3):
     articles = services.get_random_articles(quantity, uow.uow_instance)
 
     for article in articles:
-        article['hyperlink'] = url_for('news_bp.articles_by_date', date=article['date'].isoformat())
+        article['hyperlink'] = urls.build_url('news_bp.articles_by_date', date=article['date'].isoformat())
+    return articles
+
+
+def get_related_articles(article_id, quantity=3):
+    articles = services.get_related_articles(article_id, quantity, uow.uow_instance)
+
+    for article in articles:
+        article['hyperlink'] = urls.build_url('news_bp.articles_by_date', date=article['date'].isoformat())
+    return articles
+
+
+def get_trending_articles(quantity=3):
+    articles = services.get_trending_articles(quantity, uow.uow_instance)
+
+    for article in articles:
+        article['hyperlink'] = urls.build_url('news_bp.articles_by_date', date=article['date'].isoformat())
     return articles
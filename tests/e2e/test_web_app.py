@@ -1,6 +1,21 @@
+import gzip
+import json
+import os
+import shutil
+
 import pytest
 
-from flask import session
+from flask import session, url_for
+
+from covid import create_app
+from covid.utilities.urls import build_url
+from covid.assets.build import build_static_assets
+import covid.rate_limiting.rate_limiter as rate_limiter
+import covid.news.moderation as moderation
+import covid.adapters.write_ahead_log as write_ahead_log
+from covid.rate_limiting.rate_limiter import RateLimiter
+from covid.rate_limiting.stores import LocalBucketStore
+from tests.conftest import TEST_DATA_PATH
 
 
 def test_register(client):
@@ -48,6 +63,40 @@ def test_login(client, auth):
         assert session['username'] == 'thorke'
 
 
+def test_login_hashes_passwords_on_the_hashing_pool(client, auth):
+    auth.login()
+
+    client.application.config['METRICS_TOKEN'] = 'metrics-token'
+    metrics = client.get('/api/metrics/password-hashing', headers={'Authorization': 'Bearer metrics-token'}).json
+    assert metrics['enabled'] is True
+    assert metrics['completed'] == 1
+    assert metrics['hash_time_max'] > 0
+
+
+def test_metrics_require_the_metrics_token(client):
+    assert client.get('/api/metrics/password-hashing').status_code == 403
+
+    client.application.config['METRICS_TOKEN'] = 'metrics-token'
+    assert client.get('/api/metrics/password-hashing').status_code == 403
+    assert client.get('/api/metrics/comment-moderation', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get(
+        '/api/metrics/comment-moderation', headers={'Authorization': 'Bearer metrics-token'}).status_code == 200
+
+
+def test_login_attempts_are_rate_limited(client, auth):
+    rate_limiter.rate_limiter_instance = RateLimiter(LocalBucketStore(), burst=2, per_minute=1)
+
+    assert auth.login(password='wrong').status_code == 200
+    assert auth.login(password='wrong').status_code == 200
+
+    response = auth.login()
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+
+    # Reading the login page isn't limited.
+    assert client.get('/authentication/login').status_code == 200
+
+
 def test_logout(client, auth):
     # Login a user.
     auth.login()
@@ -142,3 +191,276 @@ def test_articles_with_tag(client):
     assert b'Articles tagged by Health' in response.data
     assert b'Coronavirus: First case of virus in New Zealand' in response.data
     assert b'Covid 19 coronavirus: US deaths double in two days, Trump says quarantine not necessary' in response.data
+
+
+def test_logged_in_articles_with_tag_are_streamed(client, auth):
+    auth.login()
+
+    # Pages for logged-in users aren't cached, so the listing is sent while it's rendered.
+    response = client.get('/articles_by_tag?tag=Health')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert b'Articles tagged by Health' in response.data
+    assert b'Coronavirus: First case of virus in New Zealand' in response.data
+
+
+def test_articles_include_related_articles(client):
+    # Check that the sidebar recommends articles related to the article whose comments are shown.
+    response = client.get('/articles_by_date?date=2020-02-28&view_comments_for=1')
+    assert response.status_code == 200
+    assert b'Related articles' in response.data
+
+
+def test_most_discussed(client):
+    # Check that we can retrieve the most discussed articles page.
+    response = client.get('/most_discussed')
+    assert response.status_code == 200
+
+    # Check that the only commented article is listed.
+    assert b'Most discussed articles' in response.data
+    assert b'Coronavirus: First case of virus in New Zealand' in response.data
+
+
+def test_user_comments(client):
+    # Check that we can retrieve a user's comment history.
+    response = client.get('/user_comments?username=fmercury')
+    assert response.status_code == 200
+    assert b'Comments by fmercury' in response.data
+    assert b'Oh no, COVID-19 has hit New Zealand' in response.data
+    assert b'Yeah Freddie, bad news' not in response.data
+
+
+@pytest.mark.parametrize('url', (
+        '/articles_by_date?date=2020-02-28&view_comments_for=1&comments_cursor=nonsense',
+        '/articles_by_tag?tag=Health&view_comments_for=1&comments_cursor=2020-02-28,x',
+        '/most_discussed?view_comments_for=1&comments_cursor=yesterday,1',
+        '/user_comments?username=fmercury&cursor=nonsense'))
+def test_malformed_cursors_are_rejected(client, url):
+    response = client.get(url)
+    assert response.status_code == 400
+
+
+def test_articles_with_more_comments(client, auth):
+    # Login a user and add enough comments to spill onto a second page, more than the rate limit would allow.
+    rate_limiter.rate_limiter_instance = None
+    auth.login()
+    for index in range(20):
+        client.post('/comment', data={'comment': f'Comment number {index}', 'article_id': 1})
+
+    response = client.get('/articles_by_date?date=2020-02-28&view_comments_for=1')
+    assert b'22 comments' in response.data
+    assert b'Comment number 17' in response.data
+    assert b'Comment number 18' not in response.data
+    assert b'More comments' in response.data
+
+
+def test_moderated_comments_are_published_in_the_background():
+    app = create_app({
+        'TESTING': True,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'TEST_DATA_PATH': TEST_DATA_PATH,
+        'WTF_CSRF_ENABLED': False,
+        'COMMENT_MODERATION': True,
+        'MODERATION_BATCH_WINDOW': 0.01
+    })
+    client = app.test_client()
+    client.post('authentication/login', data={'username': 'thorke', 'password': 'cLQ^C#oFXloS'})
+
+    # Profane comments are still turned away by the form, so the user knows they won't be published.
+    response = client.post('/comment', data={'comment': 'This is sh1t news', 'article_id': 2})
+    assert response.status_code == 200
+    assert b'Your comment must not contain profanity' in response.data
+    response = client.post('/comment', data={'comment': 'Moderated comment', 'article_id': 2})
+    assert response.headers['Location'] == 'http://localhost/articles_by_date?date=2020-02-29&view_comments_for=2'
+
+    moderation.moderation_queue_instance.drain()
+    response = client.get('/articles_by_date?date=2020-02-29&view_comments_for=2')
+    assert b'Moderated comment' in response.data
+    assert b'sh1t' not in response.data
+    app.config['METRICS_TOKEN'] = 'metrics-token'
+    metrics = client.get('/api/metrics/comment-moderation', headers={'Authorization': 'Bearer metrics-token'}).json
+    assert metrics['submitted'] == 1
+    assert metrics['approved'] == 1
+
+    moderation.moderation_queue_instance.stop()
+    moderation.moderation_queue_instance = None
+
+
+def test_articles_support_conditional_get(client):
+    response = client.get('/articles_by_date?date=2020-02-29')
+    etag = response.headers['ETag']
+    assert response.headers['Last-Modified'] is not None
+
+    # Check that a revalidation request with a matching ETag is answered with 304 Not Modified.
+    response = client.get('/articles_by_date?date=2020-02-29', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_adding_a_comment_invalidates_cached_articles(client, auth):
+    response = client.get('/articles_by_date?date=2020-02-29')
+    etag = response.headers['ETag']
+
+    auth.login()
+    client.post('/comment', data={'comment': 'Who needs quarantine?', 'article_id': 2})
+    client.get('/authentication/logout')
+
+    # Check that the cached page has been replaced by one showing the new comment count.
+    response = client.get('/articles_by_date?date=2020-02-29', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'1 comments' in response.data
+
+
+def test_templates_are_compiled_into_bytecode_cache(tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'jinja'
+
+    def make_app(precompile):
+        return create_app({
+            'TESTING': True,
+            'REPOSITORY': 'memory',
+            'TEST_DATA_PATH': TEST_DATA_PATH,
+            'WTF_CSRF_ENABLED': False,
+            'JINJA_BYTECODE_CACHE_DIR': str(cache_dir),
+            'JINJA_PRECOMPILE_TEMPLATES': precompile
+        })
+    app = make_app(True)
+
+    # Every template has been compiled and written to the cache directory when the app is created.
+    template_names = app.jinja_env.list_templates(extensions=['html'])
+    assert len(list(cache_dir.iterdir())) == len(template_names)
+
+    # Another instance loads every template from the cache without compiling any of them.
+    app = make_app(False)
+
+    def compile(*args, **kwargs):
+        raise AssertionError('Template compiled despite the bytecode cache')
+    monkeypatch.setattr(app.jinja_env, 'compile', compile)
+    for template_name in template_names:
+        app.jinja_env.get_template(template_name)
+
+
+def test_build_url_matches_url_for(client):
+    with client.application.test_request_context():
+        for tag_name in ('New Zealand', 'a/b:c&d=e', 'Māori', '{braces}'):
+            assert build_url('news_bp.articles_by_tag', tag=tag_name, cursor=3, view_comments_for=7) == url_for(
+                'news_bp.articles_by_tag', tag=tag_name, cursor=3, view_comments_for=7)
+        assert build_url('news_bp.comment_on_article', article=12) == url_for('news_bp.comment_on_article', article=12)
+
+
+def test_api_returns_pages_of_articles(client):
+    response = client.get('/api/articles?limit=4')
+    assert response.status_code == 200
+    assert [article['id'] for article in response.json['articles']] == [1, 2, 3, 4]
+    assert response.json['articles'][0]['date'] == '2020-02-28'
+
+    response = client.get('/api/articles?limit=4&cursor=' + response.json['next_cursor'])
+    assert [article['id'] for article in response.json['articles']] == [5, 6]
+    assert response.json['next_cursor'] is None
+
+
+def test_api_reports_unknown_article(client):
+    response = client.get('/api/articles/999')
+    assert response.status_code == 404
+    assert 'error' in response.json
+
+
+def test_api_returns_comments_for_user(client):
+    response = client.get('/api/users/fmercury/comments')
+    assert response.status_code == 200
+    assert response.json['comments'][0]['comment_text'] == 'Oh no, COVID-19 has hit New Zealand'
+
+
+def test_api_exports_comments_as_ndjson(client):
+    response = client.get('/api/export/comments.ndjson')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+
+    comments = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [comment['comment_text'] for comment in comments] == [
+        'Oh no, COVID-19 has hit New Zealand', 'Yeah Freddie, bad news']
+
+
+def test_api_exports_articles_with_tag_names(client):
+    response = client.get('/api/export/articles.ndjson')
+    assert response.status_code == 200
+
+    articles = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [article['id'] for article in articles] == [1, 2, 3, 4, 5, 6]
+    assert articles[0]['tags'] == [{'name': 'New Zealand'}, {'name': 'Health'}]
+
+
+def test_pages_are_compressed_for_clients_that_accept_gzip(client):
+    response = client.get('/articles_by_tag?tag=Health', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.status_code == 200
+    assert response.content_encoding == 'gzip'
+    assert 'Accept-Encoding' in response.vary
+    assert b'Articles tagged by Health' in gzip.decompress(response.data)
+
+    # Check that the compressed page can be revalidated.
+    response = client.get('/articles_by_tag?tag=Health', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_streamed_pages_are_compressed(client, auth):
+    auth.login()
+
+    response = client.get('/articles_by_tag?tag=Health', headers={'Accept-Encoding': 'gzip'})
+    assert response.content_encoding == 'gzip'
+    assert b'Articles tagged by Health' in gzip.decompress(response.data)
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/api/tags', headers={'Accept-Encoding': 'gzip'})
+    assert response.content_encoding is None
+    assert response.json['tags'] == ['New Zealand', 'Health', 'World', 'Politics']
+
+def test_built_static_files_are_served_with_far_future_caching(client, tmp_path):
+    app = client.application
+    app.static_folder = str(tmp_path / 'static')
+    shutil.copytree(os.path.join(os.path.dirname(__file__), '..', '..', 'covid', 'static'), app.static_folder,
+                    ignore=shutil.ignore_patterns('dist'))
+    app.extensions['static_manifest'] = build_static_assets(app.static_folder, os.path.join(app.static_folder, 'dist'))
+
+    with app.test_request_context():
+        css_url = url_for('static', filename='css/main.css')
+    assert css_url == '/static/dist/' + app.extensions['static_manifest']['css/main.css']
+
+    response = client.get(css_url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.content_encoding == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert response.cache_control.max_age == 365 * 24 * 60 * 60
+    assert 'immutable' in response.headers['Cache-Control']
+
+    response = client.get(css_url)
+    assert response.content_encoding is None
+    assert b'body' in response.data
+
+
+def test_memory_repository_restores_logged_users_and_comments_on_restart(tmp_path):
+    def start():
+        return create_app({
+            'TESTING': True,
+            'REPOSITORY': 'memory',
+            'TEST_DATA_PATH': TEST_DATA_PATH,
+            'WTF_CSRF_ENABLED': False,
+            'RATE_LIMIT_PER_MINUTE': 0,
+            'MEMORY_WAL_DIR': str(tmp_path)
+        }).test_client()
+
+    client = start()
+    client.post('/authentication/register', data={'username': 'gmichael', 'password': 'CarelessWhisper1984'})
+    client.post('authentication/login', data={'username': 'gmichael', 'password': 'CarelessWhisper1984'})
+    client.post('/comment', data={'comment': 'Logged before the restart', 'article_id': 2})
+
+    # The log of the first application is closed when the second one is created.
+    client = start()
+    response = client.post('authentication/login', data={'username': 'gmichael', 'password': 'CarelessWhisper1984'})
+    assert response.headers['Location'] == 'http://localhost/'
+    response = client.get('/articles_by_date?date=2020-02-29&view_comments_for=2')
+    assert b'Logged before the restart' in response.data
+
+    write_ahead_log.write_ahead_log_instance.close()
+    write_ahead_log.write_ahead_log_instance = None
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import sqlite3
+from datetime import date
+
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import clear_mappers
+
+from covid.adapters import database_repository, memory_repository
+from covid.adapters.async_repository import AsyncMemoryRepository
+from covid.adapters.async_sqlite import AsyncSqliteConnection, AsyncSqlitePool, AsyncSqliteRepository
+from covid.adapters.memory_repository import MemoryRepository
+from covid.adapters.orm import metadata
+from covid.api.asgi import AsyncApi
+import covid.news.async_services as news_services
+import covid.utilities.async_services as utilities_services
+from tests.conftest import TEST_DATA_PATH
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def async_repo(request, tmp_path):
+    # The memory repository relies on plain domain objects, so drop any mappers left behind by other tests.
+    clear_mappers()
+    if request.param == 'memory':
+        repo = MemoryRepository()
+        memory_repository.populate(TEST_DATA_PATH, repo)
+        yield AsyncMemoryRepository(repo)
+    else:
+        database = str(tmp_path / 'covid-19.db')
+        engine = create_engine('sqlite:///' + database)
+        metadata.create_all(engine)
+        database_repository.populate(engine, TEST_DATA_PATH)
+        engine.dispose()
+
+        pool = AsyncSqlitePool(database, size=2)
+        yield AsyncSqliteRepository(pool)
+        pool.close()
+
+
+def test_async_sqlite_statements_fail_if_the_database_cannot_be_opened(tmp_path):
+    connection = AsyncSqliteConnection(str(tmp_path / 'missing.db'))
+    try:
+        for _ in range(2):
+            with pytest.raises(sqlite3.OperationalError):
+                asyncio.run(asyncio.wait_for(connection.fetchone('SELECT 1'), 5))
+    finally:
+        connection.close()
+
+
+def test_async_sqlite_opens_a_database_whose_path_has_uri_characters(tmp_path):
+    database = str(tmp_path / 'covid?19#.db')
+    sqlite3.connect(database).close()
+
+    connection = AsyncSqliteConnection(database)
+    try:
+        assert asyncio.run(connection.fetchone('SELECT 1')) == (1,)
+    finally:
+        connection.close()
+
+
+def test_async_repository_returns_articles(async_repo):
+    article = asyncio.run(news_services.get_article(1, async_repo))
+    assert article['title'] == 'Coronavirus: First case of virus in New Zealand'
+    assert article['comment_count'] == 2
+    assert [tag['name'] for tag in article['tags']] == ['New Zealand', 'Health']
+    assert article['tags'][1]['tagged_articles'] == [1, 2]
+
+    with pytest.raises(news_services.NonExistentArticleException):
+        asyncio.run(news_services.get_article(99, async_repo))
+
+
+def test_async_repository_returns_articles_by_date(async_repo):
+    articles, previous_date, next_date = asyncio.run(news_services.get_articles_by_date(date(2020, 2, 29), async_repo))
+    assert [article['id'] for article in articles] == [2]
+    assert previous_date == date(2020, 2, 28)
+    assert next_date == date(2020, 3, 1)
+
+
+def test_async_repository_returns_tags(async_repo):
+    assert asyncio.run(utilities_services.get_tag_names(async_repo)) == ['New Zealand', 'Health', 'World', 'Politics']
+    assert asyncio.run(news_services.get_article_ids_for_tag('Health', async_repo)) == [1, 2]
+
+
+def test_async_repository_returns_pages_of_comments(async_repo):
+    comments, cursor = asyncio.run(news_services.get_comment_page_for_article(1, 1, None, async_repo))
+    assert [comment['comment_text'] for comment in comments] == ['Oh no, COVID-19 has hit New Zealand']
+
+    comments, cursor = asyncio.run(news_services.get_comment_page_for_article(1, 1, cursor, async_repo))
+    assert [comment['comment_text'] for comment in comments] == ['Yeah Freddie, bad news']
+    assert cursor is None
+
+
+def call_asgi(app, path, query_string=b''):
+    messages = list()
+
+    async def send(message):
+        messages.append(message)
+
+    async def receive():
+        return {'type': 'http.request'}
+
+    asyncio.run(app({'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string}, receive, send))
+    return messages[0]['status'], json.loads(messages[1]['body'])
+
+
+def test_async_api_serves_concurrent_requests(async_repo):
+    app = AsyncApi(async_repo)
+
+    async def fetch_all():
+        responses = list()
+
+        async def fetch(article_id):
+            async def send(message):
+                responses.append(message)
+
+            async def receive():
+                return {'type': 'http.request'}
+
+            await app({'type': 'http', 'method': 'GET', 'path': f'/api/articles/{article_id}'}, receive, send)
+
+        await asyncio.gather(*(fetch(article_id) for article_id in [1, 2, 3, 4, 5, 6] * 10))
+        return responses
+
+    responses = asyncio.run(fetch_all())
+    assert sorted(json.loads(message['body'])['id'] for message in responses if message['type'] == 'http.response.body') \
+        == sorted([1, 2, 3, 4, 5, 6] * 10)
+
+    status, body = call_asgi(app, '/api/articles_by_date', b'date=2020-02-29')
+    assert status == 200
+    assert body['first_date'] == '2020-02-28' and body['next_date'] == '2020-03-01'
+
+    status, body = call_asgi(app, '/api/articles/99')
+    assert status == 404
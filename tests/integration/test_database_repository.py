@@ -2,8 +2,10 @@ from datetime import date, datetime
 
 import pytest
 
-from covid.adapters.database_repository import SqlAlchemyRepository
-from covid.domain.model import User, Article, Tag, Comment, make_comment
+from sqlalchemy import create_engine, event, inspect
+
+from covid.adapters.database_repository import SqlAlchemyRepository, upgrade
+from covid.domain.model import User, Article, Tag, Comment, make_comment, make_tag_association
 from covid.adapters.repository import RepositoryException
 
 
@@ -238,6 +240,23 @@ def test_repository_can_add_a_comment(session):
     assert comment in repo.get_comments()
 
 
+def test_repository_counts_several_comments_on_an_article_in_one_commit(session):
+    repo = SqlAlchemyRepository(session)
+
+    user = repo.get_user('thorke')
+    article = repo.get_article(2)
+    comment_count = article.comment_count
+
+    for comment_text in ('First', 'Second', 'Third'):
+        repo.add_comment(make_comment(comment_text, user, article))
+
+    # The count reads back as a number before the commit, too.
+    assert article.comment_count == comment_count + 3
+    session.commit()
+
+    assert repo.get_article(2).comment_count == comment_count + 3
+
+
 def test_repository_does_not_add_a_comment_without_a_user(session):
     repo = SqlAlchemyRepository(session)
 
@@ -255,3 +274,200 @@ def test_repository_can_retrieve_comments(session):
 
 
 
+
+
+def test_repository_returns_related_article_ids(session):
+    repo = SqlAlchemyRepository(session)
+
+    # Article 2 shares 'World' with articles 5 and 6, and 'Health' with article 1. Ties go to the newest article.
+    assert repo.get_related_article_ids(2, 3) == [6, 5, 1]
+
+
+def test_repository_returns_most_commented_article_ids(session):
+    repo = SqlAlchemyRepository(session)
+
+    user = repo.get_user('thorke')
+    for article_id in (2, 5, 5, 5):
+        article = repo.get_article(article_id)
+        repo.add_comment(make_comment("Trump's onto it!", user, article))
+    session.commit()
+
+    # Articles with equal comment counts are ordered by decreasing id.
+    assert repo.get_most_commented_article_ids(3) == [(5, 3), (1, 2), (2, 1)]
+    assert repo.get_article(5).comment_count == 3
+
+
+def test_repository_returns_pages_of_comments_for_user(session):
+    repo = SqlAlchemyRepository(session)
+
+    user = repo.get_user('thorke')
+    article = repo.get_article(2)
+    timestamp = datetime.fromisoformat('2020-03-01 09:00:00')
+    for comment_text in ('First', 'Second', 'Third'):
+        # All three comments share a timestamp, so the page boundary must fall between them.
+        repo.add_comment(make_comment(comment_text, user, article, timestamp))
+    session.commit()
+
+    comments, cursor = repo.get_comments_for_user('thorke', 2)
+    assert [comment.comment for comment in comments] == ['Third', 'Second']
+    assert cursor is not None
+
+    comments, cursor = repo.get_comments_for_user('thorke', 2, cursor)
+    assert [comment.comment for comment in comments] == ['First', 'Yeah Freddie, bad news']
+    assert cursor is None
+
+
+def test_repository_returns_pages_of_comments_for_article(session):
+    repo = SqlAlchemyRepository(session)
+
+    comments, cursor = repo.get_comments_for_article(1, 1)
+    assert [comment.comment for comment in comments] == ['Oh no, COVID-19 has hit New Zealand']
+
+    comments, cursor = repo.get_comments_for_article(1, 1, cursor)
+    assert [comment.comment for comment in comments] == ['Yeah Freddie, bad news']
+    assert cursor is None
+
+
+def test_repository_iterates_over_comments_in_batches(session):
+    repo = SqlAlchemyRepository(session)
+
+    user = repo.get_user('thorke')
+    article = repo.get_article(1)
+    for index in range(5):
+        repo.add_comment(make_comment(f'Comment {index}', user, article, datetime(2020, 3, 1, 9, index)))
+    session.commit()
+
+    comments = repo.iter_comments(1, batch_size=2)
+    assert next(comments).comment == 'Oh no, COVID-19 has hit New Zealand'
+    assert len(list(comments)) == 6
+    assert len(list(repo.iter_comments(batch_size=3))) == 7
+
+
+def test_repository_returns_pages_of_articles(session):
+    repo = SqlAlchemyRepository(session)
+
+    articles, cursor = repo.get_article_page(4)
+    assert [article.id for article in articles] == [1, 2, 3, 4]
+
+    articles, cursor = repo.get_article_page(4, cursor)
+    assert [article.id for article in articles] == [5, 6]
+    assert cursor is None
+
+
+def test_repository_iterates_over_articles_in_batches(session):
+    repo = SqlAlchemyRepository(session)
+
+    assert [article.id for article in repo.iter_articles(batch_size=4)] == [1, 2, 3, 4, 5, 6]
+
+
+def count_statements(session):
+    statements = list()
+    event.listen(session.bind, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_repository_loads_the_tags_of_a_batch_of_articles_together(session):
+    repo = SqlAlchemyRepository(session)
+    statements = count_statements(session)
+
+    tag_names = [[tag.tag_name for tag in article.tags] for article in repo.iter_articles(batch_size=4)]
+
+    assert tag_names[0] == ['New Zealand', 'Health']
+    # Two batches, plus the query that ends the iteration, each batch with one query for its Articles' Tags.
+    assert len(statements) == 5
+
+
+def test_repository_loads_the_users_and_articles_of_comments_with_them(session):
+    repo = SqlAlchemyRepository(session)
+    statements = count_statements(session)
+
+    comments = [(comment.user.username, comment.article.id) for comment in repo.iter_comments()]
+
+    assert comments == [('fmercury', 1), ('thorke', 1)]
+    assert len(statements) == 1
+
+
+def test_repository_can_add_comments_in_bulk(session):
+    repo = SqlAlchemyRepository(session)
+
+    user = repo.get_user('thorke')
+    article = repo.get_article(2)
+    comment_count = article.comment_count
+
+    repo.add_comments([make_comment(comment_text, user, article) for comment_text in ('First', 'Second')])
+    session.commit()
+
+    assert repo.get_article(2).comment_count == comment_count + 2
+    assert len(repo.get_comments()) == 4
+
+
+def test_repository_can_add_new_articles_tags_and_comments_in_bulk(session):
+    repo = SqlAlchemyRepository(session)
+
+    user = User('Dave', '123456789')
+    article = Article(date.fromisoformat('2020-03-16'), 'Title', 'First para', 'https://link', 'https://image.jpg', 7)
+    tag = Tag('Science')
+    make_tag_association(article, tag)
+    comments = [make_comment('First', user, article), make_comment('Second', user, article)]
+
+    repo.add_users([user])
+    repo.add_articles([article])
+    repo.add_tags([tag])
+    repo.add_comments(comments)
+    session.commit()
+
+    assert repo.get_article(7).title == 'Title'
+    assert repo.get_article_ids_for_tag('Science') == [7]
+    assert repo.get_article(7).comment_count == 2
+    page, _ = repo.get_comments_for_user('Dave', 5)
+    assert [comment.comment for comment in page] == ['Second', 'First']
+
+
+def test_repository_does_not_add_comments_in_bulk_for_unknown_users(session):
+    repo = SqlAlchemyRepository(session)
+
+    article = Article(date.fromisoformat('2020-03-16'), 'Title', 'First para', 'https://link', 'https://image.jpg', 7)
+    repo.add_articles([article])
+
+    with pytest.raises(RepositoryException):
+        repo.add_comments([make_comment('Hello', User('Nobody', '123456789'), article)])
+
+
+def test_upgrade_adds_comment_counts_and_indexes_to_an_earlier_database():
+    # The articles and comments tables as created before comment counts were kept.
+    engine = create_engine('sqlite://')
+    engine.execute(
+        'CREATE TABLE articles (id INTEGER NOT NULL, date DATE NOT NULL, title VARCHAR(255) NOT NULL, '
+        'first_para VARCHAR(1024) NOT NULL, hyperlink VARCHAR(255) NOT NULL, image_hyperlink VARCHAR(255) NOT NULL, '
+        'PRIMARY KEY (id))')
+    engine.execute(
+        'CREATE TABLE comments (id INTEGER NOT NULL, user_id INTEGER, article_id INTEGER, '
+        'comment VARCHAR(1024) NOT NULL, timestamp DATETIME NOT NULL, PRIMARY KEY (id))')
+    for article_id in (1, 2):
+        engine.execute(f"INSERT INTO articles VALUES ({article_id}, '2020-03-01', 'Title', 'Para', 'link', 'image')")
+    for comment_id in (1, 2):
+        engine.execute(f"INSERT INTO comments VALUES ({comment_id}, 1, 2, 'Hello', '2020-03-01 09:00:00')")
+
+    upgrade(engine)
+    upgrade(engine)
+
+    counts = engine.execute('SELECT id, comment_count FROM articles ORDER BY id').fetchall()
+    assert [tuple(row) for row in counts] == [(1, 0), (2, 2)]
+    assert [index['name'] for index in inspect(engine).get_indexes('articles')] == ['ix_articles_comment_count']
+    assert sorted(index['name'] for index in inspect(engine).get_indexes('comments')) == [
+        'ix_comments_article_id_timestamp', 'ix_comments_user_id_timestamp']
+
+
+def test_repository_adds_a_comment_without_loading_the_comments_of_its_user_and_article(session):
+    repo = SqlAlchemyRepository(session)
+    user = repo.get_user('thorke')
+    article = repo.get_article(1)
+    statements = count_statements(session)
+
+    comment = Comment(user, article, 'Hello', datetime(2020, 3, 1, 9))
+    repo.add_comment(comment)
+    session.commit()
+
+    assert not any(statement.startswith('SELECT') for statement in statements)
+    assert comment in article.comments
+    assert comment in user.comments
@@ -1,10 +1,19 @@
 import pytest
 
-from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, clear_mappers
+from sqlalchemy.pool import NullPool, StaticPool
 
 from covid.domain.model import Article
-from covid.adapters import unit_of_work
+from covid.adapters import unit_of_work, database_repository
+from covid.adapters.orm import metadata, map_model_to_tables
 from covid.domain import model
+import covid.news.services as news_services
+import covid.utilities.fan_out as fan_out
+from tests.conftest import TEST_DATA_PATH
 
 
 def make_article(new_article_date):
@@ -84,3 +93,171 @@ def test_uow_rolls_back_on_error(session_factory):
 
 
 
+
+
+def test_uow_counts_committed_comments_towards_trending_articles(session_factory):
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory)
+    with uow:
+        assert uow.repo.get_trending_article_ids(3) == [(1, 2 / 24)]
+
+        article = uow.repo.get_article(2)
+        author = uow.repo.get_user('thorke')
+        comment = model.make_comment('First death in Australia', author, article, datetime(2020, 2, 28, 15, 0))
+        uow.repo.add_comment(comment)
+
+        # The comment doesn't count until it has been committed.
+        assert uow.repo.get_trending_article_ids(3) == [(1, 2 / 24)]
+        uow.commit()
+
+    with uow:
+        assert uow.repo.get_trending_article_ids(3) == [(1, 2 / 24), (2, 1 / 24)]
+
+
+def test_uow_does_not_count_rolled_back_comments_towards_trending_articles(session_factory):
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory)
+    with uow:
+        uow.repo.get_trending_article_ids(3)
+
+        article = uow.repo.get_article(2)
+        author = uow.repo.get_user('thorke')
+        comment = model.make_comment('First death in Australia', author, article, datetime(2020, 2, 28, 15, 0))
+        uow.repo.add_comment(comment)
+
+    with uow:
+        assert uow.repo.get_trending_article_ids(3) == [(1, 2 / 24)]
+
+
+def add_tagged_article(uow, tag_name):
+    tag = next(tag for tag in uow.repo.get_tags() if tag.tag_name == tag_name)
+    article = Article(date(2020, 3, 20), 'New', 'First para', 'https://link', 'https://image.jpg', 7)
+    model.make_tag_association(article, tag)
+    uow.repo.add_article(article)
+
+
+def test_uow_adds_committed_tags_to_the_related_articles_index(session_factory):
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory)
+    with uow:
+        assert uow.repo.get_related_article_ids(2, 3) == [6, 5, 1]
+        add_tagged_article(uow, 'Health')
+
+        # The Article's Tags don't count until they have been committed.
+        assert uow.repo.get_related_article_ids(2, 3) == [6, 5, 1]
+        uow.commit()
+
+    with uow:
+        assert uow.repo.get_related_article_ids(2, 3) == [7, 6, 5]
+
+
+def test_uow_does_not_add_rolled_back_tags_to_the_related_articles_index(session_factory):
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory)
+    with uow:
+        uow.repo.get_related_article_ids(2, 3)
+        add_tagged_article(uow, 'Health')
+
+    with uow:
+        assert uow.repo.get_related_article_ids(2, 3) == [6, 5, 1]
+        assert uow.repo.get_related_article_ids(7, 3) == []
+
+
+@pytest.fixture
+def file_database(tmp_path):
+    # A file-based database, as create_app() sets up, which each fan-out task reads through a connection of its own.
+    clear_mappers()
+    engine = create_engine(
+        'sqlite:///' + str(tmp_path / 'covid-19.db'), connect_args={'check_same_thread': False}, poolclass=NullPool)
+    metadata.create_all(engine)
+    database_repository.populate(engine, TEST_DATA_PATH)
+    map_model_to_tables()
+    yield engine
+    clear_mappers()
+
+
+def test_fan_out_runs_service_calls_on_separate_sessions(file_database, monkeypatch):
+    uow = unit_of_work.SqlAlchemyUnitOfWork(sessionmaker(bind=file_database))
+    sessions = list()
+
+    def recording_session(function):
+        # Records the session the call's unit of work used, before the task closes it.
+        def call(*args):
+            result = function(*args)
+            sessions.append(args[-1].session())
+            return result
+        return call
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        monkeypatch.setattr(fan_out, 'executor', executor)
+        first_article, (articles, _, _), last_article = fan_out.fan_out(
+            uow, (recording_session(news_services.get_first_article),),
+            (recording_session(news_services.get_articles_by_date), date(2020, 2, 29)),
+            (recording_session(news_services.get_last_article),))
+
+    # Check that the results come back in the order of the calls.
+    assert first_article['id'] == 1
+    assert [article['id'] for article in articles] == [2]
+    assert last_article['id'] == 6
+
+    # Check that each task used a session of its own, and a unit of work sharing the indexes of the original.
+    assert uow.session is None
+    assert len(sessions) == 3
+    assert len(set(map(id, sessions))) == 3
+    assert uow.for_task().trending is uow.trending
+
+
+def test_fan_out_does_not_share_the_connection_of_an_in_memory_database_between_threads():
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+
+    assert not unit_of_work.SqlAlchemyUnitOfWork(sessionmaker(bind=engine)).concurrent_reads
+
+
+def test_fan_out_runs_calls_in_order_without_a_thread_pool(in_memory_uow):
+    first_article, last_article = fan_out.fan_out(
+        in_memory_uow, (news_services.get_first_article,), (news_services.get_last_article,))
+    assert first_article['id'] == 1
+    assert last_article['id'] == 6
+
+
+def test_in_memory_uow_stores_writes_only_when_committed(in_memory_uow):
+    user = model.User('Dave', '123456789')
+    with in_memory_uow:
+        in_memory_uow.repo.add_user(user)
+
+        # Other threads, and reads through the repository, don't see the write until it's committed.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(in_memory_uow.repo.get_user, 'Dave').result() is None
+        assert in_memory_uow.repo.get_user('Dave') is None
+
+        in_memory_uow.commit()
+        assert in_memory_uow.repo.get_user('Dave') is user
+
+
+def test_in_memory_uow_rolls_back_uncommitted_writes(in_memory_uow):
+    with in_memory_uow:
+        user = in_memory_uow.repo.get_user('thorke')
+        article = in_memory_uow.repo.get_article(1)
+        comment = model.Comment(user, article, 'Rolled back', datetime(2020, 3, 1, 9))
+        in_memory_uow.repo.add_comment(comment)
+        in_memory_uow.repo.add_user(model.User('Dave', '123456789'))
+
+        # The shared Article and User aren't linked to the Comment before it's committed.
+        assert comment not in article.comments
+        assert article.comment_count == 2
+
+    assert in_memory_uow.repo.get_user('Dave') is None
+    assert len(in_memory_uow.repo.get_comments()) == 2
+    assert comment not in article.comments
+    assert comment not in user.comments
+    assert article.comment_count == 2
+    assert in_memory_uow.repo.get_most_commented_article_ids(1) == [(1, 2)]
+
+
+def test_in_memory_uow_links_a_comment_to_its_article_and_user_when_committed(in_memory_uow):
+    with in_memory_uow:
+        user = in_memory_uow.repo.get_user('thorke')
+        article = in_memory_uow.repo.get_article(1)
+        comment = model.Comment(user, article, 'Committed', datetime(2020, 3, 1, 9))
+        in_memory_uow.repo.add_comment(comment)
+        in_memory_uow.commit()
+
+    assert article.comments[-1] is comment
+    assert user.comments[-1] is comment
+    assert article.comment_count == 3
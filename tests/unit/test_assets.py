@@ -0,0 +1,46 @@
+import gzip
+import os
+import shutil
+
+from covid.assets.build import build_static_assets, load_manifest
+from covid.assets.compression import compress
+
+
+def copy_static_files(tmp_path):
+    static_folder = str(tmp_path / 'static')
+    shutil.copytree(os.path.join(os.path.dirname(__file__), '..', '..', 'covid', 'static'), static_folder,
+                    ignore=shutil.ignore_patterns('dist'))
+    return static_folder
+
+
+def test_compress_is_deterministic():
+    data = b'<p>Coronavirus: First case of virus in New Zealand</p>' * 20
+    compressed = compress(data, 'gzip', 6)
+
+    assert gzip.decompress(compressed) == data
+    assert compress(data, 'gzip', 6) == compressed
+
+
+def test_build_writes_hashed_and_precompressed_files(tmp_path):
+    static_folder = copy_static_files(tmp_path)
+    output_folder = os.path.join(static_folder, 'dist')
+
+    manifest = build_static_assets(static_folder, output_folder)
+
+    # Check that every file was copied under a name that includes its content hash.
+    hashed_css = manifest['css/main.css']
+    assert hashed_css.startswith('css/main.') and hashed_css.endswith('.css') and hashed_css != 'css/main.css'
+    with open(os.path.join(output_folder, hashed_css), 'rb') as hashed_file, \
+            open(os.path.join(static_folder, 'css', 'main.css'), 'rb') as original_file:
+        original = original_file.read()
+        assert hashed_file.read() == original
+
+    # Check that text files were precompressed, but images that are already compressed were not.
+    with open(os.path.join(output_folder, hashed_css + '.gz'), 'rb') as compressed_file:
+        assert gzip.decompress(compressed_file.read()) == original
+    assert not os.path.exists(os.path.join(output_folder, manifest['covid-19.png'] + '.gz'))
+
+    # Check that rebuilding doesn't pick up the previous build's output.
+    assert build_static_assets(static_folder, output_folder) == manifest
+    assert load_manifest(output_folder) == manifest
+
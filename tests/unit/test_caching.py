@@ -0,0 +1,216 @@
+import time
+from datetime import datetime
+from threading import Event, Thread
+
+from flask import Flask
+from jinja2 import Environment
+
+import covid.caching.response_cache as response_cache
+from covid.caching.data_version import DataVersion, data_version
+from covid.caching.response_cache import ResponseCache, CachedPage, cached_page
+from covid.caching.single_flight import SingleFlight
+from covid.caching.fragment_cache import FragmentCacheExtension
+from covid.utilities.utilities import Lazy
+
+
+def make_page(body, version):
+    return CachedPage(body, 'text/html', version, datetime(2020, 3, 1))
+
+
+def test_data_version_bumps():
+    version = DataVersion()
+    number, _ = version.current()
+
+    version.bump()
+
+    assert version.number == number + 1
+
+
+def test_data_version_moves_on_once_it_is_max_age_old():
+    version = DataVersion(max_age=0.05)
+    number = version.number
+    assert version.number == number
+
+    time.sleep(0.06)
+
+    assert version.number == number + 1
+    assert version.number == number + 1
+
+
+def test_response_cache_returns_page_for_current_version():
+    cache = ResponseCache()
+    page = make_page(b'<html></html>', 1)
+    cache.put(('news_bp.articles_by_date', ()), page)
+
+    assert cache.get(('news_bp.articles_by_date', ()), 1) is page
+
+
+def test_response_cache_misses_for_stale_version():
+    cache = ResponseCache()
+    cache.put(('news_bp.articles_by_date', ()), make_page(b'<html></html>', 1))
+
+    assert cache.get(('news_bp.articles_by_date', ()), 2) is None
+
+
+def test_response_cache_evicts_least_recently_used_page():
+    cache = ResponseCache(max_entries=2)
+    cache.put('a', make_page(b'a', 1))
+    cache.put('b', make_page(b'b', 1))
+
+    # Using 'a' makes 'b' the least recently used page.
+    cache.get('a', 1)
+    cache.put('c', make_page(b'c', 1))
+
+    assert cache.get('a', 1) is not None
+    assert cache.get('b', 1) is None
+    assert cache.get('c', 1) is not None
+
+
+def test_cached_pages_with_equal_bodies_have_equal_etags():
+    assert make_page(b'<html></html>', 1).etag == make_page(b'<html></html>', 2).etag
+    assert make_page(b'<html></html>', 1).etag != make_page(b'<html> </html>', 1).etag
+
+
+def test_single_flight_runs_one_computation_for_concurrent_callers():
+    single_flight = SingleFlight()
+    computations = list()
+    leader_started = Event()
+    release_leader = Event()
+
+    def compute():
+        computations.append(1)
+        leader_started.set()
+        release_leader.wait()
+        return 'page'
+
+    results = list()
+    threads = [Thread(target=lambda: results.append(single_flight.do('key', compute))) for _ in range(8)]
+    threads[0].start()
+    leader_started.wait()
+    for thread in threads[1:]:
+        thread.start()
+
+    # Give the followers time to join the in-flight call before the leader finishes.
+    time.sleep(0.1)
+    release_leader.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(computations) == 1
+    assert sorted(results) == [('page', False)] + [('page', True)] * 7
+
+
+def test_concurrent_requests_for_an_expired_page_render_it_once(monkeypatch):
+    renders = list()
+    render_started = Event()
+    release_render = Event()
+
+    app = Flask(__name__)
+
+    @app.route('/page')
+    @cached_page
+    def page():
+        renders.append(1)
+        render_started.set()
+        release_render.wait()
+        return 'rendered page'
+
+    monkeypatch.setattr(response_cache, 'response_cache_instance', ResponseCache())
+    data_version.bump()
+
+    responses = list()
+
+    def fetch():
+        responses.append(app.test_client().get('/page'))
+
+    threads = [Thread(target=fetch) for _ in range(10)]
+    threads[0].start()
+    render_started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.2)
+    release_render.set()
+    for thread in threads:
+        thread.join()
+
+    # Check that 10 concurrent requests caused one render, and that every request received the page.
+    assert len(renders) == 1
+    assert [response.data for response in responses] == [b'rendered page'] * 10
+
+
+def test_requests_receive_stale_page_while_it_is_rebuilt(monkeypatch):
+    render_started = Event()
+    release_render = Event()
+    versions = list()
+
+    app = Flask(__name__)
+
+    @app.route('/page')
+    @cached_page
+    def page():
+        versions.append(data_version.number)
+        if len(versions) > 1:
+            # The second render blocks until the test has made a concurrent request.
+            render_started.set()
+            release_render.wait()
+        return f'version {len(versions)}'
+
+    monkeypatch.setattr(response_cache, 'response_cache_instance', ResponseCache())
+    assert app.test_client().get('/page').data == b'version 1'
+
+    # Invalidate the page, and start rebuilding it.
+    data_version.bump()
+    rebuilt = list()
+    thread = Thread(target=lambda: rebuilt.append(app.test_client().get('/page')))
+    thread.start()
+    render_started.wait()
+
+    # Check that a request made during the rebuild is served the stale page without waiting.
+    assert app.test_client().get('/page').data == b'version 1'
+
+    release_render.set()
+    thread.join()
+    assert rebuilt[0].data == b'version 2'
+
+
+def test_fragment_cache_renders_fragment_once_per_data_version():
+    environment = Environment(extensions=[FragmentCacheExtension])
+    template = environment.from_string("{% cache 'tags' %}{% for tag in tags %}{{ tag }} {% endfor %}{% endcache %}")
+    computations = list()
+
+    def get_tags(tags):
+        computations.append(1)
+        return tags
+
+    data_version.bump()
+    assert template.render(tags=Lazy(get_tags, ['Health', 'World'])) == 'Health World '
+
+    # Check that the cached fragment is served without computing the template value.
+    assert template.render(tags=Lazy(get_tags, ['Politics'])) == 'Health World '
+    assert len(computations) == 1
+
+    # Check that a new data version causes the fragment to be rendered again.
+    data_version.bump()
+    assert template.render(tags=Lazy(get_tags, ['Politics'])) == 'Politics '
+    assert len(computations) == 2
+
+
+def test_fragment_cache_keys_include_extra_expressions():
+    environment = Environment(extensions=[FragmentCacheExtension])
+    template = environment.from_string("{% cache 'related', article_id %}{{ article_id }}{% endcache %}")
+
+    assert template.render(article_id=1) == '1'
+    assert template.render(article_id=2) == '2'
+
+
+def test_fragment_cache_keys_can_include_the_arguments_of_a_lazy_value():
+    environment = Environment(extensions=[FragmentCacheExtension])
+    template = environment.from_string(
+        "{% cache 'picks', picks.args %}{% for pick in picks %}{{ pick }} {% endfor %}{% endcache %}")
+
+    def get_picks(quantity):
+        return list(range(quantity))
+
+    assert template.render(picks=Lazy(get_picks, 2)) == '0 1 '
+    assert template.render(picks=Lazy(get_picks, 4)) == '0 1 2 3 '
+    assert template.render(picks=Lazy(get_picks, 2)) == '0 1 '
@@ -100,3 +100,20 @@ def test_make_tag_associations():
     assert tag.is_applied_to(article)
     assert article in tag.tagged_articles
 
+
+
+def test_make_comment_counts_comments_on_article():
+    user = User('dbowie', '1234567890')
+    article = Article(
+        date.fromisoformat('2020-03-15'),
+        'Coronavirus travel restrictions: Self-isolation deadline pushed back to give airlines breathing room',
+        'The self-isolation deadline has been pushed back',
+        'https://www.nzherald.co.nz/business/news/article.cfm?c_id=3&objectid=12316800',
+        'https://th.bing.com/th/id/OIP.0lCxLKfDnOyswQCF9rcv7AHaCz?w=344&h=132&c=7&o=5&pid=1.7'
+    )
+    assert article.comment_count == 0
+
+    make_comment('Checking in', user, article)
+    make_comment('Checking out', user, article)
+
+    assert article.comment_count == 2
@@ -0,0 +1,59 @@
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from threading import Thread
+
+import pytest
+
+from covid.authentication.hashing import PasswordHasher, PasswordHasherBusyException
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1, queue_size=0, timeout=0.1)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hasher_computes_hashes_on_worker_processes(hasher):
+    password_hash = hasher.run(generate_password_hash, 'abcd1A23')
+    assert check_password_hash(password_hash, 'abcd1A23')
+    assert hasher.run(check_password_hash, password_hash, 'abcd1A23') is True
+
+    metrics = hasher.metrics.snapshot()
+    assert metrics['completed'] == 2
+    assert metrics['in_flight'] == 0
+    assert metrics['hash_time_max'] > 0
+    assert metrics['queue_wait_max'] >= 0
+
+
+def test_hasher_turns_away_requests_when_the_queue_is_full(hasher):
+    # Start the worker process before occupying it, so that its start-up time doesn't count against the timeout.
+    hasher.run(time.sleep, 0)
+
+    busy = Thread(target=hasher.run, args=(time.sleep, 1))
+    busy.start()
+    time.sleep(0.2)
+
+    with pytest.raises(PasswordHasherBusyException):
+        hasher.run(time.sleep, 0)
+    busy.join()
+
+    assert hasher.metrics.snapshot()['rejected'] == 1
+
+    # Once the worker is free, requests are accepted again.
+    hasher.run(time.sleep, 0)
+    assert hasher.metrics.snapshot()['completed'] == 3
+
+
+def test_hasher_replaces_its_pool_when_a_worker_process_dies(hasher):
+    # The worker exits while computing, and again when the call is retried on the replacement pool.
+    with pytest.raises(BrokenProcessPool):
+        hasher.run(os._exit, 1)
+
+    # The next call finds the second pool broken, and replaces it too.
+    password_hash = hasher.run(generate_password_hash, 'abcd1A23')
+    assert check_password_hash(password_hash, 'abcd1A23')
+    assert hasher.metrics.snapshot()['pool_restarts'] == 2
+    assert hasher.metrics.snapshot()['in_flight'] == 0
@@ -1,9 +1,13 @@
-from datetime import date, datetime
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 
 import pytest
 
-from covid.domain.model import User, Article, Tag, Comment, make_comment
+from covid.domain.model import User, Article, Tag, Comment, make_comment, make_tag_association
+from covid.adapters.comment_index import CommentIndex
 from covid.adapters.repository import RepositoryException
+from covid.adapters.unit_of_work import InMemoryUnitOfWork
 
 
 def test_repository_can_add_a_user(in_memory_repo):
@@ -207,8 +211,292 @@ def test_repository_does_not_add_a_comment_without_an_article_properly_attached(
         in_memory_repo.add_comment(comment)
 
 
+def test_repository_links_a_comment_to_its_article_and_user_when_storing_it(in_memory_repo):
+    user = in_memory_repo.get_user('thorke')
+    article = in_memory_repo.get_article(2)
+    comment = Comment(user, article, "Trump's onto it!", datetime.today())
+
+    in_memory_repo.add_comment(comment)
+
+    assert article.comments == [comment]
+    assert user.comments[-1] is comment
+    assert article.comment_count == 1
+
+
 def test_repository_can_retrieve_comments(in_memory_repo):
     assert len(in_memory_repo.get_comments()) == 2
 
 
 
+
+
+def test_repository_returns_related_article_ids(in_memory_repo):
+    # Article 1 shares 'New Zealand' with articles 3 and 4, and 'Health' with article 2. Ties go to the newest article.
+    assert in_memory_repo.get_related_article_ids(1, 3) == [3, 4, 2]
+    assert in_memory_repo.get_related_article_ids(1, 1) == [3]
+
+
+def test_repository_updates_related_article_ids_when_articles_are_tagged(in_memory_repo):
+    article = Article(
+        date.fromisoformat('2020-03-09'),
+        'Second US coronavirus cruise tests negative amid delays and cancellations',
+        'It was revealed ...',
+        'https://www.nzherald.co.nz/travel/news/article.cfm?c_id=7&objectid=12315024',
+        'https://www.nzherald.co.nz/resizer/ix7hy3lzkMWUkD8hE6kdZ-8oaOM=/620x349/smart/filters:quality(70)/arc-anglerfish-syd-prod-nzme.s3.amazonaws.com/public/7VFOBLCBCNDHLICBY3CTPFR2L4.jpg',
+        7
+    )
+    for tag in in_memory_repo.get_tags():
+        if tag.tag_name in ('World', 'Health'):
+            make_tag_association(article, tag)
+    in_memory_repo.add_article(article)
+
+    # Article 7 shares two tags with article 2, and is the newest article sharing 'World' with article 6.
+    assert in_memory_repo.get_related_article_ids(2, 1) == [7]
+    assert in_memory_repo.get_related_article_ids(6, 2) == [7, 5]
+
+
+def test_repository_returns_an_empty_list_of_related_article_ids_for_non_existent_article(in_memory_repo):
+    assert in_memory_repo.get_related_article_ids(9, 3) == []
+
+
+def test_repository_returns_trending_article_ids(in_memory_repo):
+    # Article 1 has two comments within the window ending at the most recent comment.
+    assert in_memory_repo.get_trending_article_ids(3) == [(1, 2 / 24)]
+
+
+def test_repository_updates_trending_article_ids_when_comments_are_added(in_memory_repo):
+    user = in_memory_repo.get_user('thorke')
+    for article_id in (2, 2, 2):
+        article = in_memory_repo.get_article(article_id)
+        comment = make_comment("Trump's onto it!", user, article, datetime.fromisoformat('2020-02-29 09:00:00'))
+        in_memory_repo.add_comment(comment)
+
+    # Article 2 now has the most comments in the window; article 1's comments are still within 24 hours.
+    assert in_memory_repo.get_trending_article_ids(3) == [(2, 3 / 24), (1, 2 / 24)]
+
+    # A comment a day later slides article 1's comments out of the window.
+    comment = make_comment('Still here', user, in_memory_repo.get_article(3), datetime.fromisoformat('2020-03-01 08:00:00'))
+    in_memory_repo.add_comment(comment)
+    assert in_memory_repo.get_trending_article_ids(3) == [(2, 3 / 24), (3, 1 / 24)]
+
+
+def test_repository_returns_most_commented_article_ids(in_memory_repo):
+    user = in_memory_repo.get_user('thorke')
+    for article_id in (2, 5, 5, 5):
+        article = in_memory_repo.get_article(article_id)
+        in_memory_repo.add_comment(make_comment("Trump's onto it!", user, article))
+
+    # Articles with equal comment counts are ordered by decreasing id.
+    assert in_memory_repo.get_most_commented_article_ids(3) == [(5, 3), (1, 2), (2, 1)]
+    assert in_memory_repo.get_most_commented_article_ids(1) == [(5, 3)]
+
+
+def test_repository_returns_pages_of_comments_for_user(in_memory_repo):
+    user = in_memory_repo.get_user('thorke')
+    article = in_memory_repo.get_article(2)
+    timestamp = datetime.fromisoformat('2020-03-01 09:00:00')
+    for comment_text in ('First', 'Second', 'Third'):
+        # All three comments share a timestamp, so the page boundary must fall between them.
+        in_memory_repo.add_comment(make_comment(comment_text, user, article, timestamp))
+
+    comments, cursor = in_memory_repo.get_comments_for_user('thorke', 2)
+    assert [comment.comment for comment in comments] == ['Third', 'Second']
+    assert cursor is not None
+
+    comments, cursor = in_memory_repo.get_comments_for_user('thorke', 2, cursor)
+    assert [comment.comment for comment in comments] == ['First', 'Yeah Freddie, bad news']
+    assert cursor is None
+
+
+def test_repository_returns_an_empty_page_of_comments_for_non_existent_user(in_memory_repo):
+    assert in_memory_repo.get_comments_for_user('prince', 10) == ([], None)
+
+
+def test_repository_returns_pages_of_comments_for_article(in_memory_repo):
+    comments, cursor = in_memory_repo.get_comments_for_article(1, 1)
+    assert [comment.comment for comment in comments] == ['Oh no, COVID-19 has hit New Zealand']
+
+    comments, cursor = in_memory_repo.get_comments_for_article(1, 1, cursor)
+    assert [comment.comment for comment in comments] == ['Yeah Freddie, bad news']
+    assert cursor is None
+
+
+def test_repository_iterates_over_comments_in_batches(in_memory_repo):
+    user = in_memory_repo.get_user('thorke')
+    article = in_memory_repo.get_article(1)
+    for index in range(5):
+        in_memory_repo.add_comment(make_comment(f'Comment {index}', user, article, datetime(2020, 3, 1, 9, index)))
+
+    comments = in_memory_repo.iter_comments(1, batch_size=2)
+    assert next(comments).comment == 'Oh no, COVID-19 has hit New Zealand'
+    assert len(list(comments)) == 6
+    assert len(list(in_memory_repo.iter_comments(batch_size=3))) == 7
+
+
+def test_repository_returns_pages_of_articles(in_memory_repo):
+    articles, cursor = in_memory_repo.get_article_page(4)
+    assert [article.id for article in articles] == [1, 2, 3, 4]
+
+    articles, cursor = in_memory_repo.get_article_page(4, cursor)
+    assert [article.id for article in articles] == [5, 6]
+    assert cursor is None
+
+
+def test_repository_iterates_over_articles_in_batches(in_memory_repo):
+    assert [article.id for article in in_memory_repo.iter_articles(batch_size=4)] == [1, 2, 3, 4, 5, 6]
+
+
+def test_repository_can_add_articles_in_bulk(in_memory_repo):
+    articles = [
+        Article(date.fromisoformat('2020-03-16'), 'Later', 'Later para', 'https://later', 'https://later.jpg', 8),
+        Article(date.fromisoformat('2020-02-28'), 'Earlier', 'Earlier para', 'https://earlier', 'https://earlier.jpg', 7)
+    ]
+    in_memory_repo.add_articles(articles)
+
+    assert in_memory_repo.get_number_of_articles() == 8
+    assert in_memory_repo.get_article(7) is articles[1]
+    assert in_memory_repo.get_first_article() is articles[1]
+    assert in_memory_repo.get_last_article() is articles[0]
+    assert [article.id for article in in_memory_repo.iter_articles()] == [1, 2, 3, 4, 5, 6, 7, 8]
+
+
+def test_repository_can_add_comments_in_bulk(in_memory_repo):
+    user = in_memory_repo.get_user('thorke')
+    article = in_memory_repo.get_article(1)
+    comments = [
+        make_comment('Second', user, article, datetime(2020, 3, 1, 10)),
+        make_comment('First', user, article, datetime(2020, 3, 1, 9)),
+        make_comment('Elsewhere', user, in_memory_repo.get_article(2), datetime(2020, 3, 1, 11))
+    ]
+    in_memory_repo.add_comments(comments)
+
+    page, _ = in_memory_repo.get_comments_for_article(1, 10)
+    assert [comment.comment for comment in page][-2:] == ['First', 'Second']
+    page, _ = in_memory_repo.get_comments_for_user('thorke', 3)
+    assert [comment.comment for comment in page] == ['Elsewhere', 'Second', 'First']
+    assert in_memory_repo.get_most_commented_article_ids(1) == [(1, 4)]
+
+
+def test_repository_does_not_add_any_comments_in_a_bulk_add_with_an_unattached_comment(in_memory_repo):
+    user = in_memory_repo.get_user('thorke')
+    article = in_memory_repo.get_article(1)
+    comments = [make_comment('Attached', user, article), Comment(None, article, 'Unattached', datetime.today())]
+
+    with pytest.raises(RepositoryException):
+        in_memory_repo.add_comments(comments)
+
+    assert len(in_memory_repo.get_comments()) == 2
+
+
+def test_repository_keeps_its_invariants_under_concurrent_readers_and_writers(in_memory_repo):
+    uow = InMemoryUnitOfWork(in_memory_repo)
+    writers, comments_per_writer, readers = 4, 200, 4
+    start = datetime(2020, 3, 1)
+
+    # Every third transaction rolls back instead of committing.
+    def committed(index):
+        return index % 3 != 2
+    committed_per_writer = len([index for index in range(comments_per_writer) if committed(index)])
+    total = 2 + writers * committed_per_writer
+
+    def write(writer):
+        for index in range(comments_per_writer):
+            with uow:
+                user = uow.repo.get_user('thorke')
+                article = uow.repo.get_article(1 + index % 6)
+                timestamp = start + timedelta(seconds=index * writers + writer)
+                text = f'{writer}:{index}' if committed(index) else 'Rolled back'
+                uow.repo.add_comment(Comment(user, article, text, timestamp))
+                if index % 50 == 0:
+                    article_id = 100 + writer * 10 + index // 50
+                    uow.repo.add_article(
+                        Article(date(2020, 3, 20), 'New', 'First para', 'https://link', 'https://image.jpg', article_id)
+                    )
+                if committed(index):
+                    uow.commit()
+
+    def read(_):
+        seen_comments = seen_articles = 0
+        while seen_comments < total:
+            comments = in_memory_repo.get_comments()
+            assert len(comments) >= seen_comments
+            seen_comments = len(comments)
+
+            article_ids = [article.id for article in in_memory_repo.iter_articles(batch_size=3)]
+            assert article_ids == sorted(set(article_ids))
+            assert len(article_ids) >= seen_articles
+            seen_articles = len(article_ids)
+
+            articles = in_memory_repo.get_articles_by_date(date(2020, 3, 20))
+            assert all(article.date == date(2020, 3, 20) for article in articles)
+
+            page, _ = in_memory_repo.get_comments_for_article(1, 1000)
+            timestamps = [comment.timestamp for comment in page]
+            assert timestamps == sorted(timestamps)
+            assert len(set(map(id, page))) == len(page)
+
+            # Comments that were rolled back are never seen, through the repository or the shared Article.
+            article = in_memory_repo.get_article(3)
+            assert all(comment.comment != 'Rolled back' for comment in page)
+            assert all(comment.comment != 'Rolled back' for comment in list(article.comments))
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=writers + readers) as executor:
+            futures = [executor.submit(write, writer) for writer in range(writers)]
+            futures += [executor.submit(read, reader) for reader in range(readers)]
+            for future in futures:
+                future.result()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert len(in_memory_repo.get_comments()) == total
+    added_articles = len([index for index in range(0, comments_per_writer, 50) if committed(index)])
+    assert in_memory_repo.get_number_of_articles() == 6 + writers * added_articles
+    page, _ = in_memory_repo.get_comments_for_user('thorke', total)
+    assert len(page) == writers * committed_per_writer + 1
+    assert len(in_memory_repo.get_user('thorke').comments) == writers * committed_per_writer + 1
+    assert sum(count for _, count in in_memory_repo.get_most_commented_article_ids(100)) == total
+    assert sum(len(in_memory_repo.get_comments_for_article(id, total)[0]) for id in range(1, 7)) == total
+
+    # Each Article's count, its own list of Comments and the repository's agree.
+    for article_id in range(1, 7):
+        article = in_memory_repo.get_article(article_id)
+        page, _ = in_memory_repo.get_comments_for_article(article_id, total)
+        assert article.comment_count == len(article.comments) == len(page)
+        assert {id(comment) for comment in article.comments} == {id(comment) for comment in page}
+
+    # Storing a Comment copies neither the Article's list of Comments, when the Comment sorts last, nor the parts of the
+    # index that don't hold the Article, so a write costs the same however many Comments and Articles there are.
+    before = in_memory_repo._snapshot.article_comments
+    entries, count = before.entries(1)
+    user, article = in_memory_repo.get_user('thorke'), in_memory_repo.get_article(1)
+    in_memory_repo.add_comment(Comment(user, article, 'Last', datetime(2020, 4, 1)))
+    after = in_memory_repo._snapshot.article_comments
+    assert after.entries(1)[0] is entries
+    assert after.entries(1)[1] == count + 1
+    changed = [(group, old_group) for group, old_group in zip(after._groups, before._groups) if group is not old_group]
+    assert len(changed) == 1
+    assert len([bucket for bucket, old_bucket in zip(*changed[0]) if bucket is not old_bucket]) == 1
+
+
+def test_comment_index_leaves_earlier_indexes_unchanged():
+    first = CommentIndex().add({1: [(datetime(2020, 3, 2), 0, 'Second')]})
+
+    # An entry that sorts before the others goes into a copy of the list.
+    earlier = first.add({1: [(datetime(2020, 3, 1), 1, 'First')]})
+    entries, count = earlier.entries(1)
+    assert [text for _, _, text in entries[:count]] == ['First', 'Second']
+
+    # Two indexes built on the same one don't see each other's entries.
+    later = first.add({1: [(datetime(2020, 3, 3), 2, 'Third')]})
+    other = first.add({1: [(datetime(2020, 3, 4), 3, 'Fourth')]})
+    entries, count = later.entries(1)
+    assert [text for _, _, text in entries[:count]] == ['Second', 'Third']
+    entries, count = other.entries(1)
+    assert [text for _, _, text in entries[:count]] == ['Second', 'Fourth']
+
+    entries, count = first.entries(1)
+    assert [text for _, _, text in entries[:count]] == ['Second']
+    assert first.entries(2) == ((), 0)
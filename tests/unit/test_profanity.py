@@ -0,0 +1,43 @@
+import pytest
+
+from better_profanity import profanity
+
+from covid.news.profanity import ProfanityChecker, profanity_checker
+
+
+@pytest.mark.parametrize('text', (
+    'sh1t!',
+    'Sh*t happens',
+    'what the @$$',
+    'b1tch',
+    'hand job',
+    'HaNd J0b',
+    'hand_job',
+    'b.o.o.b.s',
+    '2 girls 1 cup',
+))
+def test_checker_finds_profanity(text):
+    assert profanity_checker.contains_profanity(text)
+    assert profanity.contains_profanity(text)
+
+
+@pytest.mark.parametrize('text', (
+    'Coronavirus: First case of virus in New Zealand',
+    'a classic assessment',
+    "shit'",
+    'p e n i s',
+    '',
+))
+def test_checker_passes_clean_text(text):
+    assert not profanity_checker.contains_profanity(text)
+    assert not profanity.contains_profanity(text)
+
+
+def test_checker_matches_phrases_up_to_their_length():
+    checker = ProfanityChecker(['bad', 'very bad word'])
+    assert checker.contains_profanity('a very bad word here')
+    assert checker.contains_profanity('a VERY b@d word')
+    assert checker.contains_profanity('a very good word') is False
+    assert checker.contains_profanity('a verybadword') is False
+    # 'bad' alone is still matched within the text.
+    assert checker.contains_profanity('not so B4D')
@@ -0,0 +1,52 @@
+import pytest
+
+from covid.rate_limiting.rate_limiter import RateLimiter
+from covid.rate_limiting.stores import LocalBucketStore, SqliteBucketStore
+
+
+@pytest.fixture(params=['local', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'local':
+        return LocalBucketStore()
+    return SqliteBucketStore(str(tmp_path / 'rate_limits.db'))
+
+
+def test_bucket_allows_a_burst_then_refills(store):
+    # Two tokens, refilled at one token every two seconds.
+    for _ in range(2):
+        assert store.take(['a'], 2, 0.5, 100.0) == 0
+    assert store.take(['a'], 2, 0.5, 100.0) == pytest.approx(2.0)
+    assert store.take(['a'], 2, 0.5, 101.0) == pytest.approx(1.0)
+
+    assert store.take(['a'], 2, 0.5, 102.0) == 0
+    assert store.take(['a'], 2, 0.5, 102.0) > 0
+
+    # Buckets are independent of one another.
+    assert store.take(['b'], 2, 0.5, 102.0) == 0
+
+
+def test_take_from_several_buckets_is_all_or_nothing(store):
+    assert store.take(['ip', 'user'], 1, 0.5, 100.0) == 0
+
+    # The user's bucket is empty, so no token is taken from the other IP address's bucket either.
+    assert store.take(['other ip', 'user'], 1, 0.5, 100.0) > 0
+    assert store.take(['other ip'], 1, 0.5, 100.0) == 0
+
+
+def test_stores_share_buckets_through_the_same_sqlite_file(tmp_path):
+    path = str(tmp_path / 'rate_limits.db')
+    assert SqliteBucketStore(path).take(['a'], 1, 1, 100.0) == 0
+    assert SqliteBucketStore(path).take(['a'], 1, 1, 100.0) > 0
+
+
+def test_rate_limiter_limits_per_ip_address_and_per_username():
+    limiter = RateLimiter(LocalBucketStore(), burst=2, per_minute=1)
+
+    assert limiter.check('login', '10.0.0.1', 'thorke') == 0
+    assert limiter.check('login', '10.0.0.2', 'thorke') == 0
+    # thorke has used up the burst, from whichever address.
+    assert limiter.check('login', '10.0.0.3', 'thorke') > 0
+    assert limiter.check('login', '10.0.0.3', 'fmercury') == 0
+
+    # Other scopes are limited separately.
+    assert limiter.check('register', '10.0.0.1', 'thorke') == 0
@@ -0,0 +1,140 @@
+import gc
+import os
+import shutil
+import signal
+import time
+import weakref
+from datetime import datetime
+
+import pytest
+
+from covid.adapters import memory_repository, write_ahead_log
+from covid.adapters.memory_repository import MemoryRepository
+from covid.adapters.reloading import DataReloader
+from covid.adapters.unit_of_work import InMemoryUnitOfWork
+from covid.adapters.write_ahead_log import InMemoryLog
+from covid.domain.model import User, make_comment
+from tests.conftest import TEST_DATA_PATH
+
+
+NEW_ARTICLE = '7,2020-03-06,"New article","First para",https://link,https://image.jpg,Health\n'
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / 'data'
+    shutil.copytree(TEST_DATA_PATH, path)
+    return str(path)
+
+
+@pytest.fixture
+def reloadable_uow(data_path):
+    log = InMemoryLog()
+    repo = MemoryRepository(log)
+    memory_repository.populate(data_path, repo)
+    return InMemoryUnitOfWork(repo), log
+
+
+def add_article_to_files(data_path):
+    with open(os.path.join(data_path, 'news_articles.csv'), 'a') as outfile:
+        outfile.write(NEW_ARTICLE)
+
+
+def test_reload_swaps_in_the_new_data_and_keeps_stored_users_and_comments(data_path, reloadable_uow):
+    uow, log = reloadable_uow
+    with uow:
+        user = uow.repo.get_user('thorke')
+        uow.repo.add_comment(make_comment('Before the reload', user, uow.repo.get_article(2), datetime(2020, 3, 1)))
+        uow.repo.add_user(User('Dave', '123456789'))
+        uow.commit()
+
+    add_article_to_files(data_path)
+    old_repo = uow.repo
+    DataReloader(uow, data_path, log, 0).reload()
+
+    assert uow.repo is not old_repo
+    assert uow.repo.get_article(7).title == 'New article'
+    assert uow.repo.get_article_ids_for_tag('Health') == [1, 2, 7]
+    assert uow.repo.get_user('Dave') is not None
+    comments, _ = uow.repo.get_comments_for_article(2, 10)
+    assert [comment.comment for comment in comments] == ['Before the reload']
+    assert uow.repo.get_article(2).comment_count == 1
+
+
+def test_unit_of_work_running_during_a_reload_keeps_its_repository(data_path, reloadable_uow):
+    uow, log = reloadable_uow
+    reloader = DataReloader(uow, data_path, log, 0)
+    add_article_to_files(data_path)
+
+    with uow:
+        old_repo = uow.repo
+        reloader.reload()
+
+        # The running unit of work still reads the old data, and its comment is stored in the new repository.
+        assert uow.repo is old_repo
+        assert uow.repo.get_article(7) is None
+        user = uow.repo.get_user('thorke')
+        uow.repo.add_comment(make_comment('During the reload', user, uow.repo.get_article(1), datetime(2020, 3, 1)))
+        uow.commit()
+
+    new_repo = uow.repo
+    assert new_repo is not old_repo
+    comments, _ = new_repo.get_comments_for_article(1, 10)
+    assert comments[-1].comment == 'During the reload'
+    assert new_repo.get_article(1).comment_count == 3
+
+    # Once nothing uses the old repository, it's freed.
+    old_repo = weakref.ref(old_repo)
+    gc.collect()
+    assert old_repo() is None
+
+
+def test_reloader_reloads_changed_files(data_path, reloadable_uow):
+    uow, log = reloadable_uow
+    reloader = DataReloader(uow, data_path, log, 0.01)
+    try:
+        add_article_to_files(data_path)
+        deadline = time.monotonic() + 5
+        while reloader.reloads == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        reloader.stop()
+
+    assert reloader.reloads == 1
+    assert uow.repo.get_number_of_articles() == 7
+
+
+def test_commits_made_while_the_log_is_replayed_reach_the_new_repository(data_path, reloadable_uow, monkeypatch):
+    uow, log = reloadable_uow
+    old_repo = uow.repo
+    restore = write_ahead_log.restore
+    committed = list()
+
+    def restore_then_commit(records, repo):
+        # A comment committed once the replay has read the log, which doesn't hold commits back meanwhile.
+        restore(records, repo)
+        if repo is not old_repo and not committed:
+            committed.append(True)
+            with uow:
+                user, article = uow.repo.get_user('thorke'), uow.repo.get_article(2)
+                uow.repo.add_comment(make_comment('During the replay', user, article, datetime(2020, 3, 1)))
+                uow.commit()
+    monkeypatch.setattr(write_ahead_log, 'restore', restore_then_commit)
+    DataReloader(uow, data_path, log, 0).reload()
+
+    assert committed == [True]
+    comments, _ = uow.repo.get_comments_for_article(2, 10)
+    assert [comment.comment for comment in comments] == ['During the replay']
+    assert uow.repo.get_article(2).comment_count == 1
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGHUP'), reason='No SIGHUP on this platform')
+def test_stopped_reloader_gives_back_the_sighup_handler(data_path, reloadable_uow):
+    uow, log = reloadable_uow
+    previous = signal.getsignal(signal.SIGHUP)
+    reloader = DataReloader(uow, data_path, log, 0)
+    reloader.handle_sighup()
+    assert signal.getsignal(signal.SIGHUP) != previous
+
+    reloader.stop()
+    assert signal.getsignal(signal.SIGHUP) == previous
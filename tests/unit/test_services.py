@@ -1,4 +1,5 @@
-from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 
 import pytest
 
@@ -6,7 +7,10 @@ from covid import InMemoryUnitOfWork
 from covid.authentication.services import AuthenticationException
 from covid.news import services as news_services
 from covid.authentication import services as auth_services
-from covid.news.services import NonExistentArticleException
+from covid.utilities import services as utilities_services
+from covid.news.services import NonExistentArticleException, UnknownUserException
+from covid.news.moderation import ModerationQueue
+from covid.news.group_commit import GroupCommitWriter
 
 
 def test_can_add_user(in_memory_uow):
@@ -70,6 +74,78 @@ def test_can_add_comment(in_memory_uow):
         None) is not None
 
 
+def test_can_add_a_batch_of_comments(in_memory_uow):
+    timestamp = datetime(2020, 3, 15, 9, 30)
+    outcomes = news_services.add_comments([
+        {'article_id': 3, 'comment_text': 'First', 'username': 'fmercury', 'timestamp': timestamp},
+        {'article_id': 7, 'comment_text': 'Second', 'username': 'fmercury', 'timestamp': timestamp},
+        {'article_id': 3, 'comment_text': 'Third', 'username': 'nobody', 'timestamp': timestamp},
+        {'article_id': 3, 'comment_text': 'Fourth', 'username': 'thorke', 'timestamp': timestamp},
+    ], in_memory_uow)
+
+    assert outcomes[0] is None and outcomes[3] is None
+    assert isinstance(outcomes[1], NonExistentArticleException)
+    assert isinstance(outcomes[2], UnknownUserException)
+
+    comments = news_services.get_comments_for_article(3, in_memory_uow)
+    assert [comment['comment_text'] for comment in comments if comment['timestamp'] == timestamp] == ['First', 'Fourth']
+
+
+def test_moderation_queue_publishes_clean_comments(in_memory_uow):
+    moderation_queue = ModerationQueue(in_memory_uow, batch_size=10, batch_window=0.01)
+    moderation_queue.submit(3, 'The loonies are stripping the supermarkets bare!', 'fmercury')
+    moderation_queue.submit(3, 'This is sh1t news', 'fmercury')
+    moderation_queue.submit(7, 'No such article', 'fmercury')
+    moderation_queue.drain()
+
+    comments = news_services.get_comments_for_article(3, in_memory_uow)
+    assert 'The loonies are stripping the supermarkets bare!' in [comment['comment_text'] for comment in comments]
+    assert 'This is sh1t news' not in [comment['comment_text'] for comment in comments]
+    assert moderation_queue.metrics() == {'pending': 0, 'submitted': 3, 'approved': 1, 'rejected': 1, 'failed': 1}
+
+    moderation_queue.stop()
+
+
+def test_group_commit_writer_acknowledges_each_comment(in_memory_uow):
+    writer = GroupCommitWriter(in_memory_uow, batch_size=10, window=0.05, timeout=5)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [
+            executor.submit(writer.add_comment, 3, f'Comment number {index}', 'fmercury') for index in range(8)
+        ]
+        for future in futures:
+            assert future.result() is None
+
+    comment_texts = [comment['comment_text'] for comment in news_services.get_comments_for_article(3, in_memory_uow)]
+    assert all(f'Comment number {index}' in comment_texts for index in range(8))
+
+    with pytest.raises(NonExistentArticleException):
+        writer.add_comment(7, 'No such article', 'fmercury')
+
+    writer.stop()
+
+
+def test_group_commit_writer_fails_a_group_whose_unit_of_work_cannot_be_created(in_memory_uow, monkeypatch):
+    writer = GroupCommitWriter(in_memory_uow, batch_size=10, window=0.05, timeout=5)
+
+    def for_task():
+        raise RuntimeError('Could not connect')
+    monkeypatch.setattr(in_memory_uow, 'for_task', for_task)
+
+    with pytest.raises(RuntimeError):
+        writer.add_comment(3, 'Not stored', 'fmercury')
+
+    writer.stop()
+
+
+def test_group_commit_writer_refuses_comments_once_stopped(in_memory_uow):
+    writer = GroupCommitWriter(in_memory_uow, batch_size=10, window=0.05, timeout=5)
+    writer.stop()
+
+    with pytest.raises(RuntimeError):
+        writer.add_comment(3, 'Too late', 'fmercury')
+
+
 def test_cannot_add_comment_for_non_existent_article(in_memory_uow):
     article_id = 7
     comment_text = "COVID-19 - what's that?"
@@ -181,6 +257,14 @@ def test_get_articles_by_id(in_memory_uow):
     assert set([5, 6]).issubset(article_ids)
 
 
+def test_iter_articles_by_id(in_memory_uow):
+    articles = news_services.iter_articles_by_id([1, 2, 3, 4], in_memory_uow, batch_size=3)
+
+    # Check that the articles are produced lazily, in batches.
+    assert next(articles)['id'] == 1
+    assert [article['id'] for article in articles] == [2, 3, 4]
+
+
 def test_get_comments_for_article(in_memory_uow):
     comments_as_dict = news_services.get_comments_for_article(1, in_memory_uow)
 
@@ -202,3 +286,74 @@ def test_get_comments_for_article_without_comments(in_memory_uow):
     comments_as_dict = news_services.get_comments_for_article(2, in_memory_uow)
     assert len(comments_as_dict) == 0
 
+
+
+def test_get_related_articles(in_memory_uow):
+    articles_as_dict = utilities_services.get_related_articles(1, 2, in_memory_uow)
+
+    # Check that the most closely related articles are returned in rank order.
+    assert [article['title'] for article in articles_as_dict] == [
+        'Coronavirus: Jacinda Ardern urges calm as panicked shoppers empty supermarket shelves',
+        'Coronavirus: Rest homes and retirement villages plead for national aged care response plan'
+    ]
+
+
+def test_get_trending_articles(in_memory_uow):
+    articles_as_dict = utilities_services.get_trending_articles(3, in_memory_uow, datetime(2020, 2, 28, 20))
+
+    # Check that the only commented article is trending at two comments per day.
+    assert len(articles_as_dict) == 1
+    assert articles_as_dict[0]['title'] == 'Coronavirus: First case of virus in New Zealand'
+    assert articles_as_dict[0]['comments_per_hour'] == 2 / 24
+
+
+def test_get_trending_articles_excludes_articles_whose_comments_are_older_than_a_day(in_memory_uow):
+    assert utilities_services.get_trending_articles(3, in_memory_uow, datetime(2020, 3, 1, 20)) == []
+
+
+def test_get_most_commented_articles(in_memory_uow):
+    news_services.add_comment(3, 'The loonies are stripping the supermarkets bare!', 'fmercury', in_memory_uow)
+
+    articles_as_dict = news_services.get_most_commented_articles(5, in_memory_uow)
+
+    # Check that only commented articles are returned, most commented first.
+    assert [article['id'] for article in articles_as_dict] == [1, 3]
+    assert [article['comment_count'] for article in articles_as_dict] == [2, 1]
+
+
+def test_get_comments_for_user(in_memory_uow):
+    news_services.add_comment(3, 'The loonies are stripping the supermarkets bare!', 'fmercury', in_memory_uow)
+
+    comments_as_dict, cursor = news_services.get_comments_for_user('fmercury', 1, None, in_memory_uow)
+    assert [comment['article_id'] for comment in comments_as_dict] == [3]
+
+    # Check that the cursor retrieves the user's older comment.
+    comments_as_dict, cursor = news_services.get_comments_for_user('fmercury', 1, cursor, in_memory_uow)
+    assert [comment['comment_text'] for comment in comments_as_dict] == ['Oh no, COVID-19 has hit New Zealand']
+    assert cursor is None
+
+
+def test_get_comments_for_non_existent_user(in_memory_uow):
+    with pytest.raises(news_services.UnknownUserException):
+        news_services.get_comments_for_user('prince', 10, None, in_memory_uow)
+
+
+def test_get_comment_page_for_article(in_memory_uow):
+    comments_as_dict, cursor = news_services.get_comment_page_for_article(1, 1, None, in_memory_uow)
+    assert [comment['comment_text'] for comment in comments_as_dict] == ['Oh no, COVID-19 has hit New Zealand']
+
+    # Check that the cursor retrieves the following comment.
+    comments_as_dict, cursor = news_services.get_comment_page_for_article(1, 1, cursor, in_memory_uow)
+    assert [comment['comment_text'] for comment in comments_as_dict] == ['Yeah Freddie, bad news']
+    assert cursor is None
+
+
+def test_iter_comments_for_article(in_memory_uow):
+    comments_as_dict = news_services.iter_comments_for_article(1, in_memory_uow, batch_size=1)
+
+    assert [comment['username'] for comment in comments_as_dict] == ['fmercury', 'thorke']
+
+
+def test_iter_comments_for_non_existent_article(in_memory_uow):
+    with pytest.raises(NonExistentArticleException):
+        list(news_services.iter_comments_for_article(7, in_memory_uow))
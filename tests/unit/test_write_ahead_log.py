@@ -0,0 +1,123 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from covid.adapters import memory_repository
+from covid.adapters.memory_repository import MemoryRepository
+from covid.adapters.unit_of_work import InMemoryUnitOfWork
+from covid.adapters.write_ahead_log import WriteAheadLog, replay
+from covid.domain.model import User, Comment
+from tests.conftest import TEST_DATA_PATH
+
+
+def restart(directory, compact_after=1000):
+    # Loads the test data into a new repository, as create_app() does, and replays the log on top.
+    log = WriteAheadLog(str(directory), 0.01, compact_after)
+    repo = MemoryRepository(log)
+    memory_repository.populate(TEST_DATA_PATH, repo)
+    replay(log, repo)
+    return InMemoryUnitOfWork(repo), log
+
+
+def add_comment(uow, comment_text, article_id=1):
+    with uow:
+        user = uow.repo.get_user('thorke')
+        comment = Comment(user, uow.repo.get_article(article_id), comment_text, datetime(2020, 3, 1, 9))
+        uow.repo.add_comment(comment)
+        uow.commit()
+
+
+def test_committed_users_and_comments_survive_a_restart(tmp_path):
+    uow, log = restart(tmp_path)
+    with uow:
+        uow.repo.add_user(User('Dave', '123456789'))
+        uow.commit()
+    add_comment(uow, 'Logged comment', article_id=2)
+    log.close()
+
+    uow, log = restart(tmp_path)
+    assert uow.repo.get_user('Dave').password == '123456789'
+    comments, _ = uow.repo.get_comments_for_article(2, 10)
+    assert [comment.comment for comment in comments] == ['Logged comment']
+    assert uow.repo.get_article(2).comment_count == 1
+    log.close()
+
+
+def test_rolled_back_writes_and_loaded_data_are_not_logged(tmp_path):
+    uow, log = restart(tmp_path)
+    with uow:
+        uow.repo.add_user(User('Dave', '123456789'))
+    log.close()
+
+    assert list(WriteAheadLog(str(tmp_path), 0.01, 1000).records()) == []
+
+
+def test_an_incomplete_last_record_is_ignored(tmp_path):
+    uow, log = restart(tmp_path)
+    add_comment(uow, 'Complete')
+    log.close()
+
+    segment = os.path.join(tmp_path, os.listdir(tmp_path)[0])
+    with open(segment, 'a') as outfile:
+        outfile.write('{"type": "comment", "username": "th')
+
+    uow, log = restart(tmp_path)
+    add_comment(uow, 'After the restart')
+    log.close()
+
+    uow, log = restart(tmp_path)
+    assert [record['comment'] for record in log.records()] == ['Complete', 'After the restart']
+    log.close()
+
+
+def test_an_incomplete_first_record_of_a_segment_is_not_appended_to(tmp_path):
+    uow, log = restart(tmp_path)
+    add_comment(uow, 'Complete')
+    log.close()
+
+    # The process crashed while writing the first record of the next segment.
+    with open(os.path.join(tmp_path, 'wal-000000000002.log'), 'w') as outfile:
+        outfile.write('{"type": "comment", "username": "th')
+
+    uow, log = restart(tmp_path)
+    add_comment(uow, 'After the restart')
+    add_comment(uow, 'Later')
+    log.close()
+
+    uow, log = restart(tmp_path)
+    assert [record['comment'] for record in log.records()] == ['Complete', 'After the restart', 'Later']
+    assert [record['lsn'] for record in log.records()] == [1, 2, 3]
+    log.close()
+
+
+def test_log_is_compacted_into_a_snapshot(tmp_path):
+    uow, log = restart(tmp_path, compact_after=3)
+    for index in range(7):
+        add_comment(uow, f'Comment {index}')
+    log.close()
+
+    # Each compaction leaves only the segment started when it began, unless a later one was still to run.
+    files = os.listdir(tmp_path)
+    assert 'snapshot.jsonl' in files
+    assert len([name for name in files if name.startswith('wal-')]) <= 2
+
+    uow, log = restart(tmp_path)
+    assert [record['lsn'] for record in log.records()] == [1, 2, 3, 4, 5, 6, 7]
+    assert len(uow.repo.get_comments()) == 9
+    log.close()
+
+
+def test_commit_fails_and_stores_nothing_if_the_log_cannot_be_written(tmp_path, monkeypatch):
+    uow, log = restart(tmp_path)
+
+    def append(records):
+        raise OSError('No space left on device')
+    monkeypatch.setattr(log, 'append', append)
+
+    with pytest.raises(OSError):
+        add_comment(uow, 'Not logged')
+
+    assert len(uow.repo.get_comments()) == 2
+    assert uow.repo.get_article(1).comment_count == 2
+    log.close()